@@ -1,6 +1,7 @@
 import FreeCAD, FreeCADGui, Part, Mesh
 import PySide, os.path
 import FRDParser
+import FEAMetrics
 import numpy as np
 import copy
 
@@ -13,6 +14,18 @@ def checkGenerations():
 
     return numGens
 
+def analysisStatus(FRDPath):
+    # Only the block headers are scanned, so this is quick even for big .frd files
+    if not os.path.isfile(FRDPath):
+        return "Not analysed"
+
+    summary = FRDParser.probe(FRDPath)
+    if summary.complete and len(summary.results) > 0:
+        return "Analysed"
+    else:
+        # The .frd file is incomplete, or analysis failed because there is no results data
+        return "Failed"
+
 def searchAnalysed():
     numAnalysed = 0
     statuses = []
@@ -20,17 +33,9 @@ def searchAnalysed():
     workingDir = '/'.join(FreeCAD.ActiveDocument.FileName.split('/')[0:-1])
     for i in range(numGenerations):
         FRDPath = workingDir + "/Gen" + str(i) + "/SolverCcxTools/FEMMeshNetgen.frd"
-        if os.path.isfile(FRDPath):
-            try:
-                # This returns an exception if analysis failed for this .frd file, because there is no results data
-                FRDParser.FRDParser(FRDPath)
-            except:
-                status = "Failed"
-            else:
-                status = "Analysed"
-                numAnalysed += 1
-        else:
-            status = "Not analysed"
+        status = analysisStatus(FRDPath)
+        if status == "Analysed":
+            numAnalysed += 1
 
         statuses.append(status)
 
@@ -175,11 +180,17 @@ def deleteGenerations(self):
     except:
         print("Error while trying to delete RefinementResults.txt")
 
-    # Delete the FEAMetrics.npy file
+    # Delete the FEAMetrics.npz file, and the FEAMetrics.npy file it replaced
+    try:
+        os.remove(self.workingDir + "/FEAMetrics.npz")
+    except FileNotFoundError:
+        print("INFO: FEAMetrics.npz is missing")
+    except:
+        print("Error while trying to delete FEAMetrics.npz")
     try:
         os.remove(self.workingDir + "/FEAMetrics.npy")
     except FileNotFoundError:
-        print("INFO: FEAMetrics.npy is missing")
+        pass
     except:
         print("Error while trying to delete FEAMetrics.npy")
 
@@ -188,121 +199,65 @@ def calcAndSaveFEAMetrics():
     numGenerations = checkGenerations()
 
     if numGenerations > 0:
-        #table = [["Node Count", "Elem Count", "Max Stress", "Mean Stress", "Max Disp", "Mean Disp"]]
-        table = [["Max Stress", "Mean Stress", "Max Disp", "Mean Disp"]]
-        for i in range(numGenerations):
-            filePath = workingDir + "/Gen" + str(i) + "/SolverCcxTools/FEMMeshNetgen.frd"
+        filePaths = [workingDir + "/Gen" + str(i) + "/SolverCcxTools/FEMMeshNetgen.frd" for i in range(numGenerations)]
+        cachePaths = [workingDir + "/Gen" + str(i) + "/FEAMetrics.json" for i in range(numGenerations)]
 
-            r = calculateFEAMetric(filePath)
-            #result = [r["NodeCount"], r["ElemCount"], r["MaxStress"], r["MeanStress"], r["MaxDisp"], r["MeanDisp"]]
-            result = [r["MaxStress"], r["MeanStress"], r["MaxDisp"], r["MeanDisp"]]
-            result = [str(r) for r in result]
-            table.append(result)
+        # The .frd files are parsed in worker processes, so keep the GUI responsive while waiting for them
+        def progress(done, total, filePath, r):
+            print("Calculated metrics for " + str(done) + " of " + str(total) + " generations")
+            FreeCADGui.updateGui()
+
+        results = FEAMetrics.calculateFEAMetrics(filePaths, progress, cachePaths=cachePaths)
 
         print("Table of results: ")
-        print(table)
+        print([heading for (heading, key) in FEAMetrics.FEAMetricColumns])
+        print(np.column_stack(list(FEAMetrics.metricColumns(results).values())))
 
-        # Save FEA metrics to .npy file
-        np.save(workingDir + "/FEAMetrics.npy", np.array(table))
+        # Save FEA metrics to .npz file
+        FEAMetrics.saveFEAMetrics(workingDir + "/FEAMetrics.npz", results)
 
 
 
-def calculateFEAMetric(FRDFilePath):
-    result = None
-    try:
-        parser = FRDParser.FRDParser(FRDFilePath)
-
-        nodeCount = parser.frd.node_block.numnod
-        elemCount = parser.frd.elem_block.numelem
-
-        stresses = np.zeros((nodeCount, 4), dtype=np.float32)
-        disp = np.zeros((nodeCount, 4), dtype=np.float32)
-        error = np.zeros((nodeCount, 1), dtype=np.float32)
-        for i in range(nodeCount):
-            stresses[i, 0:3] = parser.get_results_node(i + 1, names="STRESS")[0][0:3]
-            disp[i, 0:3] = parser.get_results_node(i + 1, names="DISP")[0][0:3]
-            error[i] = parser.get_results_node(i + 1, names="ERROR")[0]
-
-        # Calculate resultant stresses and displacements
-        stresses[:, 3] = np.sqrt(np.square(stresses[:, 0]) + np.square(stresses[:, 1]) + np.square(stresses[:, 2]))
-        disp[:, 3] = np.sqrt(np.square(disp[:, 0]) + np.square(disp[:, 1]) + np.square(disp[:, 2]))
-
-        # Find max and mean for stress, displacement, and error
-        resultantStress = stresses[:, 3]
-        maxStress = round(max(resultantStress), 3)
-        meanStress = round(np.mean(resultantStress), 3)
-
-        resultantDisp = disp[:, 3]
-        maxDisp = round(max(resultantDisp), 3)
-        meanDisp = round(np.mean(resultantDisp), 3)
-
-        maxError = round(max(error)[0], 1)
-        meanError = round((np.mean(error)), 1)
-
-        # Store results in dictionary to be returned by function
-        result = {
-            "NodeCount": nodeCount,
-            "ElemCount": elemCount,
-            "MaxStress": maxStress,
-            "MeanStress": meanStress,
-            "MaxDisp": maxDisp,
-            "MeanDisp": meanDisp,
-            "MaxError": maxError,
-            "MeanError": meanError
-        }
-    except:
-        print("Analysis failed on generation")
-        result = {
-            "NodeCount": None,
-            "ElemCount": None,
-            "MaxStress": None,
-            "MeanStress": None,
-            "MaxDisp":    None,
-            "MeanDisp":   None,
-            "MaxError":   None,
-            "MeanError":  None
-        }
-    finally:
-        return result
+def colourColumn(values, minVal, maxVal, hue=0.5):
+    # Colours of a float array of values, scaled from white at minVal to full saturation at maxVal.
+    # NaN marks a failed analysis or a missing result, e.g. a generation skipped for an invalid mesh,
+    # so colour those pink
+    values = np.asarray(values, dtype=np.float64)
+    valRange = maxVal - minVal
+    normVals = np.zeros(len(values))
+    if valRange > 0:
+        normVals = np.clip((values - minVal) / valRange, 0.0, 1.0)
+
+    missing = np.isnan(values)
+    normVals[missing] = 0.0
+
+    # With full value, every channel of the HSV colour falls linearly with the saturation
+    fullColour = np.array(hsvToRgb(hue, 1.0, 1.0))
+    rgb = (255 * (1.0 - normVals[:, None] * (1.0 - fullColour))).astype(int).tolist()
+
+    missing = missing.tolist()
+    return [PySide.QtGui.QColor(230, 184, 184, 255) if missing[j] else PySide.QtGui.QColor(col[0], col[1], col[2], 255)
+            for j, col in enumerate(rgb)]
 
 
 def generateColourScale(table, hue=0.5):
-    width = len(table[0])
-    height = len(table)
+    if len(table) == 0:
+        return []
+
+    table = np.asarray(table, dtype=np.float64).reshape(len(table), -1)
+    (height, width) = table.shape
     colours = [[PySide.QtGui.QColor("white") for x in range(width)] for y in range(height)]
 
     for i in range(width):
-        # Gather all the values in a column
-        values = [table[y][i] for y in range(height)]
-
-        # Make new column of values that doesn't include numbers
-        vals = []
-        for item in values:
-            try:
-                vals.append(float(item))
-            except ValueError:
-                pass
-
-        # Calculate value range
-        minVal = min(vals)
-        maxVal = max(vals)
-
-        # Calculate value range to calibrate colour scale
-        valRange = maxVal - minVal
-
-        for j, value in enumerate(values):
-            try:
-                # Normalise the value between 0-1 for the value range of that column
-                normVal = (float(value) - minVal) / valRange
-
-                col = hsvToRgb(hue, normVal, 1.0)
-                col = [int(col[0]*255), int(col[1]*255), int(col[2]*255)]
-                colours[j][i] = PySide.QtGui.QColor(col[0], col[1], col[2], 255)
-            except ValueError:
-                # Item was not a number. Likely a string because an error occured for analysis in this row
-                # so colour it pink
-                colours[j][i] = PySide.QtGui.QColor(230, 184, 184, 255)
-                pass
+        values = table[:, i]
+        if np.all(np.isnan(values)):
+            # No numbers at all in this column, so leave it white
+            continue
+
+        # Calibrate the colour scale to the value range of the column
+        columnColours = colourColumn(values, np.nanmin(values), np.nanmax(values), hue)
+        for j in range(height):
+            colours[j][i] = columnColours[j]
 
     return colours
 
@@ -394,3 +349,36 @@ class GenTableModel(PySide.QtCore.QAbstractTableModel):
         self.emit(PySide.QtCore.Qt.SIGNAL("layoutChanged()"))
         pass
 
+
+class MetricTableModel(GenTableModel):
+    # Table of a (generations, columns) float array, NaN where the analysis failed, which is sorted
+    # with numpy instead of comparing the displayed items
+    def __init__(self, parent, metrics, header, colours=None, *args):
+        self.metrics = np.asarray(metrics, dtype=np.float64)
+        items = [["Failed" if value != value else value for value in row] for row in self.metrics.tolist()]
+        GenTableModel.__init__(self, parent, items, header, colours, *args)
+
+        # Rows in generation order. Sorting only reorders these, so they can still be updated by generation
+        self.genItems = self.itemList[:]
+        self.genColours = self.colours[:]
+
+    def updateColours(self, colours):
+        # Colours are given in generation order
+        for i, row in enumerate(colours):
+            self.genColours[i][1:] = row
+
+    def sort(self, col, order):
+        """sort table by given column number col, with failed analyses last"""
+        self.emit(PySide.QtCore.SIGNAL("layoutAboutToBeChanged()"))
+        if col == 0:
+            keys = np.arange(len(self.metrics), dtype=np.float64)
+        else:
+            keys = self.metrics[:, col - 1]
+        if order == PySide.QtCore.Qt.DescendingOrder:
+            keys = -keys
+
+        # NaN sorts after every number in both directions
+        rows = np.argsort(keys, kind="stable").tolist()
+        self.itemList = [self.genItems[i] for i in rows]
+        self.colours = [self.genColours[i] for i in rows]
+        self.emit(PySide.QtCore.SIGNAL("layoutChanged()"))
@@ -58,17 +58,10 @@ class FEAPanel:
         numAnalysed = 0
         for i in range(self.numGenerations):
             FRDPath = self.workingDir + "/Gen" + str(i) + "/SolverCcxTools/FEMMeshNetgen.frd"
-            if os.path.isfile(FRDPath):
-                try:
-                    # This returns an exception if analysis failed for this .frd file, because there is no results data
-                    FRDParser.FRDParser(FRDPath)
-                except:
-                    self.stats.append(["Failed"])
-                else:
-                    self.stats.append(["Analysed"])
-                    numAnalysed += 1
-            else:
-                self.stats.append(["Not analysed"])
+            status = Common.analysisStatus(FRDPath)
+            if status == "Analysed":
+                numAnalysed += 1
+            self.stats.append([status])
 
         return(numAnalysed)
 
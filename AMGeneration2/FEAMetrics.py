@@ -0,0 +1,343 @@
+"""FEA metrics of analysed generations, without any FreeCAD dependency.
+
+calculateFEAMetric reduces the results of one .frd file to a small dict of
+metrics. calculateFEAMetrics does the same for many files at once, spread
+over a process pool, so that it can run from inside FreeCAD without parsing
+every generation on the GUI thread's single core.
+
+The metrics of each file can be cached in a JSON file, which is used for as
+long as the .frd file and the versions of the parser and metrics match, so
+only the generations that were analysed again are parsed again.
+
+The metrics of all generations are saved together in FEAMetrics.npz, with a
+float64 array per metric (NaN where the analysis failed) and the keys and
+headings of the columns as its schema.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import os.path
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import FRDParser
+import FRDStats
+import numpy as np
+
+
+# Version of the metric definitions, to be increased whenever calculateFEAMetric changes
+# so that cached metrics are calculated again
+METRIC_VERSION = 3
+
+# Columns of the FEA results table, as (heading, key in the calculateFEAMetric results)
+FEAMetricColumns = [
+    ("Max Stress", "MaxStress"),
+    ("Mean Stress", "MeanStress"),
+    ("Max Disp", "MaxDisp"),
+    ("Mean Disp", "MeanDisp"),
+    ("Max Von Mises", "MaxVonMises"),
+    ("Mean Von Mises", "MeanVonMises"),
+    ("Max Tresca", "MaxTresca"),
+    ("Max Principal", "MaxPrincipal"),
+    ("Min Principal", "MinPrincipal"),
+    ("P95 Von Mises", "P95VonMises"),
+    ("P99 Von Mises", "P99VonMises")
+]
+
+# Columns shown in the results table when it is first opened, the others can be selected
+defaultFEAMetrics = ["Max Stress", "Mean Stress", "Max Disp", "Mean Disp", "Max Von Mises"]
+
+
+def firstStepBlock(parser, name):
+    # First result block called name
+    for block in parser.frd.result_blocks:
+        if block.name == name:
+            return block
+
+    raise RuntimeError("No " + name + " results")
+
+
+def firstStepRows(parser, name, nodeNumbers):
+    # First result block called name, and the rows of the given nodes in it
+    block = firstStepBlock(parser, name)
+    rows = block.index.rows(nodeNumbers)
+    if np.any(rows < 0):
+        raise RuntimeError("Missing " + name + " results for " + str(np.count_nonzero(rows < 0)) + " nodes")
+    return (block, rows)
+
+
+def calculateFEAMetric(FRDFilePath):
+    result = None
+    try:
+        # Only the STRESS, DISP and ERROR blocks are read from the file
+        parser = FRDParser.FRDParser(FRDFilePath, lazy=True)
+
+        nodeCount = parser.frd.node_block.numnod
+        elemCount = parser.frd.elem_block.numelem
+
+        # The metrics are taken over the nodes of the first STRESS block, whatever their numbers.
+        # The DISP and ERROR results of the same nodes are found through the index of their blocks
+        stressBlock = firstStepBlock(parser, "STRESS")
+        (dispBlock, dispRows) = firstStepRows(parser, "DISP", stressBlock.numbers)
+        (errorBlock, errorRows) = firstStepRows(parser, "ERROR", stressBlock.numbers)
+        stresses = stressBlock.values
+        disp = dispBlock.values[dispRows]
+        error = errorBlock.values[errorRows, 0]
+
+        # Calculate resultant stresses and displacements
+        resultantStress = np.sqrt(np.square(stresses[:, 0]) + np.square(stresses[:, 1]) + np.square(stresses[:, 2]))
+        resultantDisp = np.sqrt(np.square(disp[:, 0]) + np.square(disp[:, 1]) + np.square(disp[:, 2]))
+
+        # Find max and mean for stress, displacement, and error, as plain floats so they can be saved as JSON
+        maxStress = round(float(np.max(resultantStress)), 3)
+        meanStress = round(float(np.mean(resultantStress)), 3)
+
+        maxDisp = round(float(np.max(resultantDisp)), 3)
+        meanDisp = round(float(np.mean(resultantDisp)), 3)
+
+        maxError = round(float(np.max(error)), 1)
+        meanError = round(float(np.mean(error)), 1)
+
+        # Equivalent and principal stresses, summarised in one pass over the stress tensors so the full
+        # fields are never held in memory. The percentiles of the von Mises stress come from a streaming
+        # quantile sketch with a relative error below 0.1%
+        (vonMisesStats, trescaStats, ps1Stats, ps3Stats) = FRDStats.block_stats(
+            stressBlock, ["MISES", "TRESCA", "PS1", "PS3"], relative_accuracy=0.001)
+        maxVonMises = round(float(vonMisesStats.maximum), 3)
+        meanVonMises = round(float(vonMisesStats.mean), 3)
+        maxTresca = round(float(trescaStats.maximum), 3)
+        maxPrincipal = round(float(ps1Stats.maximum), 3)
+        minPrincipal = round(float(ps3Stats.minimum), 3)
+        (p95VonMises, p99VonMises) = [round(value, 3) for value in vonMisesStats.quantile([0.95, 0.99]).tolist()]
+
+        # Store results in dictionary to be returned by function
+        result = {
+            "NodeCount": nodeCount,
+            "ElemCount": elemCount,
+            "MaxStress": maxStress,
+            "MeanStress": meanStress,
+            "MaxDisp": maxDisp,
+            "MeanDisp": meanDisp,
+            "MaxError": maxError,
+            "MeanError": meanError,
+            "MaxVonMises": maxVonMises,
+            "MeanVonMises": meanVonMises,
+            "MaxTresca": maxTresca,
+            "MaxPrincipal": maxPrincipal,
+            "MinPrincipal": minPrincipal,
+            "P95VonMises": p95VonMises,
+            "P99VonMises": p99VonMises
+        }
+    except Exception:
+        print("Analysis failed on generation")
+        result = {
+            "NodeCount": None,
+            "ElemCount": None,
+            "MaxStress": None,
+            "MeanStress": None,
+            "MaxDisp":    None,
+            "MeanDisp":   None,
+            "MaxError":   None,
+            "MeanError":  None,
+            "MaxVonMises":  None,
+            "MeanVonMises": None,
+            "MaxTresca":    None,
+            "MaxPrincipal": None,
+            "MinPrincipal": None,
+            "P95VonMises":  None,
+            "P99VonMises":  None
+        }
+    finally:
+        return result
+
+
+def metricColumns(results):
+    # One float64 array per metric in FEAMetricColumns, NaN where the analysis failed
+    columns = {}
+    for (heading, key) in FEAMetricColumns:
+        columns[key] = np.array([np.nan if r[key] is None else r[key] for r in results], dtype=np.float64)
+    return columns
+
+
+def saveFEAMetrics(filePath, results):
+    # The schema arrays hold the key and heading of every column, in table order
+    np.savez_compressed(filePath,
+                        keys=np.array([key for (heading, key) in FEAMetricColumns]),
+                        headings=np.array([heading for (heading, key) in FEAMetricColumns]),
+                        metricVersion=np.array(METRIC_VERSION),
+                        **metricColumns(results))
+
+
+def loadFEAMetrics(filePath):
+    '''
+    :param filePath: Path of an FEAMetrics.npz file written by saveFEAMetrics
+    :return: (headings, metrics) with the list of column headings and a (generations, columns)
+             float64 array of the metrics, NaN where the analysis failed
+    '''
+    with np.load(filePath, allow_pickle=False) as data:
+        headings = data["headings"].tolist()
+        metrics = np.column_stack([data[key] for key in data["keys"].tolist()])
+    return (headings, metrics)
+
+
+def pythonExecutable():
+    # FreeCAD embeds python, so sys.executable is usually the FreeCAD binary rather than
+    # an interpreter that can run the pool's workers. Look for the python shipped with it
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+
+    for directory in (os.path.join(sys.exec_prefix, "bin"), sys.exec_prefix, os.path.dirname(sys.executable)):
+        for name in ("python3", "python", "python.exe"):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+
+    return None
+
+
+def fileHash(filePath, blockSize=1 << 20):
+    # Hash of the contents of a file, read in blocks so big .frd files aren't held in memory
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filePath, "rb") as f:
+        block = f.read(blockSize)
+        while block:
+            digest.update(block)
+            block = f.read(blockSize)
+    return digest.hexdigest()
+
+
+def metricRecord(filePath, hashFile=False):
+    # Runs in a worker process. Metrics of one .frd file together with everything that decides
+    # whether they are still valid later on. The file key is None if the file doesn't exist.
+    # Hashing reads the whole file a second time, so it is only done when asked for
+    try:
+        stat = os.stat(filePath)
+        fileKey = {"size": stat.st_size, "mtime": stat.st_mtime}
+        if hashFile:
+            fileKey["hash"] = fileHash(filePath)
+    except OSError:
+        fileKey = None
+
+    return {
+        "frd": fileKey,
+        "parserVersion": FRDParser.PARSER_VERSION,
+        "metricVersion": METRIC_VERSION,
+        "metrics": calculateFEAMetric(filePath)
+    }
+
+
+def saveCachedRecord(cachePath, record):
+    # Written to a temporary file first, so an interrupted write can't leave a broken cache behind
+    try:
+        with open(cachePath + ".tmp", "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(cachePath + ".tmp", cachePath)
+    except OSError as e:
+        print("WARNING: Could not save FEA metrics to " + cachePath + " (" + str(e) + ")")
+
+
+def loadCachedRecord(filePath, cachePath):
+    '''
+    :param filePath: Path of the .frd file
+    :param cachePath: Path of its JSON cache file
+    :return: (record, touched) with the cached record if it is still valid, otherwise None, and whether
+             the file was touched since, keeping its size but not its modification time. Only the hash
+             of a touched file can tell whether it changed, so its new record should be saved with one
+    '''
+    try:
+        with open(cachePath) as f:
+            record = json.load(f)
+        stat = os.stat(filePath)
+    except (OSError, ValueError):
+        return (None, False)
+
+    if record.get("parserVersion") != FRDParser.PARSER_VERSION or record.get("metricVersion") != METRIC_VERSION:
+        return (None, False)
+
+    fileKey = record.get("frd")
+    if not fileKey or fileKey.get("size") != stat.st_size:
+        return (None, False)
+    if fileKey.get("mtime") == stat.st_mtime:
+        return (record, False)
+
+    # The file was touched or copied. Records are only hashed once this has happened to their file
+    if "hash" not in fileKey or fileKey["hash"] != fileHash(filePath):
+        return (None, True)
+    fileKey["mtime"] = stat.st_mtime
+    saveCachedRecord(cachePath, record)
+    return (record, True)
+
+
+def calculateFEAMetrics(filePaths, progress=None, workers=None, cachePaths=None):
+    '''
+    :param filePaths: Paths of the .frd files
+    :param progress: Optional callback progress(done, total, filePath, result), called in this
+                     process as each file is finished
+    :param workers: Number of worker processes, one per CPU by default. With 1, or when no python
+                    interpreter can be found for the workers, the files are done in this process
+    :param cachePaths: Optional paths of a JSON cache file for each .frd file. Valid cached metrics
+                       are used instead of parsing the file, and new metrics are saved to them
+    :return: List of calculateFEAMetric results, in the same order as filePaths
+    '''
+    results = [None] * len(filePaths)
+    remaining = list(range(len(filePaths)))
+    touched = set()
+    done = 0
+
+    def finished(i, record):
+        nonlocal done
+        results[i] = record["metrics"]
+        done += 1
+        if progress is not None:
+            progress(done, len(filePaths), filePaths[i], results[i])
+
+    def calculated(i, record):
+        # Files that don't exist have nothing to key the cache on, so they are left uncached
+        if cachePaths is not None and record["frd"] is not None:
+            saveCachedRecord(cachePaths[i], record)
+        finished(i, record)
+
+    if cachePaths is not None:
+        for i in remaining:
+            (record, wasTouched) = loadCachedRecord(filePaths[i], cachePaths[i])
+            if record is not None:
+                finished(i, record)
+            elif wasTouched:
+                touched.add(i)
+        remaining = [i for i in remaining if results[i] is None]
+        if done > 0:
+            print("INFO: Using cached metrics for " + str(done) + " generations")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(remaining))
+    executable = pythonExecutable()
+
+    if workers > 1 and executable is not None:
+        # Spawned workers only import this module and FRDParser, never FreeCAD
+        context = multiprocessing.get_context("spawn")
+        context.set_executable(executable)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = {executor.submit(metricRecord, filePaths[i], i in touched): i for i in remaining}
+                for future in as_completed(futures):
+                    try:
+                        record = future.result()
+                    except Exception:
+                        # A worker died or could not be started. Its files are done again below
+                        continue
+                    calculated(futures[future], record)
+        except Exception as e:
+            print("ERROR: Worker processes for FEA metrics failed (" + str(e) + ")")
+
+        remaining = [i for i in remaining if results[i] is None]
+        if len(remaining) > 0:
+            print("INFO: Calculating metrics of " + str(len(remaining)) + " generations without worker processes")
+
+    # Failures of a single file are caught by calculateFEAMetric, so one bad file doesn't stop the others
+    for i in remaining:
+        calculated(i, metricRecord(filePaths[i], i in touched))
+
+    return results
@@ -12,13 +12,309 @@ FRDFile is the main class and contains the following subclasses:
     FRDElemBlock, containing Element Information
     FRDResultBlock, containing Result Information
 
+Node, element and result blocks can also be loaded lazily, in which case
+the file is only scanned for block headers and a block's data is read the
+first time it is accessed. probe() only scans the block headers, to check
+the contents and completeness of a file quickly, and iter_blocks() reads
+the blocks of a file one at a time without keeping them.
+
 Note that only Unix Line endings are currently supported!
 
 """
 
 import datetime
+import mmap
+import os
 import struct
-from math import sqrt
+
+import numpy as np
+
+# Version of the parsing code, to be increased whenever a change can alter
+# the values read from a file, so that anything derived from them and saved
+# elsewhere is calculated again
+PARSER_VERSION = 1
+
+
+def _read_records(in_file, numrec, line_lengths):
+    """Read numrec fixed-width ASCII records as a (numrec, reclen) byte array.
+
+    Each record consists of lines with the given lengths, including eol.
+    If the block does not have this exact layout (e.g. because of different
+    line endings), the file position is restored and None is returned, so
+    the caller can fall back to reading field by field.
+
+    """
+    reclen = sum(line_lengths)
+    start = in_file.tell()
+    records = np.frombuffer(in_file.read(numrec*reclen), dtype=np.uint8)
+    if len(records) == numrec*reclen:
+        records = records.reshape(numrec, reclen)
+        eols = np.cumsum(line_lengths) - 1
+        if (records[:, eols] == ord('\n')).all():
+            return records
+    in_file.seek(start)
+    return None
+
+
+def _parse_fields(records, start, width, count, dtype):
+    """Convert count fields of given width, from column start, to numbers."""
+    fields = np.ascontiguousarray(records[:, start:start + width*count])
+    return fields.view('S{:d}'.format(width)).reshape(
+        len(records), count).astype(dtype)
+
+
+def _values_per_line(ncomps):
+    """Number of result values on each line of an ASCII nodal result."""
+    return [min(6, ncomps - k_start) for k_start in range(0, ncomps, 6)]
+
+
+def _nodes_per_line(num_nodes, elem_format):
+    """Number of node numbers on each line of an ASCII element."""
+    per_line = 5*(3-elem_format)
+    return [min(per_line, num_nodes - k_start)
+            for k_start in range(0, num_nodes, per_line)]
+
+
+def _write_records(out_file, dtype, columns, chunk_size=65536):
+    """Write arrays as binary records of dtype, a chunk of rows at a time.
+
+    columns holds one array for each field of dtype, in the same order.
+
+    """
+    num_rows = len(columns[0])
+    for start in range(0, num_rows, chunk_size):
+        stop = min(start + chunk_size, num_rows)
+        records = np.empty(stop - start, dtype=dtype)
+        for name, column in zip(dtype.names, columns):
+            records[name] = column[start:stop]
+        out_file.write(records.tobytes())
+
+
+def _write_lines(out_file, record_format, columns, chunk_size=65536):
+    """Write arrays as fixed-width ASCII records, a chunk of rows at a time.
+
+    record_format is the %-format of a whole record, which may span several
+    lines, with one conversion for each value in a row of the columns.
+    The records of a chunk are formatted with a single % operation, which
+    gives the same fields as formatting the values one by one.
+
+    """
+    widths = [1 if np.ndim(column) == 1 else np.shape(column)[1]
+              for column in columns]
+    num_rows = len(columns[0])
+    for start in range(0, num_rows, chunk_size):
+        stop = min(start + chunk_size, num_rows)
+        # Python ints and floats, in the order of the conversions
+        fields = np.empty((stop - start, sum(widths)), dtype=object)
+        col = 0
+        for column, width in zip(columns, widths):
+            fields[:, col:col + width] = np.reshape(
+                column[start:stop], (stop - start, width))
+            col += width
+        out_file.write(((record_format*(stop - start))
+                        % tuple(fields.ravel().tolist())).encode())
+
+
+def _tet4_shape(nat):
+    """Shape functions of a 4-node tet and their natural derivatives."""
+    r, s, t = nat[:, 0], nat[:, 1], nat[:, 2]
+    values = np.stack([1.0 - r - s - t, r, s, t], axis=1)
+    derivs = np.array([[-1.0, -1.0, -1.0], [1.0, 0.0, 0.0],
+                       [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    return values, np.broadcast_to(derivs, (len(nat), 4, 3))
+
+
+def _tet10_shape(nat):
+    """Shape functions of a 10-node tet and their natural derivatives."""
+    r, s, t = nat[:, 0], nat[:, 1], nat[:, 2]
+    u = 1.0 - r - s - t
+    zero = np.zeros_like(r)
+    values = np.stack([u*(2*u - 1), r*(2*r - 1), s*(2*s - 1), t*(2*t - 1),
+                       4*u*r, 4*r*s, 4*s*u, 4*u*t, 4*r*t, 4*s*t], axis=1)
+    derivs = np.stack([
+        np.stack([1 - 4*u, 1 - 4*u, 1 - 4*u], axis=1),
+        np.stack([4*r - 1, zero, zero], axis=1),
+        np.stack([zero, 4*s - 1, zero], axis=1),
+        np.stack([zero, zero, 4*t - 1], axis=1),
+        np.stack([4*(u - r), -4*r, -4*r], axis=1),
+        np.stack([4*s, 4*r, zero], axis=1),
+        np.stack([-4*s, 4*(u - s), -4*s], axis=1),
+        np.stack([-4*t, -4*t, 4*(u - t)], axis=1),
+        np.stack([4*t, zero, 4*r], axis=1),
+        np.stack([zero, 4*t, 4*s], axis=1)], axis=1)
+    return values, derivs
+
+
+# Natural coordinates of the nodes of a 20-node brick, in the node order of
+# the .frd file. Nodes 1-8 are the corners of an 8-node brick. cgx puts the
+# mid-side nodes of the edges between bottom and top face (13-16) before
+# the ones of the top face (17-20), unlike the ccx input order.
+_HEX_NODES = np.array([
+    [-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+    [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1],
+    [0, -1, -1], [1, 0, -1], [0, 1, -1], [-1, 0, -1],
+    [-1, -1, 0], [1, -1, 0], [1, 1, 0], [-1, 1, 0],
+    [0, -1, 1], [1, 0, 1], [0, 1, 1], [-1, 0, 1]], dtype=np.float64)
+
+
+def _hex8_shape(nat):
+    """Shape functions of an 8-node brick and their natural derivatives."""
+    factors = 1.0 + nat[:, None, :]*_HEX_NODES[None, :8, :]
+    values = factors.prod(axis=2)/8
+    derivs = np.stack([
+        _HEX_NODES[None, :8, a]*factors[:, :, (a + 1) % 3]
+        * factors[:, :, (a + 2) % 3]/8 for a in range(3)], axis=2)
+    return values, derivs
+
+
+def _hex20_shape(nat):
+    """Shape functions of a 20-node brick and their natural derivatives."""
+    values = np.empty((len(nat), 20))
+    derivs = np.empty((len(nat), 20, 3))
+    for i, node in enumerate(_HEX_NODES.tolist()):
+        factors = 1.0 + nat*node
+        if i < 8:
+            corner = nat.dot(node) - 2
+            prod = factors.prod(axis=1)
+            values[:, i] = prod*corner/8
+            for a in range(3):
+                others = factors[:, (a + 1) % 3]*factors[:, (a + 2) % 3]
+                derivs[:, i, a] = node[a]*(others*corner + prod)/8
+        else:
+            # Mid-side node, on the edge along the axis where node is 0
+            a = node.index(0)
+            b, c = (a + 1) % 3, (a + 2) % 3
+            edge = 1.0 - nat[:, a]**2
+            values[:, i] = edge*factors[:, b]*factors[:, c]/4
+            derivs[:, i, a] = -2*nat[:, a]*factors[:, b]*factors[:, c]/4
+            derivs[:, i, b] = edge*node[b]*factors[:, c]/4
+            derivs[:, i, c] = edge*factors[:, b]*node[c]/4
+    return values, derivs
+
+
+def _tet_outside(nat):
+    """How far natural coordinates are outside a tet (<= 0 is inside)."""
+    return np.maximum(-nat.min(axis=1), nat.sum(axis=1) - 1.0)
+
+
+def _hex_outside(nat):
+    """How far natural coordinates are outside a brick (<= 0 is inside)."""
+    return np.abs(nat).max(axis=1) - 1.0
+
+
+# Shape functions, natural coordinates of the centre and inside test for
+# the element types which results can be interpolated in
+_SHAPES = {
+    1: (_hex8_shape, 0.0, _hex_outside),
+    3: (_tet4_shape, 0.25, _tet_outside),
+    4: (_hex20_shape, 0.0, _hex_outside),
+    6: (_tet10_shape, 0.25, _tet_outside),
+}
+
+
+def _node_box(coords):
+    """Bounding boxes of a (P, nodes per element, 3) array of elements."""
+    # A loop over the few nodes is much faster than reducing a short axis
+    low = coords[:, 0].copy()
+    high = coords[:, 0].copy()
+    for i in range(1, coords.shape[1]):
+        np.minimum(low, coords[:, i], out=low)
+        np.maximum(high, coords[:, i], out=high)
+    return low, high
+
+
+def _natural_coords(elem_type, coords, points, max_iter=20):
+    """Natural coordinates of points in elements, by Newton iteration.
+
+    Parameters:
+        elem_type   Element type of all elements
+        coords      (P, nodes per element, 3) array of element node coords
+        points      (P, 3) array of points, one per element
+
+    Returns a (P, 3) array, NaN where the element is degenerate.
+
+    """
+    shape, centre, _ = _SHAPES[elem_type]
+    nat = np.full((len(points), 3), centre)
+    low, high = _node_box(coords)
+    size = (high - low).max(axis=1)
+
+    # Points stop iterating once converged, so the result for a point
+    # does not depend on the other points in the batch
+    active = np.arange(len(points))
+    for _ in range(max_iter):
+        values, derivs = shape(nat[active])
+        node_coords = coords[active].transpose(0, 2, 1)
+        residual = points[active] - np.matmul(node_coords,
+                                              values[:, :, None])[:, :, 0]
+        jacobian = np.matmul(node_coords, derivs)
+        singular = ~(np.abs(np.linalg.det(jacobian))
+                     > 1e-12*size[active]**3)
+        jacobian[singular] = np.eye(3)
+        step = np.linalg.solve(jacobian, residual[:, :, None])[:, :, 0]
+        nat[active] += step
+        nat[active[singular]] = np.nan
+        active = active[(np.abs(step) > 1e-12).any(axis=1) & ~singular]
+        if len(active) == 0:
+            break
+    return nat
+
+
+# Rows and columns of the six tensor components, in the frd order
+# xx, yy, zz, xy, yz, zx
+_TENSOR_ROWS = [0, 1, 2, 0, 1, 2]
+_TENSOR_COLS = [0, 1, 2, 1, 2, 0]
+
+
+def _stress_fields(values, quantity=None, chunk_size=65536):
+    """Von Mises, Tresca and principal stresses of (N, 6) stress results.
+
+    Returns a dict of (N,) float64 arrays, NaN where a component is NaN.
+    The principal stresses are ordered PS1 >= PS2 >= PS3. If only MISES is
+    asked for as quantity, the eigenvalues are not computed.
+
+    """
+    comps = values[:, :6].astype(np.float64)
+    sxx, syy, szz, sxy, syz, szx = comps.T
+    fields = {
+        'MISES': np.sqrt(0.5*(np.square(sxx - syy) + np.square(syy - szz)
+                              + np.square(szz - sxx))
+                         + 3.0*(np.square(sxy) + np.square(syz)
+                                + np.square(szx))),
+    }
+    if quantity == 'MISES':
+        return fields
+
+    # Batched eigenvalues of the symmetric tensors, in chunks to bound the
+    # size of the (chunk, 3, 3) tensor array
+    principal = np.full((len(comps), 3), np.nan)
+    finite = np.flatnonzero(np.isfinite(comps).all(axis=1))
+    for start in range(0, len(finite), chunk_size):
+        rows = finite[start:start + chunk_size]
+        tensors = np.empty((len(rows), 3, 3))
+        tensors[:, _TENSOR_ROWS, _TENSOR_COLS] = comps[rows]
+        tensors[:, _TENSOR_COLS, _TENSOR_ROWS] = comps[rows]
+        principal[rows] = np.linalg.eigvalsh(tensors)
+    fields['PS1'] = principal[:, 2]
+    fields['PS2'] = principal[:, 1]
+    fields['PS3'] = principal[:, 0]
+    fields['TRESCA'] = principal[:, 2] - principal[:, 0]
+    return fields
+
+
+def _disp_fields(values, quantity=None):
+    """Magnitude of (N, 3) displacement results, as a dict of (N,) arrays."""
+    comps = values[:, :3].astype(np.float64)
+    return {'MAG': np.sqrt(np.square(comps).sum(axis=1))}
+
+
+# the result blocks which quantities can be derived from, with the number
+# of components they need
+_DERIVED = {
+    'STRESS': (6, _stress_fields),
+    'DISP': (3, _disp_fields),
+}
+
 
 class FRDHeader(object):
     """This class stores Model/Parameter/User Information.
@@ -87,7 +383,317 @@ class FRDNode(object):
         self.key = -1
 
 
-class FRDNodeBlock(object):
+class FRDLazyBlock(object):
+    """Base class for blocks whose data can be read on first access.
+
+    A lazily loaded block only reads its header line(s) while the file is
+    scanned, and remembers where its data starts. The data is read from
+    the file the first time one of the data attributes is accessed.
+
+    If the file is memory-mapped, binary blocks that support it map their
+    data arrays straight onto the file instead of reading them.
+
+    Attributes:
+        data_offset     Byte offset of the block data in file_name,
+                        None if the data has been read already
+        file_name       Path to the .frd file holding the block data
+
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        """Initialize a new FRDLazyBlock Object."""
+        self.data_offset = None
+        self.file_name = None
+        self._buf = None
+        self._mapped = False
+
+    def _defer(self, file_name, data_offset, buf=None):
+        """Leave the data at data_offset in file_name to be read later."""
+        self.file_name = file_name
+        self.data_offset = data_offset
+        self._buf = buf
+
+    def _load_deferred(self):
+        """Read the block data if this block was loaded lazily."""
+        if self.data_offset is not None:
+            data_offset = self.data_offset
+            buf = self._buf
+            self.data_offset = None
+            self._buf = None
+            if buf is not None and self.format >= 2 and hasattr(self, '_map_data'):
+                self._map_data(buf, data_offset)
+                self._mapped = True
+            else:
+                with open(self.file_name, 'rb') as in_file:
+                    in_file.seek(data_offset)
+                    self._read_data(in_file)
+
+    def _load_in_memory(self):
+        """Read the block data, copying arrays mapped onto the file.
+
+        Mapped arrays read from the file on every access, so they have to be
+        copied before the file is overwritten.
+
+        """
+        self._load_deferred()
+        if self._mapped:
+            self._mapped = False
+            self._copy_mapped()
+
+    def _read_data(self, in_file):
+        raise NotImplementedError()
+
+
+class FRDNodeIndex(object):
+    """This class maps node numbers to rows in the arrays of a block.
+
+    Compact numbering, possibly with a few gaps, is looked up in a dense
+    array indexed by node number. Sparse numbering is looked up in a dict,
+    and in a sorted copy of the numbers for batches of node numbers. If a
+    node number appears more than once, its first row is returned.
+
+    Attributes:
+        numbers     Array of node numbers, in row order
+        first       Smallest node number
+        dense       Array of rows indexed by node number - first, -1 for
+                    gaps (None for sparse numbering)
+
+    """
+
+    # The dense lookup array may be this much bigger than the number of
+    # nodes before a dict is used instead
+    max_fill = 4
+
+    def __init__(self, numbers):
+        """Initialize a new FRDNodeIndex Object.
+
+        Parameters:
+            numbers     Array of node numbers, in row order
+
+        """
+        self.numbers = np.asarray(numbers).reshape(-1)
+        self.first = 0
+        self.dense = None
+        self._rows = None
+        self._order = None
+
+        rows = np.arange(len(self.numbers))
+        if len(self.numbers):
+            self.first = int(self.numbers.min())
+            span = int(self.numbers.max()) - self.first + 1
+            if span <= FRDNodeIndex.max_fill*len(self.numbers) + 1024:
+                self.dense = np.full(span, -1, dtype=np.int64)
+                # Assign backwards, so repeated numbers keep their first row
+                self.dense[self.numbers[::-1] - self.first] = rows[::-1]
+
+        if self.dense is None:
+            self._rows = dict(zip(self.numbers[::-1].tolist(),
+                                  rows[::-1].tolist()))
+            self._order = np.argsort(self.numbers, kind='stable')
+
+    def row(self, number):
+        """Row of node number, or None if the node is not in the block."""
+        if self.dense is not None:
+            idx = number - self.first
+            if 0 <= idx < len(self.dense):
+                row = int(self.dense[idx])
+                if row >= 0:
+                    return row
+            return None
+        return self._rows.get(number)
+
+    def rows(self, numbers):
+        """Array of rows for an array of node numbers, -1 if not found."""
+        numbers = np.asarray(numbers, dtype=np.int64)
+        rows = np.full(numbers.shape, -1, dtype=np.int64)
+        if len(self.numbers) == 0:
+            return rows
+
+        if self.dense is not None:
+            idx = numbers - self.first
+            found = (idx >= 0) & (idx < len(self.dense))
+            rows[found] = self.dense[idx[found]]
+        else:
+            sorted_numbers = self.numbers[self._order]
+            pos = np.minimum(np.searchsorted(sorted_numbers, numbers),
+                             len(sorted_numbers) - 1)
+            found = sorted_numbers[pos] == numbers
+            rows[found] = self._order[pos[found]]
+        return rows
+
+
+class FRDNodeGrid(object):
+    """This class finds the nodes closest to given positions.
+
+    The node coordinates are sorted into a uniform grid of cubic cells,
+    with about one node per cell. A query only looks at the cells around
+    its position, and widens the search until no node outside the searched
+    cells can be closer than the closest one found. Queries are done for
+    whole arrays of positions at once.
+
+    Attributes:
+        coords      (numnod, 3) array of the node coordinates
+        low         Lower corner of the grid
+        cell_size   Edge length of the grid cells
+        shape       Number of cells along x, y and z
+
+    """
+
+    # Number of cells looked at in one go by a batch of queries
+    max_search_cells = 1 << 20
+
+    def __init__(self, coords):
+        """Initialize a new FRDNodeGrid Object.
+
+        Parameters:
+            coords      (numnod, 3) array of the node coordinates
+
+        """
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        numnod = len(self.coords)
+        self.low = np.zeros(3)
+        self.cell_size = 1.0
+        self.shape = np.ones(3, dtype=np.int64)
+
+        if numnod:
+            self.low = self.coords.min(axis=0)
+            extent = self.coords.max(axis=0) - self.low
+            # Flat or straight meshes only spread the nodes over their
+            # non-zero extents
+            spans = extent[extent > 0]
+            if len(spans):
+                self.cell_size = float(
+                    (np.prod(spans)/numnod)**(1.0/len(spans)))
+                self.shape = (extent//self.cell_size).astype(np.int64) + 1
+                while np.prod(self.shape) > 4*numnod + 64:
+                    self.cell_size *= 1.5
+                    self.shape = (extent//self.cell_size).astype(np.int64) + 1
+
+        # Node rows sorted by cell, in compressed sparse row form: the nodes
+        # in cell i are _rows[_offsets[i]:_offsets[i+1]]
+        cell_ids = self._cell_ids(self._cells(self.coords))
+        self._rows = np.argsort(cell_ids, kind='stable')
+        self._offsets = np.zeros(int(np.prod(self.shape)) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell_ids, minlength=len(self._offsets) - 1),
+                  out=self._offsets[1:])
+
+    def _cells(self, points):
+        """Grid cell of each point, positions outside the grid are clamped."""
+        cells = np.floor((points - self.low)/self.cell_size)
+        return np.clip(cells, 0, self.shape - 1).astype(np.int64)
+
+    def _cell_ids(self, cells):
+        """Linear index of grid cells."""
+        return (cells[..., 0]*self.shape[1] + cells[..., 1])*self.shape[2] \
+            + cells[..., 2]
+
+    def nearest(self, points):
+        """Rows of the closest node to each of an (M, 3) array of points.
+
+        If several nodes are equally close, the one in the lowest row is
+        returned, the same as an argmin over all nodes. Returns -1 for all
+        points if there are no nodes.
+
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        rows = np.full(len(points), -1, dtype=np.int64)
+        dists = np.full(len(points), np.inf)
+        if len(self.coords) == 0:
+            return rows
+
+        # First find any close node, in the cells around each point
+        cells = self._cells(points)
+        searched_low = np.empty_like(cells)
+        searched_high = np.empty_like(cells)
+        todo = np.arange(len(points))
+        radius = 1
+        while len(todo):
+            low = np.maximum(cells[todo] - radius, 0)
+            high = np.minimum(cells[todo] + radius, self.shape - 1)
+            rows[todo], dists[todo] = self._search(points[todo], low, high)
+            searched_low[todo] = low
+            searched_high[todo] = high
+            todo = todo[rows[todo] < 0]
+            radius *= 2
+
+        # Nodes closer than the one found can only be in the cells within
+        # that distance, so search those unless they were searched already
+        reach = np.sqrt(dists)[:, None]*(1.0 + 1e-9)
+        low = self._cells(points - reach)
+        high = self._cells(points + reach)
+        todo = np.flatnonzero(((low < searched_low) |
+                               (high > searched_high)).any(axis=1))
+        if len(todo):
+            rows[todo], dists[todo] = self._search(
+                points[todo], low[todo], high[todo])
+
+        return rows
+
+    def _search(self, points, low, high):
+        """Closest node to each point among the cells from low to high.
+
+        Returns the node rows (-1 if there are no nodes in the cells) and
+        the squared distances.
+
+        """
+        rows = np.full(len(points), -1, dtype=np.int64)
+        dists = np.full(len(points), np.inf)
+        dims = high - low + 1
+        num_cells = dims.prod(axis=1)
+
+        # Search in chunks of points, to bound the memory used
+        ends = np.cumsum(num_cells)
+        start = 0
+        while start < len(points):
+            stop = max(start + 1, int(np.searchsorted(
+                ends, ends[start] - num_cells[start]
+                + FRDNodeGrid.max_search_cells, side='right')))
+            part = slice(start, stop)
+            rows[part], dists[part] = self._search_chunk(
+                points[part], low[part], dims[part], num_cells[part])
+            start = stop
+        return rows, dists
+
+    def _search_chunk(self, points, low, dims, num_cells):
+        """Closest node to each point among a box of dims cells at low."""
+        # All cells in the box of each point, with the point they belong to
+        point_idx = np.repeat(np.arange(len(points)), num_cells)
+        j = np.arange(int(num_cells.sum())) \
+            - np.repeat(np.cumsum(num_cells) - num_cells, num_cells)
+        dims = dims[point_idx]
+        cells = low[point_idx] + np.stack(
+            [j//(dims[:, 1]*dims[:, 2]), (j//dims[:, 2]) % dims[:, 1],
+             j % dims[:, 2]], axis=1)
+        cell_ids = self._cell_ids(cells)
+        starts = self._offsets[cell_ids]
+        counts = self._offsets[cell_ids + 1] - starts
+
+        # All nodes in those cells
+        ends = np.cumsum(counts)
+        candidates = self._rows[np.repeat(starts - ends + counts, counts)
+                                + np.arange(ends[-1] if len(ends) else 0)]
+        point_idx = np.repeat(point_idx, counts)
+        deltas = self.coords[candidates] - points[point_idx]
+        cand_dists = np.einsum('ij,ij->i', deltas, deltas)
+
+        # The candidates are grouped by point, so reduce each group to its
+        # closest node, and to the lowest row among equally close nodes
+        rows = np.full(len(points), -1, dtype=np.int64)
+        dists = np.full(len(points), np.inf)
+        if len(candidates):
+            found = np.flatnonzero(np.bincount(point_idx,
+                                               minlength=len(points)))
+            group_starts = np.searchsorted(point_idx, found)
+            dists[found] = np.minimum.reduceat(cand_dists, group_starts)
+            closest = np.where(cand_dists == dists[point_idx], candidates,
+                               len(self.coords))
+            rows[found] = np.minimum.reduceat(closest, group_starts)
+        return rows, dists
+
+
+class FRDNodeBlock(FRDLazyBlock):
     """This class represents a node block in the .frd File.
 
     Attributes:
@@ -99,7 +705,11 @@ class FRDNodeBlock(object):
                         1   ASCII long
                         2   Binary float (4 bytes)
                         3   Binary double (8 bytes)
-        nodes       List containing FRDNode objects defined in this block
+        numbers     Array of the node numbers in this block
+        coords      (numnod, 3) array of the node coordinates, in the same
+                    order as numbers
+        nodes       List containing FRDNode objects defined in this block,
+                    only built from numbers and coords when first accessed
 
     """
 
@@ -116,41 +726,152 @@ class FRDNodeBlock(object):
             in_file     File from which the FRDNodeBlock is to be read from
 
         """
+        super(FRDNodeBlock, self).__init__()
         self.key = 2
         self.code = 'C'
         self.numnod = None
         self.format = None
-        self.nodes = []
+        self._numbers = np.empty(0, dtype=np.int32)
+        self._coords = np.empty((0, 3))
+        self._nodes = None
+        self._index = None
         if in_file is not None:
             self._read(in_file)
 
+    @property
+    def numbers(self):
+        """Array of the node numbers in this block."""
+        self._load_deferred()
+        return self._numbers
+
+    @numbers.setter
+    def numbers(self, numbers):
+        self._numbers = numbers
+        self._index = None
+
+    @property
+    def index(self):
+        """FRDNodeIndex from node numbers to rows of numbers and coords."""
+        if self._index is None:
+            self._index = FRDNodeIndex(self.numbers)
+        return self._index
+
+    @property
+    def coords(self):
+        """(numnod, 3) array of the node coordinates."""
+        self._load_deferred()
+        return self._coords
+
+    @coords.setter
+    def coords(self, coords):
+        self._coords = coords
+
+    @property
+    def nodes(self):
+        """List of FRDNode objects, built from numbers and coords on demand.
+
+        The arrays hold the actual data, so changes have to be made by
+        assigning a new list, not by modifying the returned one.
+
+        """
+        self._load_deferred()
+        if self._nodes is None:
+            self._nodes = []
+            for number, pos in zip(self.numbers.tolist(), self.coords.tolist()):
+                node = FRDNode()
+                node.number = number
+                node.pos = pos
+                self._nodes.append(node)
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self.set_nodes([node.number for node in nodes],
+                       [node.pos for node in nodes])
+
+    def set_nodes(self, numbers, coords):
+        """Replace all nodes in this block.
+
+        Parameters:
+            numbers     Node numbers
+            coords      Node coordinates (as xyz-tuples), in the same order
+
+        """
+        self.data_offset = None
+        self.numbers = np.asarray(numbers, dtype=np.int32).reshape(-1)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        self.numnod = len(self.numbers)
+        self._nodes = None
+
+    @staticmethod
+    def record_dtype(node_format):
+        """Numpy dtype of a single node record in binary format node_format."""
+        return np.dtype([('number', '<i4'),
+                         ('pos', '<f4' if node_format == 2 else '<f8', (3,))])
+
     def _read(self, in_file):
         """Read values for this FRDNodeBlock Object from File in_file."""
+        self._read_header(in_file)
+        self._read_data(in_file)
+
+    def _read_header(self, in_file):
+        """Read the header line of this FRDNodeBlock from File in_file."""
         in_file.read(18)  # pad bytes
         self.numnod = int(in_file.read(12))
         in_file.read(37)  # pad bytes
         self.format = int(in_file.read(1))
         in_file.read(1)  # eol
-        self.nodes = []
 
-        for _ in range(self.numnod):
-            node = FRDNode()
-            self.nodes.append(node)
-            if self.format < 2:
-                in_file.read(1)
-                node.key = int(in_file.read(2))
-                node.number = int(in_file.read(5*(self.format+1)))
-                node.pos = [float(in_file.read(12)) for j in range(3)]
-                in_file.read(1)  # eol
-            else:
-                node.number = struct.unpack('i', in_file.read(4))[0]
-                if self.format == 2:
-                    node.pos = struct.unpack('fff', in_file.read(12))
-                else:
-                    node.pos = struct.unpack('ddd', in_file.read(24))
+    def _data_size(self):
+        """Size in bytes of the data of a binary FRDNodeBlock."""
+        return self.numnod*FRDNodeBlock.record_dtype(self.format).itemsize
+
+    def _map_data(self, buf, offset):
+        """Map the nodes of a binary FRDNodeBlock onto buf, without copying."""
+        self._nodes = None
+        records = np.frombuffer(buf, dtype=FRDNodeBlock.record_dtype(self.format),
+                                count=self.numnod, offset=offset)
+        self.numbers = records['number']
+        self.coords = records['pos']
+
+    def _copy_mapped(self):
+        """Copy the mapped arrays of this FRDNodeBlock into memory."""
+        self.numbers = np.array(self.numbers)
+        self.coords = np.array(self.coords)
+
+    def _read_data(self, in_file):
+        """Read the nodes of this FRDNodeBlock from File in_file."""
+        self._nodes = None
 
         if self.format < 2:
+            num_width = 5*(self.format+1)
+            # Every node is a single fixed-width line, so read them all
+            # at once and convert the columns in bulk
+            records = _read_records(
+                in_file, self.numnod, [3 + num_width + 3*12 + 1])
+            if records is not None:
+                self.numbers = _parse_fields(
+                    records, 3, num_width, 1, np.int32).reshape(-1)
+                self.coords = _parse_fields(
+                    records, 3 + num_width, 12, 3, np.float64)
+            else:
+                numbers = []
+                coords = []
+                for _ in range(self.numnod):
+                    in_file.read(3)  # pad byte and key = -1
+                    numbers.append(int(in_file.read(num_width)))
+                    coords.append([float(in_file.read(12)) for j in range(3)])
+                    in_file.readline()  # eol
+                self.numbers = np.array(numbers, dtype=np.int32)
+                self.coords = np.array(coords, dtype=np.float64).reshape(-1, 3)
             in_file.readline()  # last record for ascii only
+        else:
+            # Binary records have a fixed size, so read the whole block at once
+            dtype = FRDNodeBlock.record_dtype(self.format)
+            records = np.frombuffer(
+                in_file.read(self.numnod*dtype.itemsize), dtype=dtype)
+            self.numbers = records['number']
+            self.coords = records['pos']
 
     def _write(self, out_file):
         """Write values for this FRDNodeBlock Object to File out_file."""
@@ -163,26 +884,15 @@ class FRDNodeBlock(object):
         out_file.write('{:1d}'.format(self.format).encode())
         out_file.write('\n'.encode())
 
-        for node in self.nodes:
-            if self.format < 2:
-                out_file.write(' '.encode())
-                out_file.write('-1'.encode())
-                if self.format == 0:
-                    out_file.write('{:5d}'.format(node.number).encode())
-                else:
-                    out_file.write('{:10d}'.format(node.number).encode())
-                for i in range(3):
-                    out_file.write('{:12.5E}'.format(node.pos[i]).encode())
-                out_file.write('\n'.encode())
-            else:
-                out_file.write(struct.pack('i', node.number))
-                if self.format == 2:
-                    out_file.write(struct.pack('fff', *node.pos))
-                else:
-                    out_file.write(struct.pack('ddd', *node.pos))
-
+        # All nodes are written from the arrays in bulk
         if self.format < 2:
+            num_format = '%{:d}d'.format(5*(self.format+1))
+            _write_lines(out_file, ' -1' + num_format + '%12.5E'*3 + '\n',
+                         [self.numbers, self.coords])
             out_file.write(' -3\n'.encode())  # last record for ascii only
+        else:
+            _write_records(out_file, FRDNodeBlock.record_dtype(self.format),
+                           [self.numbers, self.coords])
 
 
 class FRDElem(object):
@@ -229,18 +939,31 @@ class FRDElem(object):
         self.key = -1
 
 
-class FRDElemBlock(object):
+class FRDElemBlock(FRDLazyBlock):
     """This class represents an element block in the .frd File.
 
+    The element data is stored in arrays. The node numbers of the elements
+    are stored in one connectivity array for each element type, since the
+    number of nodes per element depends on the type.
+
     Attributes:
-        key         Element Block Key (Always 3)
-        code        Element Block Code (Always C)
-        numelem     Number of elements in this block
-        format      Format indicator:
-                        0   ASCII short
-                        1   ASCII long
-                        2   Binary
-        elems       List containing FRDElem objects defined in this block
+        key             Element Block Key (Always 3)
+        code            Element Block Code (Always C)
+        numelem         Number of elements in this block
+        format          Format indicator:
+                            0   ASCII short
+                            1   ASCII long
+                            2   Binary
+        numbers         Array of the element numbers in this block
+        types           Array of the element types, in the same order
+        groups          Array of the element group numbers
+        materials       Array of the element material numbers
+        connectivity    Dict of element type to a (number of elements,
+                        nodes per element) array of node numbers
+        type_rows       Dict of element type to an array of the rows (in
+                        numbers) of the elements in connectivity
+        elems           List containing FRDElem objects defined in this
+                        block, only built from the arrays when first accessed
 
     """
 
@@ -257,57 +980,319 @@ class FRDElemBlock(object):
             in_file     File from which the FRDElemBlock is to be read from
 
         """
+        super(FRDElemBlock, self).__init__()
         self.key = 3
         self.code = 'C'
         self.numelem = None
         self.format = None
-        self.elems = []
+        self._set_arrays([], [], [], [], {})
         if in_file is not None:
             self._read(in_file)
 
+    @property
+    def numbers(self):
+        """Array of the element numbers in this block."""
+        self._load_deferred()
+        return self._numbers
+
+    @property
+    def types(self):
+        """Array of the element types in this block."""
+        self._load_deferred()
+        return self._types
+
+    @property
+    def groups(self):
+        """Array of the element group numbers in this block."""
+        self._load_deferred()
+        return self._groups
+
+    @property
+    def materials(self):
+        """Array of the element material numbers in this block."""
+        self._load_deferred()
+        return self._materials
+
+    @property
+    def connectivity(self):
+        """Dict of element type to an array of node numbers per element."""
+        self._load_deferred()
+        return self._connectivity
+
+    @property
+    def type_rows(self):
+        """Dict of element type to the rows of its elements in numbers."""
+        self._load_deferred()
+        return self._type_rows
+
+    @property
+    def elems(self):
+        """List of FRDElem objects, built from the arrays on demand.
+
+        The arrays hold the actual data, so changes have to be made by
+        assigning a new list, not by modifying the returned one.
+
+        """
+        self._load_deferred()
+        if self._elems is None:
+            elems = [FRDElem() for _ in range(len(self._numbers))]
+            for elem_type, nodes in self._connectivity.items():
+                for row, elem_nodes in zip(self._type_rows[elem_type].tolist(),
+                                           nodes.tolist()):
+                    elems[row].type = elem_type
+                    elems[row].nodes = elem_nodes
+            for elem, number, group, material in zip(
+                    elems, self._numbers.tolist(), self._groups.tolist(),
+                    self._materials.tolist()):
+                elem.number = number
+                elem.group = group
+                elem.material = material
+            self._elems = elems
+        return self._elems
+
+    @elems.setter
+    def elems(self, elems):
+        self.set_elems([elem.number for elem in elems],
+                       [elem.type for elem in elems],
+                       [elem.group for elem in elems],
+                       [elem.material for elem in elems],
+                       [elem.nodes for elem in elems])
+
+    def set_elems(self, numbers, types, groups, materials, nodes):
+        """Replace all elements in this block.
+
+        Parameters:
+            numbers     Element numbers
+            types       Element types, in the same order
+            groups      Element group numbers, in the same order
+            materials   Element material numbers, in the same order
+            nodes       Node numbers of each element, in the same order
+
+        """
+        self.data_offset = None
+        types = np.asarray(types, dtype=np.int32).reshape(-1)
+        self._set_arrays(numbers, types, groups, materials,
+                         FRDElemBlock._group_by_type(types, nodes))
+
+    def elem_nodes(self, row):
+        """Array of the node numbers of the element in the given row."""
+        self._load_deferred()
+        return self._connectivity[int(self._types[row])][self._type_pos[row]]
+
+    def type_nodes(self, elem_type, rows):
+        """Array of the node numbers of the elem_type elements in rows."""
+        self._load_deferred()
+        return self._connectivity[elem_type][self._type_pos[rows]]
+
+    @staticmethod
+    def _group_by_type(types, nodes):
+        """Connectivity arrays for node lists of elements of mixed types."""
+        connectivity = {}
+        for elem_type in np.unique(types).tolist():
+            rows = np.flatnonzero(types == elem_type).tolist()
+            connectivity[elem_type] = np.array(
+                [nodes[row] for row in rows], dtype=np.int32).reshape(
+                    len(rows), FRDElem.nodesPerType[elem_type])
+        return connectivity
+
+    def _set_arrays(self, numbers, types, groups, materials, connectivity):
+        """Store the element arrays and index the rows of each type."""
+        self._numbers = np.asarray(numbers, dtype=np.int32).reshape(-1)
+        self._types = np.asarray(types, dtype=np.int32).reshape(-1)
+        self._groups = np.asarray(groups, dtype=np.int32).reshape(-1)
+        self._materials = np.asarray(materials, dtype=np.int32).reshape(-1)
+        self._connectivity = connectivity
+        self.numelem = len(self._numbers)
+        self._elems = None
+
+        # Rows of the elements of each type, and the position of every
+        # element in the connectivity array of its type
+        self._type_rows = {}
+        self._type_pos = np.empty(self.numelem, dtype=np.int64)
+        if len(connectivity) == 1:
+            elem_type = list(connectivity)[0]
+            self._type_rows[elem_type] = np.arange(self.numelem)
+            self._type_pos[:] = self._type_rows[elem_type]
+        else:
+            for elem_type in connectivity:
+                rows = np.flatnonzero(self._types == elem_type)
+                self._type_rows[elem_type] = rows
+                self._type_pos[rows] = np.arange(len(rows))
+
+    @staticmethod
+    def record_dtype(elem_type):
+        """Numpy dtype of a single binary element record of elem_type."""
+        return np.dtype([('number', '<i4'), ('type', '<i4'),
+                         ('group', '<i4'), ('material', '<i4'),
+                         ('nodes', '<i4', (FRDElem.nodesPerType[elem_type],))])
+
     def _read(self, in_file):
         """Read values for this FRDElemBlock Object from File in_file."""
+        self._read_header(in_file)
+        self._read_data(in_file)
+
+    def _read_header(self, in_file):
+        """Read the header line of this FRDElemBlock from File in_file."""
         in_file.read(18)  # pad bytes
         self.numelem = int(in_file.read(12))
         in_file.read(37)  # pad bytes
         self.format = int(in_file.read(1))
         in_file.read(1)  # eol
-        self.elems = []
 
+    def _data_size(self, buf, offset):
+        """Size in bytes of the data of a binary FRDElemBlock.
+
+        The record size depends on the element type, so this needs the
+        block data in buf, starting at offset.
+
+        """
+        if self.numelem == 0:
+            return 0
+
+        # Meshes usually consist of a single element type, which can be
+        # confirmed with one strided look at all type fields
+        elem_type = struct.unpack_from('i', buf, offset + 4)[0]
+        rec_size = 4*(4 + FRDElem.nodesPerType[elem_type])
+        if offset + self.numelem*rec_size <= len(buf):
+            types = np.ndarray((self.numelem,), dtype='<i4', buffer=buf,
+                               offset=offset + 4, strides=(rec_size,))
+            if (types == elem_type).all():
+                return self.numelem*rec_size
+
+        # Otherwise walk the element records one by one
+        size = 0
+        for _ in range(self.numelem):
+            elem_type = struct.unpack_from('i', buf, offset + size + 4)[0]
+            size += 4*(4 + FRDElem.nodesPerType[elem_type])
+        return size
+
+    def _read_data(self, in_file):
+        """Read the elements of this FRDElemBlock from File in_file."""
+        # Meshes usually consist of a single element type, so all element
+        # records have the same size and are converted in bulk. Blocks of
+        # mixed types are read element by element.
+        if self.format < 2:
+            read_ok = self._read_ascii_records(in_file)
+        else:
+            read_ok = self._read_binary_records(in_file)
+        if read_ok:
+            if self.format < 2:
+                in_file.readline()  # last record for ascii only
+            return
+
+        numbers = []
+        types = []
+        groups = []
+        materials = []
+        nodes = []
         for _ in range(self.numelem):
-            elem = FRDElem()
-            self.elems.append(elem)
             if self.format < 2:
-                in_file.read(1)
-                elem.key = int(in_file.read(2))
-                elem.number = int(in_file.read(5*(self.format+1)))
-                elem.type = int(in_file.read(5))
-                elem.group = int(in_file.read(5))
-                elem.material = int(in_file.read(5))
-                in_file.read(1)  # eol
-                elem.nodes = []
-                num_nodes = FRDElem.nodesPerType[elem.type]
-                num_lines = int(num_nodes/(5*(3-self.format)+1))+1
-                for j in range(num_lines):
+                in_file.read(3)  # pad byte and key = -1
+                numbers.append(int(in_file.read(5*(self.format+1))))
+                types.append(int(in_file.read(5)))
+                groups.append(int(in_file.read(5)))
+                materials.append(int(in_file.read(5)))
+                in_file.readline()  # eol
+                elem_nodes = []
+                for count in _nodes_per_line(
+                        FRDElem.nodesPerType[types[-1]], self.format):
                     in_file.read(3)  # pad byte and key = -2
-                    k_start = j*5*(3-self.format)
-                    k_end = min(num_nodes - k_start, (j+1)*5*(3-self.format))
-                    for _ in range(0, k_end):
-                        elem.nodes.append(
+                    for _ in range(count):
+                        elem_nodes.append(
                             int(in_file.read(5*(self.format+1))))
-                    in_file.read(1)  # eol
+                    in_file.readline()  # eol
+                nodes.append(elem_nodes)
             else:
-                elem.number = struct.unpack('i', in_file.read(4))[0]
-                elem.type = struct.unpack('i', in_file.read(4))[0]
-                num_nodes = FRDElem.nodesPerType[elem.type]
-                elem.group = struct.unpack('i', in_file.read(4))[0]
-                elem.material = struct.unpack('i', in_file.read(4))[0]
-                elem.nodes = struct.unpack(
-                    'i'*num_nodes, in_file.read(num_nodes*4))
-
+                number, elem_type, group, material = struct.unpack(
+                    'iiii', in_file.read(16))
+                num_nodes = FRDElem.nodesPerType[elem_type]
+                numbers.append(number)
+                types.append(elem_type)
+                groups.append(group)
+                materials.append(material)
+                nodes.append(struct.unpack(
+                    'i'*num_nodes, in_file.read(num_nodes*4)))
+
+        types = np.array(types, dtype=np.int32)
+        self._set_arrays(numbers, types, groups, materials,
+                         FRDElemBlock._group_by_type(types, nodes))
         if self.format < 2:
             in_file.readline()  # last record for ascii only
 
+    def _read_ascii_records(self, in_file):
+        """Read an ASCII block of a single element type in bulk.
+
+        Returns False, with the file position restored, if the block
+        does not consist of fixed-width records of a single type.
+
+        """
+        if self.numelem == 0:
+            self._set_arrays([], [], [], [], {})
+            return True
+
+        num_width = 5*(self.format+1)
+        head_len = 3 + num_width + 3*5 + 1
+        start = in_file.tell()
+        try:
+            elem_type = int(in_file.read(head_len)[3 + num_width:][:5])
+            per_line = _nodes_per_line(FRDElem.nodesPerType[elem_type],
+                                       self.format)
+        except (ValueError, IndexError):
+            in_file.seek(start)
+            return False
+        in_file.seek(start)
+
+        records = _read_records(
+            in_file, self.numelem,
+            [head_len] + [3 + count*num_width + 1 for count in per_line])
+        if records is None:
+            return False
+        try:
+            fields = _parse_fields(records, 3, num_width, 1, np.int32)
+            fields = np.hstack(
+                [fields, _parse_fields(records, 3 + num_width, 5, 3, np.int32)])
+            if not (fields[:, 1] == elem_type).all():
+                raise ValueError('mixed element types')
+            nodes = []
+            offset = head_len
+            for count in per_line:
+                nodes.append(_parse_fields(
+                    records, offset + 3, num_width, count, np.int32))
+                offset += 3 + count*num_width + 1
+        except ValueError:
+            in_file.seek(start)
+            return False
+
+        self._set_arrays(fields[:, 0], fields[:, 1], fields[:, 2],
+                         fields[:, 3], {elem_type: np.hstack(nodes)})
+        return True
+
+    def _read_binary_records(self, in_file):
+        """Read a binary block of a single element type in bulk.
+
+        Returns False, with the file position restored, if the block
+        contains more than one element type.
+
+        """
+        if self.numelem == 0:
+            self._set_arrays([], [], [], [], {})
+            return True
+
+        start = in_file.tell()
+        elem_type = struct.unpack('ii', in_file.read(8))[1]
+        in_file.seek(start)
+        dtype = FRDElemBlock.record_dtype(elem_type)
+        data = in_file.read(self.numelem*dtype.itemsize)
+        if len(data) == self.numelem*dtype.itemsize:
+            records = np.frombuffer(data, dtype=dtype)
+            if (records['type'] == elem_type).all():
+                self._set_arrays(records['number'], records['type'],
+                                 records['group'], records['material'],
+                                 {elem_type: records['nodes']})
+                return True
+        in_file.seek(start)
+        return False
+
     def _write(self, out_file):
         """Write values for this FRDElemBlock Object to File out_file."""
         out_file.write(' '.encode())  # pad byte
@@ -319,41 +1304,36 @@ class FRDElemBlock(object):
         out_file.write('{:1d}'.format(self.format).encode())
         out_file.write('\n'.encode())
 
-        for elem in self.elems:
+        # The record layout depends on the element type, so every run of
+        # consecutive elements of the same type is written in bulk
+        num_format = '%{:d}d'.format(5*(self.format+1))
+        for elem_type, start, stop in self._type_runs():
+            pos = int(self._type_pos[start])
+            columns = [self._numbers[start:stop], self._types[start:stop],
+                       self._groups[start:stop], self._materials[start:stop],
+                       self._connectivity[elem_type][pos:pos + stop - start]]
             if self.format < 2:
-                out_file.write(' -1'.encode())
-                if self.format == 0:
-                    out_file.write('{:5d}'.format(elem.number).encode())
-                else:
-                    out_file.write('{:10d}'.format(elem.number).encode())
-                out_file.write('{:5d}'.format(elem.type).encode())
-                out_file.write('{:5d}'.format(elem.group).encode())
-                out_file.write('{:5d}'.format(elem.material).encode())
-                out_file.write('\n'.encode())
-                num_nodes = FRDElem.nodesPerType[elem.type]
-                num_lines = int(num_nodes/(5*(3-self.format)+1))+1
-                for j in range(num_lines):
-                    out_file.write(' -2'.encode())  # pad byte and key = -2
-                    k_start = j*5*(3-self.format)
-                    k_end = min(num_nodes, (j+1)*5*(3-self.format))
-                    if self.format == 0:
-                        for k in range(k_start, k_end):
-                            out_file.write(
-                                '{:5d}'.format(elem.nodes[k]).encode())
-                    else:
-                        for k in range(k_start, k_end):
-                            out_file.write(
-                                '{:10d}'.format(elem.nodes[k]).encode())
-                    out_file.write('\n'.encode())  # eol
+                record_format = ' -1' + num_format + '%5d'*3 + '\n'
+                for count in _nodes_per_line(FRDElem.nodesPerType[elem_type],
+                                             self.format):
+                    record_format += ' -2' + num_format*count + '\n'
+                _write_lines(out_file, record_format, columns)
             else:
-                out_file.write(struct.pack('i', elem.number))
-                out_file.write(struct.pack('i', elem.type))
-                out_file.write(struct.pack('i', elem.group))
-                out_file.write(struct.pack('i', elem.material))
-                out_file.write(struct.pack('i'*num_nodes, *elem.nodes))
+                _write_records(out_file, FRDElemBlock.record_dtype(elem_type),
+                               columns)
 
         if self.format < 2:
-            out_file.write(' -3\n')  # last record for ascii only
+            out_file.write(' -3\n'.encode())  # last record for ascii only
+
+    def _type_runs(self):
+        """List of (type, start, stop) of the runs of elements of one type."""
+        self._load_deferred()
+        if self.numelem == 0:
+            return []
+        starts = np.flatnonzero(self._types[1:] != self._types[:-1]) + 1
+        bounds = [0] + starts.tolist() + [self.numelem]
+        return [(int(self._types[start]), start, stop)
+                for start, stop in zip(bounds[:-1], bounds[1:])]
 
 
 class FRDEntity(object):
@@ -418,7 +1398,7 @@ class FRDNodeResult(object):
         self.data = None
 
 
-class FRDResultBlock(object):
+class FRDResultBlock(FRDLazyBlock):
     """This class represents a nodal result block in the .frd File.
 
     Attributes:
@@ -444,7 +1424,14 @@ class FRDResultBlock(object):
         ncomps      number of entities
         irtype      1   Nodal data, material independent (only type imple.)
         entities    List of contained FRDEntity objects
-        results     List of contained FRDNodeResult objects
+        numbers     Array of the node numbers with results in this block
+        values      (numnod, ncomps) float32 array of the results, in the
+                    same order as numbers
+        results     List of contained FRDNodeResult objects, only built
+                    from numbers and values when first accessed
+
+    Quantities derived from the results of STRESS and DISP blocks are
+    available through derived().
 
     """
 
@@ -464,6 +1451,7 @@ class FRDResultBlock(object):
             in_file     File from which the FRDResultBlock is to be read
 
         """
+        super(FRDResultBlock, self).__init__()
         self.key = 100
         self.code = 'C'
         self.setname = None
@@ -478,19 +1466,155 @@ class FRDResultBlock(object):
         self.ncomps = None
         self.irtype = None
         self.entities = []
-        self.results = []
+        self._numbers = np.empty(0, dtype=np.int32)
+        self._values = np.empty((0, 0), dtype=np.float32)
+        self._results = None
+        self._index = None
+        self._derived = None
         if in_file is not None:
             self._read(in_file)
 
+    @property
+    def numbers(self):
+        """Array of the node numbers with results in this block."""
+        self._load_deferred()
+        return self._numbers
+
+    @numbers.setter
+    def numbers(self, numbers):
+        self._numbers = numbers
+        self._index = None
+
+    @property
+    def index(self):
+        """FRDNodeIndex from node numbers to rows of numbers and values."""
+        if self._index is None:
+            self._index = FRDNodeIndex(self.numbers)
+        return self._index
+
+    @property
+    def values(self):
+        """(numnod, ncomps) float32 array of the results."""
+        self._load_deferred()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self._derived = None
+
+    def derived(self, quantity):
+        """Quantity derived from the results of all nodes in this block.
+
+        All quantities of a block are computed together the first time one
+        of them is requested, and kept until the values change.
+
+        Parameters:
+            quantity    Name of the derived quantity:
+                            STRESS  MISES, TRESCA, PS1, PS2, PS3
+                            DISP    MAG
+
+        Returns a (numnod,) float64 array in the same order as numbers.
+
+        """
+        if self._derived is None:
+            self._derived = self._derive(self.values)
+        if quantity not in self._derived:
+            raise ValueError('{} is not derived from {} results'.format(
+                quantity, self.name))
+        return self._derived[quantity]
+
+    def derived_rows(self, quantity, rows):
+        """Quantity derived from the results of some nodes in this block.
+
+        The cached quantities are used if derived() has computed them.
+        Otherwise only quantity is computed, for the given rows and without
+        caching it, so a large block can be processed in chunks.
+
+        Parameters:
+            quantity    Name of the derived quantity, see derived(), or a
+                        list of names to derive several quantities at once
+            rows        Slice or array of rows of numbers and values
+
+        Returns a float64 array with one value for each row, or a list of
+        such arrays for a list of names.
+
+        """
+        names = [quantity] if isinstance(quantity, str) else list(quantity)
+        if self._derived is not None:
+            arrays = [self.derived(name)[rows] for name in names]
+        else:
+            fields = self._derive(self.values[rows],
+                                  names[0] if len(names) == 1 else None)
+            for name in names:
+                if name not in fields:
+                    raise ValueError('{} is not derived from {} results'.format(
+                        name, self.name))
+            arrays = [fields[name] for name in names]
+        return arrays[0] if isinstance(quantity, str) else arrays
+
+    def _derive(self, values, quantity=None):
+        """Dict of the quantities derived from values of this block."""
+        if self.name not in _DERIVED:
+            raise ValueError(
+                'No quantities are derived from {} results'.format(self.name))
+        ncomps, fields = _DERIVED[self.name]
+        if self.ncomps < ncomps:
+            raise ValueError('{} results have {:d} components, {:d} '
+                             'are needed'.format(self.name, self.ncomps,
+                                                 ncomps))
+        return fields(values, quantity)
+
+    @property
+    def results(self):
+        """List of FRDNodeResult objects, built from numbers and values.
+
+        The arrays hold the actual data, so changes have to be made by
+        assigning a new list, not by modifying the returned one.
+
+        """
+        self._load_deferred()
+        if self._results is None:
+            self._results = []
+            for number, data in zip(self.numbers.tolist(), self.values.tolist()):
+                result = FRDNodeResult()
+                result.node = number
+                result.data = data
+                self._results.append(result)
+        return self._results
+
+    @results.setter
+    def results(self, results):
+        self.set_results([result.node for result in results],
+                         [result.data for result in results])
+
+    def set_results(self, numbers, values):
+        """Replace all nodal results in this block.
+
+        Parameters:
+            numbers     Node numbers
+            values      Result values for each node, in the same order
+
+        """
+        self.data_offset = None
+        self.numbers = np.asarray(numbers, dtype=np.int32).reshape(-1)
+        self.values = np.asarray(values, dtype=np.float32).reshape(
+            len(self.numbers), -1)
+        self.numnod = len(self.numbers)
+        self._results = None
+
+    @staticmethod
+    def record_dtype(ncomps):
+        """Numpy dtype of a single binary record with ncomps components."""
+        return np.dtype([('node', '<i4'), ('data', '<f4', (ncomps,))])
+
     def _read(self, in_file):
         """Read values for this FRDResultBlock Object from File in_file."""
-        #
-        # I know this function is long, but the FRD block is long as well...
-        # Splitting this into multiple functions would not help in my opinion.
-        # Therefore -> shut up pylint
-        # pylint: disable=too-many-branches
-        # pylint: disable=too-many-statements
-        #
+        self._read_header(in_file)
+        self._read_data(in_file)
+
+    def _read_header(self, in_file):
+        """Read the header and entity lines of this FRDResultBlock."""
         self.setname = in_file.read(6).decode().strip()
         self.value = float(in_file.read(12))
         self.numnod = int(in_file.read(12))
@@ -533,30 +1657,74 @@ class FRDResultBlock(object):
                 entity.iexist = int(in_file.read(5))
             in_file.read(1)  # eol
 
-        for i in range(self.numnod):
-            result = FRDNodeResult()
-            self.results.append(result)
-            if self.format < 2:
-                num_lines = int(self.ncomps/(6 + 1)) + 1
-                result.data = []
-                for j in range(num_lines):
-                    in_file.read(3)  # pad byte and key = -1 || -2
-                    if result.node is None:
-                        result.node = int(in_file.read(5*(self.format+1)))
-                    else:
-                        in_file.read(5*(self.format+1))
-                    k_start = j*6
-                    k_end = min(self.ncomps - k_start, (j+1)*6)
-                    for _ in range(0, k_end):
-                        result.data.append(float(in_file.read(12)))
-                    in_file.read(1)  # eol
-            else:
-                result.node = struct.unpack('i', in_file.read(4))[0]
-                result.data = struct.unpack(
-                    'f'*self.ncomps, in_file.read(self.ncomps*4))
-
+    def _data_size(self):
+        """Size in bytes of the data of a binary FRDResultBlock."""
+        return self.numnod*FRDResultBlock.record_dtype(self.ncomps).itemsize
+
+    def _map_data(self, buf, offset):
+        """Map the results of a binary FRDResultBlock onto buf, without copying."""
+        self._results = None
+        records = np.frombuffer(buf, dtype=FRDResultBlock.record_dtype(self.ncomps),
+                                count=self.numnod, offset=offset)
+        self.numbers = records['node']
+        self.values = records['data'].reshape(self.numnod, self.ncomps)
+
+    def _copy_mapped(self):
+        """Copy the mapped arrays of this FRDResultBlock into memory."""
+        self.numbers = np.array(self.numbers)
+        self.values = np.array(self.values)
+
+    def _read_data(self, in_file):
+        """Read the nodal results of this FRDResultBlock from File in_file."""
+        self._results = None
         if self.format < 2:
+            num_width = 5*(self.format+1)
+            # Each node has a -1 line with up to 6 values, followed by -2
+            # continuation lines for the remaining values, so every node
+            # record has the same fixed layout
+            line_counts = _values_per_line(self.ncomps)
+            line_lengths = [3 + num_width + 12*count + 1
+                            for count in line_counts]
+            records = _read_records(in_file, self.numnod, line_lengths)
+            if records is not None:
+                self.numbers = _parse_fields(
+                    records, 3, num_width, 1, np.int32).reshape(-1)
+                self.values = np.empty(
+                    (self.numnod, self.ncomps), dtype=np.float32)
+                line_start = 0
+                k_start = 0
+                for count, length in zip(line_counts, line_lengths):
+                    self.values[:, k_start:k_start + count] = _parse_fields(
+                        records, line_start + 3 + num_width, 12, count,
+                        np.float64)
+                    line_start += length
+                    k_start += count
+            else:
+                numbers = []
+                values = []
+                for i in range(self.numnod):
+                    data = []
+                    for j, count in enumerate(line_counts):
+                        in_file.read(3)  # pad byte and key = -1 || -2
+                        if j == 0:
+                            numbers.append(int(in_file.read(num_width)))
+                        else:
+                            in_file.read(num_width)
+                        for _ in range(count):
+                            data.append(float(in_file.read(12)))
+                        in_file.readline()  # eol
+                    values.append(data)
+                self.numbers = np.array(numbers, dtype=np.int32)
+                self.values = np.array(values, dtype=np.float32).reshape(
+                    self.numnod, self.ncomps)
             in_file.readline()  # last record for ascii only
+        else:
+            # Binary records have a fixed size, so read the whole block at once
+            dtype = FRDResultBlock.record_dtype(self.ncomps)
+            records = np.frombuffer(
+                in_file.read(self.numnod*dtype.itemsize), dtype=dtype)
+            self.numbers = records['node']
+            self.values = records['data'].reshape(self.numnod, self.ncomps)
 
     def _write(self, out_file):
         """Write values for this FRDResultBlock Object to File out_file."""
@@ -609,33 +1777,46 @@ class FRDResultBlock(object):
                 out_file.write('{:5d}'.format(entity.iexist).encode())
             out_file.write('\n'.encode())  # eol
 
-        for result in self.results:
-            if self.format < 2:
-                num_lines = int(self.ncomps/(6 + 1)) + 1
-                for j in range(num_lines):
-                    if j == 0:
-                        out_file.write(' -1'.encode())  # pad byte and key = -1
-                        if self.format == 0:
-                            out_file.write(
-                                '{:5d}'.format(result.node).encode())
-                        else:
-                            out_file.write(
-                                '{:10d}'.format(result.node).encode())
-                    else:
-                        out_file.write(' -2'.encode())  # pad byte and key = -2
-                        out_file.write(' '*(5*(self.format+1)).encode())
-                    k_start = j*6
-                    k_end = min(self.ncomps - k_start, (j+1)*6)
-                    for k in range(k_start, k_end):
-                        out_file.write(
-                            '{:12.5E}'.format(result.data[k]).encode())
-                    out_file.write('\n'.encode())  # eol
-            else:
-                out_file.write(struct.pack('i', result.node))
-                out_file.write(struct.pack('f'*self.ncomps, *result.data))
-
+        # All nodal results are written from the arrays in bulk
         if self.format < 2:
+            # A -1 line with up to 6 values, followed by -2 continuation
+            # lines for the remaining values, the same layout as read
+            num_width = 5*(self.format+1)
+            record_format = ''
+            for j, count in enumerate(_values_per_line(self.ncomps)):
+                if j == 0:
+                    record_format += ' -1%{:d}d'.format(num_width)
+                else:
+                    record_format += ' -2' + ' '*num_width
+                record_format += '%12.5E'*count + '\n'
+            _write_lines(out_file, record_format, [self.numbers, self.values])
             out_file.write(' -3\n'.encode())  # last record for ascii only
+        else:
+            _write_records(out_file, FRDResultBlock.record_dtype(self.ncomps),
+                           [self.numbers, self.values])
+
+
+def _data_end(block, buf, offset):
+    """Byte offset in buf just after the data of block, starting at offset."""
+    # Rather not have the size methods public, but skipping over the data
+    # needs them, so make pylint shutup on these calls.
+    # pylint: disable=protected-access
+    if block.format < 2:
+        # ASCII blocks end with a -3 record
+        end = buf.find(b'\n -3', offset - 1)
+        if end < 0:
+            raise ValueError(
+                'Block at byte {:d} has no end record'.format(offset))
+        end = buf.find(b'\n', end + 1)
+        end = len(buf) if end < 0 else end + 1
+    elif isinstance(block, FRDElemBlock):
+        end = offset + block._data_size(buf, offset)
+    else:
+        end = offset + block._data_size()
+
+    if end > len(buf):
+        raise ValueError('Block at byte {:d} is truncated'.format(offset))
+    return end
 
 
 class FRDFile(object):
@@ -647,14 +1828,22 @@ class FRDFile(object):
         nodes       FRD node block in file
         elems       FRD element block in file
         results     All FRD result blocks in order of appearance
+        lazy        Bool - only scan the file on load, and read the data of
+                    node, element and result blocks on first access
+        use_mmap    Bool - like lazy, but memory-map the file, so the node
+                    coordinates and results of binary blocks are read-only
+                    views into the file rather than copies in memory
+        complete    Bool - the file ended with a 9999 record
 
     """
 
-    def __init__(self, file_name=None):
+    def __init__(self, file_name=None, lazy=False, use_mmap=False):
         """Initialize a new FRDFile Object.
 
-        Optional parameter:
+        Optional parameters:
             file_name    Path to the .frd file to be read
+            lazy         Bool - read block data on first access only
+            use_mmap     Bool - map binary block data instead of reading it
 
         """
         self.blocks = []
@@ -663,6 +1852,9 @@ class FRDFile(object):
         self.elem_block = None
         self.result_blocks = []
         self.file_name = file_name
+        self.lazy = lazy
+        self.use_mmap = use_mmap
+        self.complete = False
 
         if file_name is not None:
             self.load(file_name)
@@ -675,31 +1867,66 @@ class FRDFile(object):
 
         """
         self.file_name = file_name
+        self.complete = False
 
         with open(file_name, 'rb') as in_file:
-            eof = (in_file.read(1) == b'')
-
-            while not eof:
-                key = int(in_file.read(4))
-                code = in_file.read(1).decode()
-                block = None
-                if key == 1:
-                    block = FRDHeader(in_file, code)
-                    self.headers.append(block)
-                elif key == 2:
-                    block = FRDNodeBlock(in_file)
-                    self.node_block = block
-                elif key == 3:
-                    block = FRDElemBlock(in_file)
-                    self.elem_block = block
-                elif key == 100:
-                    block = FRDResultBlock(in_file)
-                    self.result_blocks.append(block)
-                elif key == 9999:
-                    eof = True
-                if block is not None:
-                    self.blocks.append(block)
-                eof = (eof or (in_file.read(1) == b''))
+            buf = None
+            if ((self.lazy or self.use_mmap)
+                    and os.fstat(in_file.fileno()).st_size > 0):
+                # Used to find where blocks end, and with use_mmap also kept
+                # open by the blocks, whose data arrays are views into it
+                buf = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            try:
+                eof = (in_file.read(1) == b'')
+
+                while not eof:
+                    key = int(in_file.read(4))
+                    code = in_file.read(1).decode()
+                    block = None
+                    if key == 1:
+                        block = FRDHeader(in_file, code)
+                        self.headers.append(block)
+                    elif key == 2:
+                        block = self._read_block(FRDNodeBlock, in_file, buf)
+                        self.node_block = block
+                    elif key == 3:
+                        block = self._read_block(FRDElemBlock, in_file, buf)
+                        self.elem_block = block
+                    elif key == 100:
+                        block = self._read_block(FRDResultBlock, in_file, buf)
+                        self.result_blocks.append(block)
+                    elif key == 9999:
+                        eof = True
+                        self.complete = True
+                    if block is not None:
+                        self.blocks.append(block)
+                    eof = (eof or (in_file.read(1) == b''))
+            except:
+                if buf is not None:
+                    buf.close()
+                raise
+            else:
+                # Without use_mmap nothing refers to the map any more. With
+                # it, the map is closed once the blocks and arrays are gone
+                if buf is not None and not self.use_mmap:
+                    buf.close()
+
+    def _read_block(self, block_class, in_file, buf):
+        """Read a block, or only its header if the file is loaded lazily."""
+        if buf is None:
+            return block_class(in_file)
+
+        # Rather not have the read methods public, but the lazy loading
+        # has to split them up, so make pylint shutup on these calls.
+        # pylint: disable=protected-access
+        block = block_class()
+        block._read_header(in_file)
+        offset = in_file.tell()
+        end = _data_end(block, buf, offset)
+        block._defer(self.file_name, offset, buf if self.use_mmap else None)
+        in_file.seek(end)
+        return block
 
     def save(self, file_name=None):
         """Save/Overwrite the .frd file at (previously) specified location."""
@@ -707,14 +1934,170 @@ class FRDFile(object):
             self.file_name = file_name
 
         if self.file_name is not None:
-            with open(file_name, 'wb') as out_file:
+            # Read everything still left in the file before overwriting it,
+            # including the data of memory-mapped blocks
+            for block in self.blocks:
+                if isinstance(block, FRDLazyBlock):
+                    # pylint: disable=protected-access
+                    block._load_in_memory()
+
+            with open(self.file_name, 'wb') as out_file:
                 for block in self.blocks:
                     # Rather not have the write methods public,
                     # since only this save function should be used,
                     # so make pylint shutup on this call.
                     # pylint: disable=protected-access
                     block._write(out_file)
-                out_file.write('9999'.encode())
+                out_file.write(' 9999\n'.encode())  # end of file record
+
+
+def iter_blocks(file_name, names=None):
+    """Read the blocks of a .frd file one at a time, without keeping them.
+
+    Yields the FRDHeader, FRDNodeBlock, FRDElemBlock and FRDResultBlock
+    objects of the file in order of appearance, each with its data read
+    into arrays. Nothing else refers to a block once the caller drops it,
+    so memory stays at about the size of the largest block, however big
+    the file is, e.g. for reducing every result block to a statistic or
+    converting the blocks to another format.
+
+    Parameters:
+        file_name   Path to the .frd file
+    Optional parameters:
+        names   Names of the result blocks to be read (None -> all names).
+                The data of the other result blocks is skipped unread
+
+    """
+    with open(file_name, 'rb') as in_file:
+        buf = None
+        if names is not None and os.fstat(in_file.fileno()).st_size > 0:
+            # Used to find where skipped blocks end
+            buf = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            eof = (in_file.read(1) == b'')
+            while not eof:
+                key = int(in_file.read(4))
+                code = in_file.read(1).decode()
+                if key == 1:
+                    yield FRDHeader(in_file, code)
+                elif key == 2:
+                    yield FRDNodeBlock(in_file)
+                elif key == 3:
+                    yield FRDElemBlock(in_file)
+                elif key == 100:
+                    if names is None:
+                        yield FRDResultBlock(in_file)
+                    else:
+                        # Only read the data of the blocks asked for
+                        # pylint: disable=protected-access
+                        block = FRDResultBlock()
+                        block._read_header(in_file)
+                        if block.name in names:
+                            block._read_data(in_file)
+                            yield block
+                        else:
+                            in_file.seek(_data_end(block, buf, in_file.tell()))
+                elif key == 9999:
+                    eof = True
+                eof = (eof or (in_file.read(1) == b''))
+        finally:
+            if buf is not None:
+                buf.close()
+
+
+class FRDSummary(object):
+    """This class summarises a .frd file, as returned by probe().
+
+    Attributes:
+        file_name   Path to the .frd file
+        numnod      Number of nodes (0 if there is no node block)
+        numelem     Number of elements (0 if there is no element block)
+        results     List of (name, step) tuples of the result blocks,
+                    in order of appearance
+        steps       Sorted list of the steps with results
+        complete    Bool - the file was read without errors up to its
+                    9999 record, i.e. the analysis finished writing it
+        error       Description of the error that stopped the scan,
+                    None if there was none
+
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, file_name):
+        """Initialize a new, empty FRDSummary Object.
+
+        Parameters:
+            file_name   Path to the .frd file
+
+        """
+        self.file_name = file_name
+        self.numnod = 0
+        self.numelem = 0
+        self.results = []
+        self.steps = []
+        self.complete = False
+        self.error = None
+
+
+def probe(file_name):
+    """Summarise a .frd file without reading its node, element or result data.
+
+    Only the block headers are read, so this takes milliseconds even for
+    big files. Errors, e.g. from a file that is still being written, are
+    reported in the summary instead of being raised.
+
+    Parameters:
+        file_name   Path to the .frd file
+
+    Returns an FRDSummary object.
+
+    """
+    summary = FRDSummary(file_name)
+    frd = FRDFile(lazy=True)
+    try:
+        frd.load(file_name)
+    except Exception as err:  # pylint: disable=broad-except
+        summary.error = '{}: {}'.format(type(err).__name__, err)
+
+    # Blocks read before an error are still summarised
+    if frd.node_block is not None:
+        summary.numnod = frd.node_block.numnod
+    if frd.elem_block is not None:
+        summary.numelem = frd.elem_block.numelem
+    summary.results = [(r_block.name, r_block.numstep)
+                       for r_block in frd.result_blocks]
+    summary.steps = sorted(set(step for _, step in summary.results))
+    summary.complete = frd.complete and summary.error is None
+    return summary
+
+
+def save_table(file_name, table):
+    """Save a structured array, e.g. from FRDParser.get_hot_spots.
+
+    The format follows the extension of file_name:
+        .csv    One column per field, with the field names as header
+        .npz    One array per field, under the field name
+
+    Parameters:
+        file_name   Path of the file to be written
+        table       Numpy structured array
+
+    """
+    names = table.dtype.names
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.npz':
+        np.savez_compressed(file_name,
+                            **{name: table[name] for name in names})
+    elif extension == '.csv':
+        formats = ['%d' if table.dtype[name].kind in 'iu' else '%.9g'
+                   for name in names]
+        np.savetxt(file_name, table, fmt=formats, delimiter=',',
+                   header=','.join(names), comments='')
+    else:
+        raise ValueError('Unknown table format {}'.format(extension))
+
 
 class FRDParser(object):
     """This class loads and performs operations on a FRDFile object.
@@ -722,19 +2105,32 @@ class FRDParser(object):
     Attributes:
         file_name   Filename of current FRD object
         frd         Current FRD object
+        lazy        Bool - only read the blocks that are actually used
+        use_mmap    Bool - memory-map binary .frd files instead of reading them
 
     """
 
-    def __init__(self, file_name=None):
+    def __init__(self, file_name=None, lazy=False, use_mmap=False):
         """Initialize a new FRDParser Object.
 
-        Optional parameter:
+        Optional parameters:
             file_name   Path to .frd File to be read upon creation
+            lazy        Bool - scan the file on load and only read the data
+                        of a block when it is first used, e.g. the result
+                        blocks returned by get_results_block(names=['STRESS'])
+            use_mmap    Bool - like lazy, but binary node coordinates and
+                        results are zero-copy, read-only views into the
+                        memory-mapped file, for files bigger than memory
 
         """
         self.file_name = file_name
         self.frd = None
+        self.lazy = lazy
+        self.use_mmap = use_mmap
         self._steps = []
+        self._node_elem_offsets = None
+        self._node_grid = None
+        self._node_elem_rows = None
         if file_name is not None:
             self.load(file_name)
 
@@ -746,8 +2142,10 @@ class FRDParser(object):
 
         """
         self.file_name = file_name
-        self.frd = FRDFile(file_name)
-        self._build_node_kon()
+        self.frd = FRDFile(file_name, lazy=self.lazy, use_mmap=self.use_mmap)
+        self._node_elem_offsets = None
+        self._node_grid = None
+        self._node_elem_rows = None
         self._build_step_idx()
 
     def save(self, file_name=None, as_copy=False):
@@ -765,6 +2163,8 @@ class FRDParser(object):
                     self.frd.file_name = self.file_name
             else:
                 self.frd.save(self.file_name)
+            # The node grid may still refer to the mapped coordinates
+            self._node_grid = None
 
     def _confirm_step_selection(self, steps):
         steps = steps[:]
@@ -885,9 +2285,9 @@ class FRDParser(object):
             elif steps is not None and r_block.numstep not in steps:
                 continue
             else:
-                res = FRDParser._find_node(r_block.results, number)
-                if res is not None:
-                    results.append(res.data)
+                idx = r_block.index.row(number)
+                if idx is not None:
+                    results.append(r_block.values[idx].tolist())
 
         if not results:
             err_msg = 'No results for node '
@@ -900,7 +2300,9 @@ class FRDParser(object):
         """Get a list of result values in the .frd File for specified coords.
 
         If the given coords do not match a single node, the result is
-        interpolated within the closest element.
+        interpolated with the shape functions of the element containing
+        them (4/10-node tets and 8/20-node bricks). Outside the mesh, the
+        result of the closest node is returned.
 
         If no name or step is specified, all results are returned in a list
         ordered by steps and names in order of appearance in the .frd file.
@@ -921,6 +2323,7 @@ class FRDParser(object):
 
         """
         results = []
+        stencil = None
 
         if steps is not None:
             steps = self._confirm_step_selection(steps)
@@ -931,7 +2334,10 @@ class FRDParser(object):
             elif steps is not None and r_block.numstep not in steps:
                 continue
             else:
-                results.append(self._interpolate_xyz(r_block, pos))
+                if stencil is None:
+                    stencil = self._interpolation_stencil([pos])
+                results.append(
+                    self._interpolate_stencil(r_block, stencil)[0].tolist())
 
         if not results:
             err_msg = 'No results for pos '
@@ -940,15 +2346,242 @@ class FRDParser(object):
         else:
             return results
 
+    def get_results_points(self, points, names=None, steps=None):
+        """Get arrays of result values in the .frd File for many coords.
+
+        Works like get_results_pos, but for a whole array of positions at
+        once, e.g. the points along a probe line. The closest nodes are
+        found with a spatial index, the containing elements and natural
+        coordinates are solved for all points together, and the
+        interpolation weights are only computed once for all result blocks.
+
+        Parameters:
+            points  (M, 3) array of positions
+        Optional parameters:
+            names   List of component names to be included (None -> all names)
+            steps   List of step numbers to be included (None -> all steps)
+
+        Returns a list with an (M, ncomps) array for every result block,
+        ordered like the results of get_results_pos.
+
+        """
+        results = []
+        stencil = None
+
+        if steps is not None:
+            steps = self._confirm_step_selection(steps)
+
+        for r_block in self.frd.result_blocks:
+            if names is not None and r_block.name not in names:
+                continue
+            elif steps is not None and r_block.numstep not in steps:
+                continue
+            else:
+                if stencil is None:
+                    stencil = self._interpolation_stencil(points)
+                results.append(self._interpolate_stencil(r_block, stencil))
+
+        if not results:
+            err_msg = 'No results for {} points, '.format(len(points))
+            err_msg += 'names {}, steps {}'.format(names, steps)
+            raise RuntimeError(err_msg)
+        else:
+            return results
+
+    def get_results_history(self, name, numbers=None, steps=None):
+        """Get the results of many nodes over many steps as one array.
+
+        Parameters:
+            name        Name of the result blocks, e.g. DISP
+        Optional parameters:
+            numbers     Node numbers (None -> nodes of the first block)
+            steps       List of step numbers to be included (None -> all
+                        steps in order of appearance)
+
+        Returns (step_values, history): a (steps,) float64 array of the step
+        values, e.g. the time of each step of a transient analysis, and a
+        (steps, nodes, ncomps) float32 array of the results, NaN for nodes
+        without results in a step. Steps without a block called name are
+        left out, and only the first block called name in a step is used.
+
+        """
+        if steps is None:
+            steps = self._steps
+        else:
+            steps = self._confirm_step_selection(steps)
+
+        step_blocks = {}
+        for r_block in self.frd.result_blocks:
+            if r_block.name == name and r_block.numstep in steps:
+                step_blocks.setdefault(r_block.numstep, r_block)
+        r_blocks = [step_blocks[step] for step in steps if step in step_blocks]
+        if not r_blocks:
+            raise RuntimeError(
+                'No results for name {}, steps {}'.format(name, steps))
+
+        if numbers is None:
+            numbers = r_blocks[0].numbers
+        numbers = np.asarray(numbers).reshape(-1)
+        history = np.full((len(r_blocks), len(numbers), r_blocks[0].ncomps),
+                          np.nan, dtype=np.float32)
+        for i, r_block in enumerate(r_blocks):
+            if np.array_equal(r_block.numbers, numbers):
+                # The usual case of the same nodes in every step
+                history[i] = r_block.values
+            else:
+                rows = r_block.index.rows(numbers)
+                known = rows >= 0
+                history[i, known] = r_block.values[rows[known]]
+
+        step_values = np.array([r_block.value for r_block in r_blocks],
+                               dtype=np.float64)
+        return step_values, history
+
+    def get_elem_centroids(self, rows=None):
+        """Get the centroids of the elements in the .frd File.
+
+        The centroid of an element is the mean of its node coordinates.
+
+        Optional parameters:
+            rows    Array of rows of the element block (None -> all)
+
+        Returns an (numelem, 3) float64 array in the order of the element
+        block or of rows, NaN for elements with nodes missing from the node
+        block.
+
+        """
+        n_block = self.frd.node_block
+        return self._elem_reduce(n_block.index, n_block.coords, rows)[0]
+
+    def get_elem_results(self, name, step=None, component=None, rows=None):
+        """Get the element averages of the nodal results of a result block.
+
+        The average of an element is the mean of the results of its nodes.
+
+        Parameters:
+            name        Name of the result block, e.g. STRESS
+        Optional parameters:
+            step        Step number (None -> first block called name)
+            component   Index or entity name of one component, or the name
+                        of a derived quantity, e.g. MISES (see
+                        FRDResultBlock.derived). None -> all components
+            rows        Array of rows of the element block (None -> all)
+
+        Returns a (numelem,) or (numelem, ncomps) float64 array in the order
+        of the element block or of rows, NaN for elements with a node
+        without results.
+
+        """
+        r_block = self._results_block(name, step)
+        values = self._component_values(r_block, component)
+        return self._elem_reduce(r_block.index, values, rows)[0]
+
+    def get_hot_spots(self, k, name='STRESS', step=None, component='MISES'):
+        """Get the k elements with the highest element averages of a result.
+
+        A peak value far above the average of its element, or hot spots
+        made of single elements at a corner, point to a stress singularity
+        rather than a real stress concentration.
+
+        Parameters:
+            k           Number of elements
+        Optional parameters:
+            name        Name of the result block
+            step        Step number (None -> first block called name)
+            component   Index or entity name of one component, or the name
+                        of a derived quantity (see get_elem_results)
+
+        Returns a structured array sorted by decreasing average, with the
+        fields elem (element number), average, peak (highest node value in
+        the element) and the centroid x, y, z. Elements without complete
+        results are left out.
+
+        """
+        r_block = self._results_block(name, step)
+        values = self._component_values(r_block, component)
+        if values.ndim != 1:
+            raise ValueError('Hot spots need a single component')
+        average, peak = self._elem_reduce(r_block.index, values)
+
+        # Only the k largest averages are fully sorted
+        rows = np.flatnonzero(~np.isnan(average))
+        if k <= 0:
+            rows = rows[:0]
+        elif k < len(rows):
+            rows = rows[np.argpartition(-average[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-average[rows], kind='stable')]
+
+        hot_spots = np.empty(len(rows), dtype=[
+            ('elem', '<i4'), ('average', '<f8'), ('peak', '<f8'),
+            ('x', '<f8'), ('y', '<f8'), ('z', '<f8')])
+        hot_spots['elem'] = self.frd.elem_block.numbers[rows]
+        hot_spots['average'] = average[rows]
+        hot_spots['peak'] = peak[rows]
+        centroids = self.get_elem_centroids(rows)
+        hot_spots['x'] = centroids[:, 0]
+        hot_spots['y'] = centroids[:, 1]
+        hot_spots['z'] = centroids[:, 2]
+        return hot_spots
+
+    def export_hot_spots(self, file_name, k, name='STRESS', step=None,
+                         component='MISES'):
+        """Save the hot spots of get_hot_spots to a .csv or .npz file."""
+        save_table(file_name, self.get_hot_spots(k, name, step, component))
+
+    def export_elem_results(self, file_name, name, step=None, component=None):
+        """Save element averages with the element centroids.
+
+        The table has the fields elem, x, y, z and one field for each
+        averaged component, named after the component, see save_table.
+
+        Parameters:
+            file_name   Path of the .csv or .npz file to be written
+            name        Name of the result block, e.g. STRESS
+        Optional parameters:
+            step        Step number (None -> first block called name)
+            component   One component, see get_elem_results
+
+        """
+        r_block = self._results_block(name, step)
+        average = self.get_elem_results(name, step, component)
+        if average.ndim == 1:
+            comp_names = [component if isinstance(component, str)
+                          else r_block.entities[component].name]
+            average = average[:, None]
+        else:
+            comp_names = [entity.name
+                          for entity in r_block.entities[:r_block.ncomps]]
+
+        centroids = self.get_elem_centroids()
+        table = np.empty(len(average), dtype=[
+            ('elem', '<i4'), ('x', '<f8'), ('y', '<f8'), ('z', '<f8')]
+            + [(comp_name, '<f8') for comp_name in comp_names])
+        table['elem'] = self.frd.elem_block.numbers
+        table['x'] = centroids[:, 0]
+        table['y'] = centroids[:, 1]
+        table['z'] = centroids[:, 2]
+        for i, comp_name in enumerate(comp_names):
+            table[comp_name] = average[:, i]
+        save_table(file_name, table)
+
     @staticmethod
-    def _assert_err_msg(res, r_block):
+    def _assert_err_msg(node, data, r_block):
         msg = ''
-        msg += 'Node: ' + str(res.node)
+        msg += 'Node: ' + str(node)
         msg += ' Name: ' + r_block.name
         msg += ' Step: ' + str(r_block.numstep)
-        msg += ' Data: ' + str(res.data)
+        msg += ' Data: ' + str(data)
         return msg
 
+    @staticmethod
+    def _assert_err(node, data, r_block):
+        err = AssertionError(FRDParser._assert_err_msg(node, data, r_block))
+        err.node = node
+        err.step = r_block.numstep
+        err.node_data = data
+        err.res_name = r_block.name
+        return err
+
     def assert_node_results(self, func, nodes=None, names=None, steps=None):
         """Peform a given test on a subset of all result values.
 
@@ -981,25 +2614,20 @@ class FRDParser(object):
             else:
                 if nodes is not None:
                     for node in nodes:
-                        res = FRDParser._find_node(r_block.results, node)
-                        if res is not None and not func(res.data):
-                            err = AssertionError(
-                                FRDParser._assert_err_msg(res, r_block))
-                            err.node = res.node
-                            err.step = r_block.numstep
-                            err.node_data = res.data
-                            err.res_name = r_block.name
-                            raise err
+                        idx = r_block.index.row(node)
+                        if idx is None:
+                            continue
+                        data = r_block.values[idx].tolist()
+                        if not func(data):
+                            raise FRDParser._assert_err(
+                                int(r_block.numbers[idx]), data, r_block)
                 else:
-                    for res in r_block.results:
-                        if res is not None and not func(res.data):
-                            err = AssertionError(
-                                FRDParser._assert_err_msg(res, r_block))
-                            err.node = res.node
-                            err.step = r_block.numstep
-                            err.node_data = res.data
-                            err.res_name = r_block.name
-                            raise err
+                    # One conversion for the whole block is much faster
+                    # than converting the rows one at a time
+                    for node, data in zip(r_block.numbers.tolist(),
+                                          r_block.values.tolist()):
+                        if not func(data):
+                            raise FRDParser._assert_err(node, data, r_block)
 
     def convert_format(self, new_format):
         """Convert the loaded .frd file to a different storage format.
@@ -1022,6 +2650,10 @@ class FRDParser(object):
 
         for block in self.frd.blocks:
             if hasattr(block, 'format'):
+                if isinstance(block, FRDLazyBlock):
+                    # Data not read yet is still stored in the old format
+                    # pylint: disable=protected-access
+                    block._load_deferred()
                 block.format = new_format
 
         self.frd.node_block.format = inp_format
@@ -1029,12 +2661,8 @@ class FRDParser(object):
     @staticmethod
     def _reduce_result_block(nodes, r_block):
 
-        j_start = len(r_block) - 1
-        j_end = -1
-        for j in range(j_start, j_end, -1):
-            res = r_block[j]
-            if res.node not in nodes:
-                r_block.remove(res)
+        keep = np.isin(r_block.numbers, list(nodes))
+        r_block.set_results(r_block.numbers[keep], r_block.values[keep])
 
     def reduce_file_nodes(self, nodes, names=None, steps=None):
         """Reduce the .frd file to only the specified node numbers.
@@ -1052,17 +2680,15 @@ class FRDParser(object):
         if steps is not None:
             steps = self._confirm_step_selection(steps)
 
-        idx_start = len(self.frd.node_block.numnod) - 1
-        idx_end = -1
-
-        for idx in range(idx_start, idx_end, -1):
-            node = self.frd.node_block.nodes[idx]
-            if node.number not in nodes:
-                self.frd.node_block.nodes.remove(node)
-                self.frd.node_block.numnod -= 1
+        n_block = self.frd.node_block
+        keep = np.isin(n_block.numbers, list(nodes))
+        n_block.set_nodes(n_block.numbers[keep], n_block.coords[keep])
 
         self.frd.blocks.remove(self.frd.elem_block)
         self.frd.elem_block = None
+        self._node_elem_offsets = None
+        self._node_grid = None
+        self._node_elem_rows = None
 
         idx_start = len(self.frd.result_blocks) - 1
         idx_end = -1
@@ -1111,6 +2737,7 @@ class FRDParser(object):
             steps = self._confirm_step_selection(steps)
 
         new_result_blocks = []
+        stencil = None
         for r_block in self.frd.result_blocks:
 
             if steps is not None and r_block.numstep not in steps:
@@ -1122,29 +2749,22 @@ class FRDParser(object):
                 self.frd.blocks.remove(r_block)
                 continue
 
-            r_block.numnod = len(positions)
-            new_results = []
-            for pos in positions:
-                res = FRDNodeResult()
-                new_results.append(res)
-                res.node = len(new_results)
-                res.data = self.get_results_pos(
-                    pos, names=[r_block.name], steps=[r_block.numstep])[0]
-            r_block.results = new_results
+            if stencil is None:
+                stencil = self._interpolation_stencil(positions)
+            r_block.set_results(np.arange(1, len(positions) + 1),
+                                self._interpolate_stencil(r_block, stencil))
             new_result_blocks.append(r_block)
 
         self.frd.result_blocks = new_result_blocks
 
-        self.frd.node_block.numnod = len(positions)
-        self.frd.node_block.nodes = []
-        for pos in positions:
-            frd_node = FRDNode()
-            self.frd.node_block.nodes.append(frd_node)
-            frd_node.number = len(self.frd.node_block.nodes)
-            frd_node.pos = pos
+        self.frd.node_block.set_nodes(
+            np.arange(1, len(positions) + 1), positions)
 
         self.frd.blocks.remove(self.frd.elem_block)
         self.frd.elem_block = None
+        self._node_elem_offsets = None
+        self._node_grid = None
+        self._node_elem_rows = None
 
     def get_comp_names(self, names):
         """Get component/entity names for the supplied result names."""
@@ -1184,117 +2804,269 @@ class FRDParser(object):
             if header.string.startswith(prefix):
                 return header.string.replace(prefix, '').strip()
 
-    @staticmethod
-    def _find_node(block, n_num):
-
-        if not block:
-            return None
-
-        idr = None
-        if hasattr(block[0], 'node'):
-            idr = 'node'
-        elif hasattr(block[0], 'number'):
-            idr = 'number'
-
-        # First check whether nodes are defined in order, starting from 1
-        idx = n_num - 1
-        if idx < len(block) and getattr(block[idx], idr) == n_num:
-            return block[idx]
-
-        # Then check whether nodes are defined in order, starting with offset
-        offset = getattr(block[0], idr)
-        idx = n_num - offset
-        if idx >= 0 and idx < len(block) and getattr(block[idx], idr) == n_num:
-            return block[idx]
-
-        # Ok, let's check all nodes
-        for node in block:
-            if getattr(node, idr) == n_num:
-                return node
-
-        # If we got this far, we didn't find this node number
-        return None
-
-    def _interpolate_xyz(self, r_block, pos):
-
-        result = []
-
-        node = self._find_closest_node(pos)
-        n_data = FRDParser._find_node(r_block.results, node.number).data
-
-        if FRDParser._same_xform(node.pos, pos):
-            result = n_data[:]
-            # print "Not interpolating", node.number, result, node.pos
-        else:
-            # print "Interpolating", pos
-            result = [0.0 for i in range(len(n_data))]
-            elem = self._find_closest_element(pos, node=node)
-            if elem is not None:
-                dists = {}
-                for n_idx in elem.nodes:
-                    e_node = FRDParser._find_node(
-                        self.frd.node_block.nodes, n_idx)
-                    dists[e_node] = FRDParser._vector_distance(e_node.pos, pos)
-                inv_dist_sum = sum([1.0 / x for x in dists.values()])
-                for e_node in dists:
-                    weight = 1.0 / (dists[e_node] * inv_dist_sum)
-                    en_data = FRDParser._find_node(
-                        r_block.results, e_node.number).data
-                    for i in range(r_block.ncomps):
-                        result[i] += weight * en_data[i]
-            else:
-                result = n_data[:]
-        return result
-
-    def _find_closest_node(self, pos):
-
-        closest_dist = FRDParser._vector_distance(
-            pos, self.frd.node_block.nodes[0].pos)
-        closest_node = self.frd.node_block.nodes[0]
-        for node in self.frd.node_block.nodes:
-            dist = FRDParser._vector_distance(pos, node.pos)
-            if dist < closest_dist:
-                closest_dist = dist
-                closest_node = node
-        return closest_node
+    def _interpolation_stencil(self, points):
+
+        # Returns the node numbers and weights that interpolate the results
+        # at each point, as (M, K) arrays padded with node number -1. Points
+        # at a node take its results, points in an element the results of
+        # its nodes weighted by the element's shape functions, and points
+        # outside the mesh the results of the closest node.
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        n_block = self.frd.node_block
+        e_block = self.frd.elem_block
+        idx = self._find_closest_nodes(points)
+        at_node = (n_block.coords[idx] == points).all(axis=1)
+
+        elem_rows = np.full(len(points), -1, dtype=np.int64)
+        nat = np.zeros((len(points), 3))
+        inside = np.flatnonzero(~at_node)
+        if e_block and len(inside):
+            elem_rows[inside], nat[inside] = self._locate_points(
+                points[inside], idx[inside])
+
+        # Without elements, e.g. after reduce_file_nodes, no point is located
+        located = elem_rows >= 0
+        types = np.full(len(points), -1, dtype=np.int64)
+        elem_types = []
+        if located.any():
+            types[located] = e_block.types[elem_rows[located]]
+            elem_types = np.unique(types[located]).tolist()
+        width = max([1] + [FRDElem.nodesPerType[elem_type]
+                           for elem_type in elem_types])
+        numbers = np.full((len(points), width), -1, dtype=np.int64)
+        weights = np.zeros((len(points), width))
+        numbers[:, 0] = n_block.numbers[idx]
+        weights[:, 0] = 1.0
+        for elem_type in elem_types:
+            sel = types == elem_type
+            num_nodes = FRDElem.nodesPerType[elem_type]
+            numbers[sel, :num_nodes] = e_block.type_nodes(elem_type,
+                                                          elem_rows[sel])
+            weights[sel, :num_nodes] = _SHAPES[elem_type][0](nat[sel])[0]
+        return numbers, weights
+
+    def _locate_points(self, points, node_idx, tolerance=1e-6):
+
+        # Returns the row of the element containing each point (-1 if there
+        # is none) and the natural coordinates of the point in it. The
+        # elements around the closest node are tried first, then the
+        # elements around all nodes of those.
+        elem_rows = np.full(len(points), -1, dtype=np.int64)
+        nat = np.zeros((len(points), 3))
+        if self._node_elem_offsets is None:
+            self._build_node_kon()
+
+        # Work through the points in chunks, to bound the memory used
+        chunk = 8192
+        for start in range(0, len(points), chunk):
+            part = np.arange(start, min(start + chunk, len(points)))
+            pair_points, pair_nodes = part, node_idx[part]
+            for ring in range(2):
+                pair_points, pair_elems = self._elems_around(pair_points,
+                                                             pair_nodes)
+                outside, pair_nat = self._natural_coords_pairs(
+                    points[pair_points], pair_elems)
+
+                # Of several containing elements, e.g. for a point on a
+                # face, the least outside and then the first one is used
+                order = np.lexsort((pair_elems, outside, pair_points))
+                first = np.ones(len(order), dtype=bool)
+                first[1:] = pair_points[order[1:]] != pair_points[order[:-1]]
+                best = order[first]
+                found = best[outside[best] <= tolerance]
+                elem_rows[pair_points[found]] = pair_elems[found]
+                nat[pair_points[found]] = pair_nat[found]
+
+                if ring == 0:
+                    pending = elem_rows[pair_points] < 0
+                    pair_points, pair_nodes = self._elem_node_rows(
+                        pair_points[pending], pair_elems[pending])
+
+        return elem_rows, nat
+
+    def _elems_around(self, point_ids, node_rows):
+
+        # Returns the unique (point, element row) pairs of the elements
+        # around each of the (point, node row) pairs
+        offsets = self._node_elem_offsets
+        counts = offsets[node_rows + 1] - offsets[node_rows]
+        ends = np.cumsum(counts)
+        elems = self._node_elem_rows[
+            np.repeat(offsets[node_rows] - ends + counts, counts)
+            + np.arange(ends[-1] if len(ends) else 0)]
+        numelem = self.frd.elem_block.numelem
+        pairs = np.unique(np.repeat(point_ids, counts).astype(np.int64)*numelem
+                          + elems)
+        return pairs//numelem, pairs % numelem
+
+    def _elem_node_rows(self, point_ids, elem_rows):
+
+        # Returns the (point, node row) pairs of the nodes of the elements
+        e_block = self.frd.elem_block
+        pair_points = [np.empty(0, dtype=np.int64)]
+        pair_nodes = [np.empty(0, dtype=np.int64)]
+        types = e_block.types[elem_rows]
+        for elem_type in np.unique(types).tolist():
+            sel = types == elem_type
+            nodes = self.frd.node_block.index.rows(
+                e_block.type_nodes(elem_type, elem_rows[sel]))
+            pair_points.append(np.repeat(point_ids[sel], nodes.shape[1]))
+            pair_nodes.append(nodes.reshape(-1))
+        pair_points = np.concatenate(pair_points)
+        pair_nodes = np.concatenate(pair_nodes)
+        known = pair_nodes >= 0
+        return pair_points[known], pair_nodes[known]
+
+    def _natural_coords_pairs(self, points, elem_rows):
+
+        # Returns how far each point is outside its element (inf for types
+        # without shape functions) and its natural coordinates in it
+        e_block = self.frd.elem_block
+        n_block = self.frd.node_block
+        outside = np.full(len(points), np.inf)
+        nat = np.zeros((len(points), 3))
+        types = e_block.types[elem_rows]
+        for elem_type in np.unique(types).tolist():
+            if elem_type not in _SHAPES:
+                continue
+            sel = np.flatnonzero(types == elem_type)
+            nodes = n_block.index.rows(
+                e_block.type_nodes(elem_type, elem_rows[sel]))
+            complete = (nodes >= 0).all(axis=1)
+            sel = sel[complete]
+            coords = n_block.coords[nodes[complete]]
+
+            # Only solve for points within the bounding box of the element
+            # nodes, with some room for curved edges of quadratic elements
+            low, high = _node_box(coords)
+            margin = 0.25*(high - low).max(axis=1)[:, None]
+            in_box = ((points[sel] >= low - margin) &
+                      (points[sel] <= high + margin)).all(axis=1)
+            sel = sel[in_box]
+            nat[sel] = _natural_coords(elem_type, coords[in_box], points[sel])
+            outside[sel] = _SHAPES[elem_type][2](nat[sel])
+        # Degenerate elements never contain a point
+        outside[np.isnan(outside)] = np.inf
+        return outside, nat
+
+    def _results_block(self, name, step):
+
+        # The result block called name in step, or the first one
+        steps = None if step is None else self._confirm_step_selection([step])
+        r_blocks = self.get_results_block(names=[name], steps=steps)
+        if not r_blocks:
+            raise RuntimeError(
+                'No results for name {}, step {}'.format(name, step))
+        return r_blocks[0]
 
     @staticmethod
-    def _vector_distance(origin, target):
-
-        return sqrt(sum([(a-b)**2 for a, b in zip(origin, target)]))
-
-    def _find_closest_element(self, pos, node=None):
-
-        if node is None:
-            node = self._find_closest_node(pos)
+    def _component_values(r_block, component):
+
+        # Values of one component, or of all components for None, by row
+        if component is None:
+            return r_block.values
+        names = [entity.name for entity in r_block.entities[:r_block.ncomps]]
+        if isinstance(component, str):
+            if component not in names:
+                return r_block.derived_rows(component, slice(None))
+            component = names.index(component)
+        return r_block.values[:, component]
+
+    def _elem_reduce(self, index, values, rows=None, chunk_size=65536):
+
+        # Mean and max of values over the nodes of the elements in rows,
+        # where index maps node numbers to rows of values. NaN for elements
+        # with nodes that are not in index. Gathered in chunks of elements
+        # to bound the size of the (chunk, nodes per element) arrays
+        e_block = self.frd.elem_block
+        if rows is None:
+            rows = np.arange(e_block.numelem)
+        rows = np.asarray(rows, dtype=np.int64)
+        mean = np.full((len(rows),) + values.shape[1:], np.nan)
+        peak = np.full((len(rows),) + values.shape[1:], np.nan)
+
+        types = e_block.types[rows]
+        for elem_type in np.unique(types).tolist():
+            sel = np.flatnonzero(types == elem_type)
+            for start in range(0, len(sel), chunk_size):
+                part = sel[start:start + chunk_size]
+                value_rows = index.rows(
+                    e_block.type_nodes(elem_type, rows[part]))
+                complete = (value_rows >= 0).all(axis=1)
+                value_rows = value_rows[complete]
+
+                # Gathering one node of every element at a time is much
+                # faster than reducing a short axis
+                total = values[value_rows[:, 0]].astype(np.float64)
+                highest = total.copy()
+                for i in range(1, value_rows.shape[1]):
+                    node_values = values[value_rows[:, i]]
+                    total += node_values
+                    np.maximum(highest, node_values, out=highest)
+                mean[part[complete]] = total/value_rows.shape[1]
+                peak[part[complete]] = highest
+        return mean, peak
 
-        closest_dist = float('inf')
-        closest_elem = None
+    @staticmethod
+    def _interpolate_stencil(r_block, stencil):
+
+        # Returns the (M, ncomps) results of r_block interpolated with the
+        # stencil, NaN where a node has no results in r_block. Node by node
+        # accumulation keeps the sums in the same order as for single points.
+        numbers, weights = stencil
+        rows = r_block.index.rows(numbers)
+        result = np.zeros((len(numbers), r_block.ncomps))
+        for k in range(numbers.shape[1]):
+            used = numbers[:, k] >= 0
+            data = r_block.values[rows[used, k]].astype(np.float64)
+            data[rows[used, k] < 0] = np.nan
+            if k == 0:
+                node_data = data
+            result[used] += weights[used, k, None] * data
+
+        # Points at a node take its results unchanged
+        at_node = (numbers[:, 1:] < 0).all(axis=1)
+        result[at_node] = node_data[at_node]
+        return result
 
-        for elem in node.elems:
-            dist = 0
-            for n_idx in elem.nodes:
-                e_node = FRDParser._find_node(self.frd.node_block.nodes, n_idx)
-                if e_node is not None:
-                    dist += FRDParser._vector_distance(e_node.pos, pos)
-            if dist < closest_dist:
-                closest_dist = dist
-                closest_elem = elem
+    def _find_closest_nodes(self, points):
 
-        return closest_elem
+        # Returns the indices of the closest nodes to an array of points
+        if self._node_grid is None:
+            self._node_grid = FRDNodeGrid(self.frd.node_block.coords)
+        return self._node_grid.nearest(points)
 
     def _build_node_kon(self):
 
-        for node in self.frd.node_block.nodes:
-            node.elems = []
+        # Node to element adjacency in compressed sparse row form: the rows
+        # of the elements around the node in row i of the node block are
+        # _node_elem_rows[_node_elem_offsets[i]:_node_elem_offsets[i+1]]
+        n_block = self.frd.node_block
+        numnod = len(n_block.numbers)
+        node_rows = [np.empty(0, dtype=np.int64)]
+        elem_rows = [np.empty(0, dtype=np.int64)]
 
         if self.frd.elem_block:
-            for elem in self.frd.elem_block.elems:
-                for n_num in elem.nodes:
-                    node = FRDParser._find_node(
-                        self.frd.node_block.nodes, n_num)
-                    if node is not None:
-                        node.elems.append(elem)
+            e_block = self.frd.elem_block
+            for elem_type, nodes in e_block.connectivity.items():
+                node_rows.append(n_block.index.rows(nodes).reshape(-1))
+                elem_rows.append(np.repeat(e_block.type_rows[elem_type],
+                                           nodes.shape[1]))
+
+        node_rows = np.concatenate(node_rows)
+        elem_rows = np.concatenate(elem_rows)
+        known = node_rows >= 0
+        node_rows = node_rows[known]
+        elem_rows = elem_rows[known]
+
+        # Sort by node, then by element, so the elements around every node
+        # stay in block order
+        order = np.argsort(node_rows*(int(elem_rows.max(initial=0)) + 1)
+                           + elem_rows)
+        self._node_elem_rows = elem_rows[order]
+        self._node_elem_offsets = np.zeros(numnod + 1, dtype=np.int64)
+        np.cumsum(np.bincount(node_rows, minlength=numnod),
+                  out=self._node_elem_offsets[1:])
 
     def _build_step_idx(self):
 
@@ -1302,9 +3074,4 @@ class FRDParser(object):
 
         for r_block in self.frd.result_blocks:
             if r_block.numstep not in self._steps:
-                self._steps.append(r_block.numstep)
-
-    @staticmethod
-    def _same_xform(vec1, vec2):
-
-        return vec1[0] == vec2[0] and vec1[1] == vec2[1] and vec1[2] == vec2[2]
\ No newline at end of file
+                self._steps.append(r_block.numstep)
\ No newline at end of file
@@ -0,0 +1,338 @@
+"""This module contains streaming statistics over .frd nodal results.
+
+The statistics are kept in small sketches which are updated one chunk of
+values at a time and can be merged with each other, so a result field never
+has to be held in memory as a whole, and chunks or whole blocks can be
+summarised separately (e.g. in different processes) and combined later.
+
+QuantileSketch, approximate quantiles with a bounded relative error
+Histogram, counts of values in fixed bins
+ThresholdCounts, counts of values above fixed thresholds
+FieldStats, all of the above together with the count, min, max and mean
+
+block_stats() summarises components, or derived quantities, of an
+FRDResultBlock chunk by chunk.
+
+"""
+
+import numpy as np
+
+
+def _add_counts(offset, counts, new_offset, new_counts):
+    """Add bucket counts starting at new_offset to counts starting at offset.
+
+    Returns the (offset, counts) of the sum, which covers both ranges.
+
+    """
+    if len(new_counts) == 0:
+        return offset, counts
+    if len(counts) == 0:
+        return new_offset, new_counts.copy()
+    low = min(offset, new_offset)
+    high = max(offset + len(counts), new_offset + len(new_counts))
+    total = np.zeros(high - low, dtype=np.int64)
+    total[offset - low:offset - low + len(counts)] += counts
+    total[new_offset - low:new_offset - low + len(new_counts)] += new_counts
+    return low, total
+
+
+class QuantileSketch(object):
+    """This class represents a mergeable sketch of a distribution of values.
+
+    Values are counted in logarithmic buckets, separately for positive and
+    negative values, so every quantile is returned with a relative error of
+    at most relative_accuracy, whatever the range of the values. Merging
+    sketches with the same relative accuracy is exact.
+
+    Attributes:
+        relative_accuracy   Bound on the relative error of the quantiles
+        count               Number of values added
+        zero_count          Number of values too small to put in a bucket,
+                            counted as zero
+
+    """
+
+    # Magnitudes below this are counted as zero, which also bounds the
+    # number of buckets for values close to zero
+    min_value = 1e-9
+
+    def __init__(self, relative_accuracy=0.005):
+        """Initialize a new, empty QuantileSketch Object.
+
+        Optional parameter:
+            relative_accuracy   Bound on the relative error of the quantiles
+
+        """
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.zero_count = 0
+        self._gamma = (1 + relative_accuracy)/(1 - relative_accuracy)
+        self._log_gamma = np.log(self._gamma)
+        self._positive = (0, np.zeros(0, dtype=np.int64))
+        self._negative = (0, np.zeros(0, dtype=np.int64))
+
+    def _bucket_counts(self, magnitudes):
+        """(offset, counts) of the buckets of an array of magnitudes."""
+        if len(magnitudes) == 0:
+            return 0, np.zeros(0, dtype=np.int64)
+        buckets = np.ceil(np.log(magnitudes)/self._log_gamma).astype(np.int64)
+        low = int(buckets.min())
+        return low, np.bincount(buckets - low).astype(np.int64)
+
+    def update(self, values):
+        """Add an array of values to the sketch. NaN values must be removed."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        self.count += len(values)
+        positive = values[values >= self.min_value]
+        negative = -values[values <= -self.min_value]
+        self.zero_count += len(values) - len(positive) - len(negative)
+        self._positive = _add_counts(*(self._positive
+                                       + self._bucket_counts(positive)))
+        self._negative = _add_counts(*(self._negative
+                                       + self._bucket_counts(negative)))
+
+    def merge(self, other):
+        """Add the values counted by another QuantileSketch to this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Sketches with different accuracies cannot be '
+                             'merged')
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self._positive = _add_counts(*(self._positive + other._positive))
+        self._negative = _add_counts(*(self._negative + other._negative))
+
+    def _bucket_values(self, offset, counts):
+        """Representative value of each bucket in a range of buckets."""
+        indices = np.arange(offset, offset + len(counts))
+        return 2*np.power(self._gamma, indices)/(self._gamma + 1)
+
+    def quantile(self, q):
+        """Approximate q-quantile of the values, q between 0 and 1.
+
+        q can also be an array of quantiles. Returns NaN for an empty sketch.
+
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)[()]
+
+        # All buckets in increasing order of their values
+        neg_offset, neg_counts = self._negative
+        pos_offset, pos_counts = self._positive
+        values = np.concatenate((
+            -self._bucket_values(neg_offset, neg_counts)[::-1], [0.0],
+            self._bucket_values(pos_offset, pos_counts)))
+        counts = np.concatenate((neg_counts[::-1], [self.zero_count],
+                                 pos_counts))
+
+        # The value of rank q*(count-1), counting from 0
+        ranks = np.clip(q, 0.0, 1.0)*(self.count - 1)
+        buckets = np.searchsorted(np.cumsum(counts), ranks, side='right')
+        return values[np.minimum(buckets, len(values) - 1)][()]
+
+
+class Histogram(object):
+    """This class represents mergeable counts of values in fixed bins.
+
+    Attributes:
+        edges       Increasing bin edges, the last bin includes its right edge
+        counts      Number of values in each bin
+        below       Number of values below the first edge
+        above       Number of values above the last edge
+
+    """
+
+    def __init__(self, edges):
+        """Initialize a new, empty Histogram Object.
+
+        Parameters:
+            edges       Increasing bin edges
+
+        """
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    def update(self, values):
+        """Add an array of values to the histogram. NaN values are ignored."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        self.counts += np.histogram(values, self.edges)[0]
+        self.below += int(np.count_nonzero(values < self.edges[0]))
+        self.above += int(np.count_nonzero(values > self.edges[-1]))
+
+    def merge(self, other):
+        """Add the counts of another Histogram with the same edges."""
+        if not np.array_equal(other.edges, self.edges):
+            raise ValueError('Histograms with different edges cannot be '
+                             'merged')
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+
+
+class ThresholdCounts(object):
+    """This class represents mergeable counts of values above thresholds.
+
+    Attributes:
+        thresholds  Array of thresholds
+        counts      Number of values greater than each threshold
+        count       Number of values counted in total
+
+    """
+
+    def __init__(self, thresholds):
+        """Initialize new, empty ThresholdCounts.
+
+        Parameters:
+            thresholds  Sequence of thresholds
+
+        """
+        self.thresholds = np.asarray(thresholds, dtype=np.float64).reshape(-1)
+        self.counts = np.zeros(len(self.thresholds), dtype=np.int64)
+        self.count = 0
+
+    def update(self, values):
+        """Add an array of values. NaN values must be removed."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        self.count += len(values)
+        for i, threshold in enumerate(self.thresholds.tolist()):
+            self.counts[i] += np.count_nonzero(values > threshold)
+
+    def merge(self, other):
+        """Add the counts of other ThresholdCounts with the same thresholds."""
+        if not np.array_equal(other.thresholds, self.thresholds):
+            raise ValueError('Counts for different thresholds cannot be '
+                             'merged')
+        self.counts += other.counts
+        self.count += other.count
+
+    @property
+    def fractions(self):
+        """Fraction of the values greater than each threshold."""
+        return self.counts/max(self.count, 1)
+
+
+class FieldStats(object):
+    """This class represents mergeable statistics of a field of values.
+
+    Attributes:
+        count       Number of values, not counting NaN
+        nan_count   Number of NaN values
+        minimum     Smallest value, NaN if there are none
+        maximum     Largest value, NaN if there are none
+        total       Sum of the values, in double precision
+        sketch      QuantileSketch of the values
+        histogram   Histogram of the values, None without edges
+        exceedance  ThresholdCounts of the values, None without thresholds
+
+    """
+
+    def __init__(self, edges=None, thresholds=None, relative_accuracy=0.005):
+        """Initialize new, empty FieldStats.
+
+        Optional parameters:
+            edges               Bin edges of the histogram
+            thresholds          Thresholds to count the values above
+            relative_accuracy   Relative accuracy of the quantiles
+
+        """
+        self.count = 0
+        self.nan_count = 0
+        self.minimum = np.nan
+        self.maximum = np.nan
+        self.total = 0.0
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.histogram = None if edges is None else Histogram(edges)
+        self.exceedance = (None if thresholds is None
+                           else ThresholdCounts(thresholds))
+
+    def update(self, values):
+        """Add an array of values, e.g. the next chunk of a result field."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        finite = ~np.isnan(values)
+        if not finite.all():
+            self.nan_count += len(values) - int(np.count_nonzero(finite))
+            values = values[finite]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.minimum = np.fmin(self.minimum, values.min())
+        self.maximum = np.fmax(self.maximum, values.max())
+        self.total += float(values.sum())
+        self.sketch.update(values)
+        if self.histogram is not None:
+            self.histogram.update(values)
+        if self.exceedance is not None:
+            self.exceedance.update(values)
+
+    def merge(self, other):
+        """Add the statistics of other FieldStats with the same settings."""
+        self.count += other.count
+        self.nan_count += other.nan_count
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        self.total += other.total
+        self.sketch.merge(other.sketch)
+        if self.histogram is not None:
+            self.histogram.merge(other.histogram)
+        if self.exceedance is not None:
+            self.exceedance.merge(other.exceedance)
+
+    @property
+    def mean(self):
+        """Mean of the values, NaN if there are none."""
+        return self.total/self.count if self.count else np.nan
+
+    def quantile(self, q):
+        """Approximate q-quantile(s) of the values, see QuantileSketch."""
+        return self.sketch.quantile(q)
+
+
+def block_stats(r_block, component, rows=None, edges=None, thresholds=None,
+                relative_accuracy=0.005, chunk_size=65536):
+    """Statistics of components of an FRDResultBlock, chunk by chunk.
+
+    Parameters:
+        r_block     FRDResultBlock to summarise
+        component   Index or entity name of a component (e.g. 'SXX'), or
+                    the name of a quantity derived from the block (e.g.
+                    'MISES', see FRDResultBlock.derived), or a list of
+                    these to summarise them all in one pass
+
+    Optional parameters:
+        rows        Array of the rows to include, all rows by default
+        edges       Bin edges of a histogram of the values
+        thresholds  Thresholds to count the values above
+        relative_accuracy   Relative accuracy of the quantiles
+        chunk_size  Number of rows processed at a time
+
+    Only one chunk of values is converted at a time, so with a memory
+    mapped file the field is never held in memory as a whole. The derived
+    quantities of a chunk are computed together, so e.g. the principal
+    stresses are only computed once for 'PS1', 'PS3' and 'TRESCA'.
+
+    Returns a FieldStats object, or a list of them for a list of
+    components.
+
+    """
+    single = not isinstance(component, (list, tuple))
+    names = [entity.name for entity in r_block.entities[:r_block.ncomps]]
+    components = [names.index(c) if isinstance(c, str) and c in names else c
+                  for c in ([component] if single else component)]
+    derived = [c for c in components if isinstance(c, str)]
+
+    stats = [FieldStats(edges, thresholds, relative_accuracy)
+             for c in components]
+    num_rows = r_block.numnod if rows is None else len(rows)
+    for start in range(0, num_rows, chunk_size):
+        if rows is None:
+            chunk = slice(start, min(start + chunk_size, num_rows))
+        else:
+            chunk = rows[start:start + chunk_size]
+        fields = (dict(zip(derived, r_block.derived_rows(derived, chunk)))
+                  if derived else {})
+        for c, c_stats in zip(components, stats):
+            c_stats.update(fields[c] if isinstance(c, str)
+                           else r_block.values[chunk, c])
+    return stats[0] if single else stats
@@ -161,14 +161,15 @@ class GeneratePanel():
         except:
             print("Error while trying to delete RefinementResults.txt")
 
-        # Delete the FEAMetrics.npy file
-        try:
-            os.remove(self.workingDir + "/FEAMetrics.npy")
-        except FileNotFoundError:
-            #print("INFO: FEAMetrics.npy is missing")
-            pass
-        except:
-            print("Error while trying to delete FEAMetrics.npy")
+        # Delete the FEAMetrics.npz file, and the FEAMetrics.npy file it replaced
+        for fileName in ("/FEAMetrics.npz", "/FEAMetrics.npy"):
+            try:
+                os.remove(self.workingDir + fileName)
+            except FileNotFoundError:
+                #print("INFO: " + fileName[1:] + " is missing")
+                pass
+            except:
+                print("Error while trying to delete " + fileName[1:])
 
         # self.updateParametersTable()
         #self.tableModel.updateHeader([])
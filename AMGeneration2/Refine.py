@@ -10,6 +10,7 @@ import Part
 import PySide
 import Voxelise
 import numpy as np
+import stltovoxel.validate as validate
 import operator
 
 
@@ -80,17 +81,10 @@ class RefinePanel:
         numAnalysed = 0
         for i in range(self.numGenerations):
             FRDPath = self.workingDir + "/Gen" + str(i) + "/SolverCcxTools/FEMMeshNetgen.frd"
-            if os.path.isfile(FRDPath):
-                try:
-                    # This returns an exception if analysis failed for this .frd file, because there is no results data
-                    FRDParser.FRDParser(FRDPath)
-                except:
-                    self.statuses.append(["Failed"])
-                else:
-                    self.statuses.append(["Analysed"])
-                    numAnalysed += 1
-            else:
-                self.statuses.append(["Not analysed"])
+            status = Common.analysisStatus(FRDPath)
+            if status == "Analysed":
+                numAnalysed += 1
+            self.statuses.append([status])
 
         return numAnalysed
 
@@ -120,6 +114,7 @@ class RefinePanel:
     def refineAllGens(self):
         checkBuildVolume = self.form.buildVolumeCheck.isChecked()
         checkSupportStructure = self.form.supportStructureCheck.isChecked()
+        skipInvalidMeshes = self.form.meshCheck.isChecked()
 
         for i in range(self.numGenerations):
             result = {}
@@ -133,8 +128,27 @@ class RefinePanel:
             except:
                 print("Error while creating /Gen" + str(i) + "/ folder")
 
-            # Voxelise .stl file for this generation
+            # Check the mesh first, as open or non-manifold meshes voxelise into garbage
             stlPath = self.workingDir + "/Gen" + str(i) + ".stl"
+            report = validate.checkStl(stlPath)
+            if not report["IsValid"]:
+                print("WARNING: Gen" + str(i) + ".stl has " + validate.describeProblems(report))
+                if skipInvalidMeshes:
+                    # Remove models from an earlier run, so a stale model can't be viewed for this generation
+                    for modelName in ("voxelModel.npy", "supportModel.npy"):
+                        try:
+                            os.remove(self.workingDir + "/Gen" + str(i) + "/" + modelName)
+                        except FileNotFoundError:
+                            pass
+                    # Leave the results for this generation as NaN so they show up as missing
+                    result = {key: float('nan') for key in ('partVoxelCount', 'partVolume', 'supportVoxelCount',
+                                                            'supportVolume', 'supportRatio')}
+                    progress = ((i + 1) / self.numGenerations) * 100
+                    self.form.progressBar.setValue(progress)
+                    self.results.append(result)
+                    continue
+
+            # Voxelise .stl file for this generation
             voxels = Voxelise.voxelisePart(stlPath, self.voxelResolution)
 
             # Save numpy array to file
@@ -228,15 +242,17 @@ class RefinePanel:
     def resetViewControls(self, numGens):
         comboBoxItems = []
 
-        if numGens > 0:
+        # Only generations that were voxelised can be viewed, skipped meshes have no model
+        for i in range(numGens):
+            if os.path.isfile(self.workingDir + "/Gen" + str(i) + "/voxelModel.npy"):
+                comboBoxItems.append("Generation " + str(i))
+
+        if len(comboBoxItems) > 0:
             self.form.viewGenButton.setEnabled(True)
             self.form.selectGenBox.setEnabled(True)
             self.form.previousGen.setEnabled(True)
             self.form.nextGen.setEnabled(True)
 
-            for i in range(numGens):
-                comboBoxItems.append("Generation " + str(i))
-
             self.form.selectGenBox.clear()
             self.form.selectGenBox.addItems(comboBoxItems)
         else:
@@ -260,9 +276,16 @@ class RefinePanel:
 
         # Open the part and support model for this generation
         filePath = self.workingDir + "/Gen" + str(self.selectedGen) + "/voxelModel.npy"
+        if not os.path.isfile(filePath):
+            print("ERROR: Gen" + str(self.selectedGen) + " has no voxel model, its mesh was skipped or not refined yet")
+            return
         partVoxels = np.load(filePath)
+        # The support model is only there if support structures were generated
         filePath = self.workingDir + "/Gen" + str(self.selectedGen) + "/supportModel.npy"
-        supportVoxels = np.load(filePath)
+        if os.path.isfile(filePath):
+            supportVoxels = np.load(filePath)
+        else:
+            supportVoxels = np.zeros_like(partVoxels)
         self.voxels = partVoxels | supportVoxels
 
         # Colour in the part voxels orange, and the support voxels red
@@ -4,6 +4,7 @@ import FRDParser, operator
 import numpy as np
 import random
 import Common
+import FEAMetrics
 
 class ResultsCommand():
     """Show results of analysed generations"""
@@ -33,19 +34,13 @@ class ResultsPanel:
         self.workingDir = '/'.join(FreeCAD.ActiveDocument.FileName.split('/')[0:-1])
         self.numGenerations = self.checkGenerations()
 
-        # If FEAMetrics.npy doesn't exist, try to generate it from scratch
-        filePath = self.workingDir + "/FEAMetrics.npy"
-        if not os.path.isfile(filePath):
-            print("Calculating metrics...")
-            Common.calcAndSaveFEAMetrics()
+        # Update FEAMetrics.npz. Only generations analysed since their metrics were cached are parsed again
+        filePath = self.workingDir + "/FEAMetrics.npz"
+        print("Calculating metrics...")
+        Common.calcAndSaveFEAMetrics()
 
-        # Load metrics from file
-        metrics = np.load(filePath)
-        table = metrics.tolist()
-
-        # Split into header and table data, then update table
-        self.metricNames = table[0]
-        self.metrics = table[1:]
+        # Load the column headings and the (generations, columns) array of metrics, NaN for failed analyses
+        (self.metricNames, self.metrics) = FEAMetrics.loadFEAMetrics(filePath)
 
         # Add configuration controls
         self.addConfigControls()
@@ -68,10 +63,17 @@ class ResultsPanel:
         items = self.metrics
 
         colours = self.generateColourScalesFromMetrics()
-        self.tableModel = Common.GenTableModel(self.form, items, header, colours)
+        self.tableModel = Common.MetricTableModel(self.form, items, header, colours)
         self.form.resultsTable.setModel(self.tableModel)
+        self.updateVisibleColumns()
         self.form.resultsTable.resizeColumnsToContents()
 
+    def updateVisibleColumns(self):
+        # Only show the metrics that are ticked in the configuration controls. Column 0 of the table
+        # is the generation number, so metric i is in column i + 1
+        for i, controls in enumerate(self.configControls):
+            self.form.resultsTable.setColumnHidden(i + 1, not controls[0].isChecked())
+
     def addConfigControls(self):
         self.configControls = []
 
@@ -85,9 +87,12 @@ class ResultsPanel:
             maxBox = PySide.QtGui.QDoubleSpinBox(self.form)
 
             # Configure control parameters
-            paramCheck.setChecked(True)
+            paramCheck.setChecked(name in FEAMetrics.defaultFEAMetrics)
             minBox.setMaximum(999999.99)
             maxBox.setMaximum(999999.99)
+            # Principal stresses can be negative
+            minBox.setMinimum(-999999.99)
+            maxBox.setMinimum(-999999.99)
             gradientRadio.setChecked(True)
             radioGroup.addButton(redGreenRadio)
             radioGroup.addButton(gradientRadio)
@@ -102,8 +107,13 @@ class ResultsPanel:
                 self.updateResultsTableColours(colours)
                 pass
 
+            def checkToggled(checked):
+                self.updateVisibleColumns()
+                self.form.resultsTable.resizeColumnsToContents()
+
             minBox.valueChanged.connect(valueChanged)
             maxBox.valueChanged.connect(valueChanged)
+            paramCheck.toggled.connect(checkToggled)
 
             controls = [paramCheck, redGreenRadio, gradientRadio, radioGroup, minBox, maxBox]
             self.configControls.append(controls)
@@ -124,129 +134,30 @@ class ResultsPanel:
 
     def getMetricValueRange(self, metricName):
         i = self.metricNames.index(metricName)
-        height = len(self.metrics)
-        # Gather all the values in a column
-        values = [self.metrics[y][i] for y in range(height)]
-
-        # Make new column of values that doesn't include numbers
-        vals = []
-        for item in values:
-            try:
-                vals.append(float(item))
-            except ValueError:
-                pass
+        values = self.metrics[:, i]
 
-        # Calculate value range
-        minVal = min(vals)
-        maxVal = max(vals)
-        return (minVal, maxVal)
+        # Failed analyses are NaN, so leave them out of the value range
+        if np.all(np.isnan(values)):
+            return (0.0, 0.0)
+        return (float(np.nanmin(values)), float(np.nanmax(values)))
 
     def generateColourScalesFromMetrics(self):
         width = len(self.metricNames)
-        height = len(self.metrics)
-        colours = [[PySide.QtGui.QColor("white") for x in range(width)] for y in range(height)]
-
-        items = self.metrics
+        columnColours = []
 
         for i in range(width):
-            # Gather all the values in a column
-            values = [items[y][i] for y in range(height)]
-
-            # Make new column of values that doesn't include numbers
-            vals = []
-            for item in values:
-                try:
-                    vals.append(float(item))
-                except ValueError:
-                    pass
-
-            # Calculate value range
+            # Calibrate the colour scale to the value range set for that column
             minVal = self.configControls[i][4].value()
             maxVal = self.configControls[i][5].value()
+            columnColours.append(Common.colourColumn(self.metrics[:, i], minVal, maxVal, hue=0.4))
 
-            # Calculate value range to calibrate colour scale
-            valRange = maxVal - minVal
-
-            for j, value in enumerate(values):
-                try:
-                    value = float(value)
-                    if value > maxVal:
-                        # If value is greater than maximum, set it to full intensity
-                        normVal = 1.0
-                    else:
-                        # Normalise the value between 0-1 for the value range of that column
-                        normVal = (value - minVal) / valRange
-
-                    hue = 0.4
-                    col = hsvToRgb(hue, normVal, 1.0)
-                    col = [int(col[0]*255), int(col[1]*255), int(col[2]*255)]
-                    colours[j][i] = PySide.QtGui.QColor(col[0], col[1], col[2], 255)
-                except ValueError:
-                    # Item was not a number. Likely a string because an error occured for analysis in this row
-                    # so colour it pink
-                    colours[j][i] = PySide.QtGui.QColor(230, 184, 184, 255)
-                    pass
-
-        return colours
+        # Colours of each row, in generation order
+        return [list(row) for row in zip(*columnColours)]
 
 
 def readFRD(filepath):
-    result = None
-    try:
-        parser = FRDParser.FRDParser(filepath)
-
-        nodeCount = parser.frd.node_block.numnod
-        elemCount = parser.frd.elem_block.numelem
-
-        stresses = np.zeros((nodeCount, 4), dtype=np.float32)
-        disp = np.zeros((nodeCount, 4), dtype=np.float32)
-        error = np.zeros((nodeCount, 1), dtype=np.float32)
-        for i in range(nodeCount):
-            stresses[i, 0:3] = parser.get_results_node(i + 1, names="STRESS")[0][0:3]
-            disp[i, 0:3] = parser.get_results_node(i + 1, names="DISP")[0][0:3]
-            error[i] = parser.get_results_node(i + 1, names="ERROR")[0]
-
-        # Calculate resultant stresses and displacements
-        stresses[:, 3] = np.sqrt(np.square(stresses[:, 0]) + np.square(stresses[:, 1]) + np.square(stresses[:, 2]))
-        disp[:, 3] = np.sqrt(np.square(disp[:, 0]) + np.square(disp[:, 1]) + np.square(disp[:, 2]))
-
-        # Find max and mean for stress, displacement, and error
-        resultantStress = stresses[:, 3]
-        maxStress = round(max(resultantStress), 3)
-        meanStress = round(np.mean(resultantStress), 3)
-
-        resultantDisp = disp[:, 3]
-        maxDisp = round(max(resultantDisp), 3)
-        meanDisp = round(np.mean(resultantDisp), 3)
-
-        maxError = round(max(error)[0], 1)
-        meanError = round((np.mean(error)), 1)
-
-        # Store results in dictionary to be returned by function
-        result = {
-            "NodeCount": nodeCount,
-            "ElemCount": elemCount,
-            "MaxStress": maxStress,
-            "MeanStress": meanStress,
-            "MaxDisp": maxDisp,
-            "MeanDisp": meanDisp,
-            "MaxError": maxError,
-            "MeanError": meanError
-        }
-    except:
-        print("Analysis failed on generation")
-        result = {
-            "NodeCount": None,
-            "ElemCount": None,
-            "MaxStress": None,
-            "MeanStress": None,
-            "MaxDisp":    None,
-            "MeanDisp":   None,
-            "MaxError":   None,
-            "MeanError":  None
-        }
-    finally:
-        return(result)
+    # Same metrics as the FEA results table
+    return FEAMetrics.calculateFEAMetric(filepath)
 
 def hsvToRgb(h, s, v):
     if s == 0.0:
@@ -11,6 +11,7 @@ import numpy as np
 import stltovoxel.slice as slice
 import stltovoxel.stl_reader as stl_reader
 import stltovoxel.perimeter as perimeter
+import stltovoxel.decimate as decimate
 from stltovoxel.util import arrayToWhiteGreyscalePixel, padVoxelArray
 
 #from simple_3dviz import Mesh
@@ -18,9 +19,12 @@ from stltovoxel.util import arrayToWhiteGreyscalePixel, padVoxelArray
 #from simple_3dviz.utils import render
 
 
-def meshToVoxel(inputFilePath, scaleFactor):
+def meshToVoxel(inputFilePath, scaleFactor, decimation=None):
     mesh = list(stl_reader.read_stl_verticies(inputFilePath))
     (scale, shift, bounding_box) = slice.calculateScaleAndShift(mesh, scaleFactor)
+    if decimation:
+        # Collapse triangles much smaller than a voxel before slicing
+        mesh = decimate.decimateMesh(mesh, 1.0 / scale[0], decimation)
     mesh = list(slice.scaleAndShiftMesh(mesh, scale, shift))
     #Note: vol should be addressed with vol[z][x][y]
     vol = np.zeros((bounding_box[2],bounding_box[0],bounding_box[1]), dtype=bool)
@@ -33,8 +37,8 @@ def meshToVoxel(inputFilePath, scaleFactor):
     vol, bounding_box = padVoxelArray(vol)
     return(vol)
 
-def voxelisePart(fileName, resolution):
-    voxels = meshToVoxel(fileName, resolution)
+def voxelisePart(fileName, resolution, decimation=None):
+    voxels = meshToVoxel(fileName, resolution, decimation)
     voxels = np.swapaxes(voxels, 0, 2)
     voxels = np.flip(voxels, 1)
 
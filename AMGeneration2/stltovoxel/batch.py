@@ -0,0 +1,145 @@
+"""Voxelise many STL files in one go, spread over a process pool.
+
+Inputs can be files, directories (every .stl directly inside them) or glob
+patterns. Each output is written next to a <output>.json summary holding the
+settings and timing of the run, which is also used to skip inputs that are
+already up to date.
+
+Run it as a module from the directory holding the stltovoxel package, e.g.
+from AMGeneration2:
+    python -m stltovoxel.batch "project/Gen*.stl" -o voxels -f .svx -r 2 -e numpy -j 8
+"""
+
+import argparse
+import glob
+import json
+import os
+import os.path
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from stltovoxel.stltovoxel import doExport, ENGINES, DEFAULT_ENGINE
+
+OUTPUT_FORMATS = ('.png', '.xyz', '.xyzb', '.svx')
+
+
+def findInputFiles(patterns):
+    inputFiles = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.stl'))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        for match in sorted(matches):
+            if match.lower().endswith('.stl') and match not in inputFiles:
+                inputFiles.append(match)
+    return inputFiles
+
+
+def outputPathFor(inputFilePath, outputDir, outputFormat):
+    name = os.path.splitext(os.path.basename(inputFilePath))[0]
+    directory = outputDir if outputDir is not None else os.path.dirname(inputFilePath)
+    return os.path.join(directory, name + outputFormat)
+
+
+def summaryPathFor(outputFilePath):
+    return outputFilePath + '.json'
+
+
+def isUpToDate(inputFilePath, outputFilePath, resolution, engine, decimation=None):
+    # PNG output is a numbered series, so rely on the summary written after a successful export
+    if not outputFilePath.endswith('.png') and not os.path.isfile(outputFilePath):
+        return False
+    try:
+        with open(summaryPathFor(outputFilePath)) as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return False
+    inputStat = os.stat(inputFilePath)
+    return (summary.get('status') == 'ok'
+            and summary.get('resolution') == resolution
+            and summary.get('engine') == engine
+            and summary.get('decimation') == decimation
+            and summary.get('inputSize') == inputStat.st_size
+            and summary.get('inputMtime') == inputStat.st_mtime)
+
+
+def voxeliseFile(inputFilePath, outputFilePath, resolution, engine, decimation=None):
+    # Runs in a worker process. Failures are reported in the summary rather than
+    # raised, so one bad file doesn't abort the rest of the batch
+    inputStat = os.stat(inputFilePath)
+    summary = {
+        'input': inputFilePath,
+        'output': outputFilePath,
+        'resolution': resolution,
+        'engine': engine,
+        'decimation': decimation,
+        'inputSize': inputStat.st_size,
+        'inputMtime': inputStat.st_mtime,
+    }
+    start = time.perf_counter()
+    try:
+        doExport(inputFilePath, outputFilePath, resolution, engine, verbose=False, decimation=decimation)
+    except Exception:
+        summary['status'] = 'failed'
+        summary['error'] = traceback.format_exc()
+    else:
+        summary['status'] = 'ok'
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+
+    with open(summaryPathFor(outputFilePath), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert many STL files to voxels in parallel')
+    parser.add_argument('inputs', nargs='+', help='STL files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', default=None, help='Output directory (default: next to each input)')
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='.svx', help='Output format (default .svx)')
+    parser.add_argument('-r', '--resolution', type=float, default=100, help='Voxels per unit length (default 100)')
+    parser.add_argument('-e', '--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                        help='Slicing engine (default %s)' % DEFAULT_ENGINE)
+    parser.add_argument('-d', '--decimate', type=float, default=None, metavar='RATIO',
+                        help='Decimate each mesh on a grid RATIO times finer than the voxels before slicing')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='Voxelise inputs even if their output is up to date')
+    args = parser.parse_args(argv)
+
+    inputFiles = findInputFiles(args.inputs)
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = []
+    for inputFilePath in inputFiles:
+        outputFilePath = outputPathFor(inputFilePath, args.output_dir, args.format)
+        if not args.force and isUpToDate(inputFilePath, outputFilePath, args.resolution, args.engine, args.decimate):
+            print('Skipping %s, output is up to date' % inputFilePath)
+        else:
+            jobs.append((inputFilePath, outputFilePath))
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(voxeliseFile, inputFilePath, outputFilePath, args.resolution, args.engine,
+                                   args.decimate): inputFilePath
+                   for (inputFilePath, outputFilePath) in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            inputFilePath = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                # The worker itself died, e.g. out of memory
+                print('[%d/%d] failed %s (%s)' % (done, len(jobs), inputFilePath, e))
+                failures += 1
+                continue
+            if summary['status'] != 'ok':
+                failures += 1
+            print('[%d/%d] %s %s (%.1fs)' % (done, len(jobs), summary['status'], inputFilePath, summary['seconds']))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import numpy as np
+
+# Vertex clustering decimation. Every vertex is snapped into a cell of a grid
+# finer than the voxel pitch and each cell is collapsed into the mean of its
+# vertices. Triangles smaller than a cell disappear, which leaves the voxels
+# unchanged while cutting the number of triangles the slicer has to walk.
+
+
+def clusterVertices(triangles, cellSize):
+    '''
+    :param triangles: (N, 3, 3) triangle array
+    :param cellSize: Edge length of the clustering grid cells
+    :return: (vertices, faces), an (M, 3) vertex array and a (K, 3) array of vertex indices
+    '''
+    points = triangles.reshape(-1, 3)
+    cells = np.floor((points - points.min(axis=0)) / cellSize).astype(np.int64)
+    gridSize = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * gridSize[1] + cells[:, 1]) * gridSize[2] + cells[:, 2]
+    cellKeys, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    counts = np.bincount(inverse)
+    vertices = np.empty((len(cellKeys), 3))
+    for i in range(3):
+        vertices[:, i] = np.bincount(inverse, weights=points[:, i]) / counts
+
+    faces = inverse.reshape(-1, 3)
+    # Triangles with two corners in the same cell have collapsed onto a line or a point
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    faces = faces[~degenerate]
+
+    # Collapsing can also leave the same triangle twice, so compare them with their
+    # smallest index rotated to the front, which keeps the winding order intact
+    rotation = np.argmin(faces, axis=1)
+    rows = np.arange(len(faces))[:, None]
+    rotated = faces[rows, (rotation[:, None] + np.arange(3)) % 3]
+    _, unique = np.unique(rotated, axis=0, return_index=True)
+    faces = faces[np.sort(unique)]
+
+    # Two triangles left on the same corners are now wound opposite ways. They form a fin
+    # without volume whose edges are used four times, so drop both to keep the mesh manifold
+    _, inverse, counts = np.unique(np.sort(faces, axis=1), axis=0, return_inverse=True, return_counts=True)
+    faces = faces[counts[inverse.reshape(-1)] == 1]
+
+    # Re-index so only the vertices still referenced by a face are kept
+    used = np.unique(faces)
+    remap = np.full(len(vertices), -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    return vertices[used], remap[faces]
+
+
+def decimateMesh(triangles, voxelSize, ratio=4):
+    '''
+    :param triangles: (N, 3, 3) triangle array
+    :param voxelSize: Voxel pitch in the units of the mesh
+    :param ratio: Clustering cells per voxel along each axis, must be above 1
+    :return: Decimated (M, 3, 3) triangle array
+    '''
+    if ratio <= 1:
+        raise ValueError('Decimation ratio must be above 1 to stay finer than the voxel pitch')
+    vertices, faces = clusterVertices(np.asarray(triangles, dtype=np.float64), voxelSize / ratio)
+    return vertices[faces]
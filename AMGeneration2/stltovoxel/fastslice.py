@@ -0,0 +1,166 @@
+import numpy as np
+
+# Vectorised counterpart of slice.py and perimeter.py. The mesh is held as an
+# (N, 3, 3) array of [triangle][vertex][xyz] instead of a list of tuples, and
+# every layer is sliced and filled with whole-array operations.
+
+
+def calculateScaleAndShift(triangles, scaleFactor):
+    # Same bounding box rules as slice.calculateScaleAndShift
+    points = triangles.reshape(-1, 3)
+    mins = points.min(axis=0)
+    maxs = points.max(axis=0)
+    shift = [-min for min in mins]
+    x_width = int(maxs[0] - mins[0])
+    resolution = x_width * scaleFactor
+    xyscale = float(resolution) / x_width
+    scale = [xyscale, xyscale, xyscale]
+    y_width = int(maxs[1] - mins[1])
+    z_width = int(maxs[2] - mins[2])
+    bounding_box = [x_width * scaleFactor, y_width * scaleFactor, z_width * scaleFactor]
+    bounding_box = [int(i) for i in bounding_box]
+    return (scale, shift, bounding_box)
+
+
+def scaleAndShiftMesh(triangles, scale, shift):
+    # slice.scaleAndShiftMesh multiplies numpy scalars of the mesh's dtype by a python float, so
+    # the scaled mesh takes the type numpy gives that product, float32 for binary STLs with numpy 2
+    triangles = triangles + np.asarray(shift, dtype=triangles.dtype)
+    triangles = triangles.astype(type(triangles.dtype.type(1) * scale[0])) * np.asarray(scale)
+    # Drop triangles that collapsed onto a line or a point, like slice.scaleAndShiftMesh
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    degenerate = (v0 == v1).all(axis=1) | (v1 == v2).all(axis=1) | (v2 == v0).all(axis=1)
+    return triangles[~degenerate]
+
+
+def firstCorners(triangles, mask, count):
+    # (N, count, 3) array of the first count corners of each triangle where mask is set, in order
+    order = np.argsort(~mask, axis=1, kind='stable')[:, :count]
+    return np.take_along_axis(triangles, order[:, :, None], axis=1)
+
+
+def crossingPoints(below, above, height):
+    # Where the edges from the corners below to the corners above cross the plane, worked out
+    # like slice.whereLineCrossesZ so that the points are the same to the last bit
+    distance = (height - below[:, 2]) / (above[:, 2] - below[:, 2])
+    return below[:, 0:2] - distance[:, None] * (below[:, 0:2] - above[:, 0:2])
+
+
+def toIntersectingSegments(triangles, height):
+    '''
+    :param triangles: (N, 3, 3) triangle array
+    :param height: Height of the slicing plane
+    :return: (M, 2, 2) array of [segment][end][xy] where the plane cuts the mesh
+
+    The segments are those of slice.toIntersectingLines, with their ends in the same order:
+    the edge between two corners on the plane, the crossing of the edge opposite a corner on
+    the plane and that corner, or the crossings of the two edges from the corners below to
+    the corners above.
+    '''
+    z = triangles[:, :, 2]
+    above = z > height
+    below = z < height
+    same = z == height
+    numAbove = above.sum(axis=1)
+    numBelow = below.sum(axis=1)
+    numSame = same.sum(axis=1)
+    segments = [np.empty((0, 2, 2), dtype=triangles.dtype)]
+
+    # Two corners on the plane, whatever side the third one is on
+    onPlane = triangles[numSame == 2]
+    if len(onPlane):
+        segments.append(firstCorners(onPlane, same[numSame == 2], 2)[:, :, 0:2])
+
+    # One corner on the plane and the opposite edge crossing it
+    cut = (numSame == 1) & (numAbove == 1)
+    if cut.any():
+        corner = firstCorners(triangles[cut], same[cut], 1)[:, 0]
+        crossing = crossingPoints(firstCorners(triangles[cut], below[cut], 1)[:, 0],
+                                  firstCorners(triangles[cut], above[cut], 1)[:, 0], height)
+        segments.append(np.stack((crossing, corner[:, 0:2]), axis=1))
+
+    # No corner on the plane. The edges go from the first corner below to both corners above,
+    # or from both corners below to the corner above
+    cut = (numSame == 0) & (numAbove > 0) & (numBelow > 0)
+    if cut.any():
+        cutAbove = firstCorners(triangles[cut], above[cut], 2)
+        cutBelow = firstCorners(triangles[cut], below[cut], 2)
+        twoAbove = (numAbove[cut] == 2)[:, None]
+        start = crossingPoints(cutBelow[:, 0], cutAbove[:, 0], height)
+        end = crossingPoints(np.where(twoAbove, cutBelow[:, 0], cutBelow[:, 1]),
+                             np.where(twoAbove, cutAbove[:, 1], cutAbove[:, 0]), height)
+        segments.append(np.stack((start, end), axis=1))
+    return np.concatenate(segments)
+
+
+def segmentsToVoxels(segments, pixels):
+    '''
+    Scanline fill of the closed perimeters in segments into pixels[x][y], the same way as
+    perimeter.linesToVoxels.
+
+    Every integer x column is intersected with the segments, and each crossing sets the pixel
+    int(y) it falls in and toggles between inside and outside for the pixels above it.
+    Crossings below or above the pixels are never reached by the column scan, so they don't
+    toggle anything.
+    '''
+    width, height = pixels.shape
+    if len(segments) == 0:
+        return
+    x0 = segments[:, 0, 0]
+    x1 = segments[:, 1, 0]
+    # A segment crosses column x when x lies in [min x, max x), so shared end points count once
+    first = np.maximum(np.ceil(np.minimum(x0, x1)).astype(np.int64), 0)
+    last = np.minimum(np.ceil(np.maximum(x0, x1)).astype(np.int64) - 1, width - 1)
+    counts = np.maximum(last - first + 1, 0)
+    segmentIdx = np.repeat(np.arange(len(segments)), counts)
+    columns = np.repeat(first, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    if len(columns) == 0:
+        return
+    seg = segments[segmentIdx]
+    ratio = (columns.astype(segments.dtype) - seg[:, 0, 0]) / (seg[:, 1, 0] - seg[:, 0, 0])
+    ys = seg[:, 0, 1] + ratio * (seg[:, 1, 1] - seg[:, 0, 1])
+    # int() rounds towards zero
+    rows = ys.astype(np.int64)
+
+    # perimeter.onLine also skips crossings rounded past both ends of their segment
+    y0 = seg[:, 0, 1]
+    y1 = seg[:, 1, 1]
+    offLine = ((y0.astype(np.int64) != rows) & (y1.astype(np.int64) != rows)
+               & ((np.maximum(y0, y1) < rows) | (np.minimum(y0, y1) > rows)))
+    keep = (rows >= 0) & (rows < height) & ~offLine
+    columns = columns[keep]
+    rows = rows[keep]
+
+    order = np.lexsort((rows, columns))
+    columns = columns[order]
+    rows = rows[order]
+    # Crossings alternate between entering and leaving the part within each column
+    columnStart = np.searchsorted(columns, columns, side='left')
+    entering = (np.arange(len(columns)) - columnStart) % 2 == 0
+
+    coverage = np.zeros((width, height + 1), dtype=np.int32)
+    np.add.at(coverage, (columns[entering], rows[entering]), 1)
+    np.add.at(coverage, (columns[~entering], rows[~entering] + 1), -1)
+    pixels |= np.cumsum(coverage, axis=1)[:, :height] > 0
+
+
+def voxeliseLayers(triangles, bounding_box, verbose=True):
+    '''
+    :param triangles: Scaled and shifted (N, 3, 3) triangle array
+    :param bounding_box: Voxel bounding box, as returned by calculateScaleAndShift
+    :return: Generator of boolean layers addressed with layer[x][y], from the bottom up
+    '''
+    # Only triangles spanning the current height need to be sliced, so keep them sorted by lowest point
+    zmin = triangles[:, :, 2].min(axis=1)
+    order = np.argsort(zmin)
+    triangles = triangles[order]
+    zmin = zmin[order]
+    zmax = triangles[:, :, 2].max(axis=1)
+    for height in range(bounding_box[2]):
+        if verbose:
+            print('Processing layer %d/%d'%(height+1,bounding_box[2]))
+        end = np.searchsorted(zmin, height, side='right')
+        active = triangles[:end][zmax[:end] >= height]
+        layer = np.zeros((bounding_box[0], bounding_box[1]), dtype=bool)
+        segmentsToVoxels(toIntersectingSegments(active, height), layer)
+        yield layer
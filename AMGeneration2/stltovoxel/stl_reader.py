@@ -14,21 +14,28 @@ import numpy as np
 from struct import unpack
 
 
-def BinarySTL(fname):
+record_dtype = np.dtype([
+    ('normals', np.float32, (3,)),
+    ('Vertex1', np.float32, (3,)),
+    ('Vertex2', np.float32, (3,)),
+    ('Vertex3', np.float32, (3,)),
+    ('atttr', '<i2', (1,) )
+])
+
+
+def BinarySTLRecords(fname):
     fp = open(fname, 'rb')
     Header = fp.read(80)
     nn = fp.read(4)
     Numtri = unpack('i', nn)[0]
     #print(str(Numtri) + " triangles")
-    record_dtype = np.dtype([
-        ('normals', np.float32, (3,)),
-        ('Vertex1', np.float32, (3,)),
-        ('Vertex2', np.float32, (3,)),
-        ('Vertex3', np.float32, (3,)),
-        ('atttr', '<i2', (1,) )
-    ])
     data = np.fromfile(fp, dtype=record_dtype, count=Numtri)
     fp.close()
+    return Header, data
+
+
+def BinarySTL(fname):
+    Header, data = BinarySTLRecords(fname)
 
     Normals = data['normals']
     Vertex1 = data['Vertex1']
@@ -85,3 +92,10 @@ def read_stl_verticies(fname):
             yield (tuple(i), tuple(j), tuple(k))
 
 
+def read_stl_array(fname):
+    """Return all triangles as an (N, 3, 3) float array of [triangle][vertex][xyz]."""
+    if IsAsciiStl(fname):
+        return np.array(AsciiSTL(fname), dtype=np.float64).reshape(-1, 3, 3)
+    else:
+        head, data = BinarySTLRecords(fname)
+        return np.stack((data['Vertex1'], data['Vertex2'], data['Vertex3']), axis=1)
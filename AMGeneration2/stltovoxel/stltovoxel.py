@@ -1,6 +1,8 @@
 import argparse
 import os.path
 import io
+import struct
+import sys
 import xml.etree.cElementTree as ET
 from zipfile import ZipFile
 import zipfile
@@ -8,51 +10,129 @@ import zipfile
 from PIL import Image
 import numpy as np
 
-import slice
-import stl_reader
-import perimeter
-from util import arrayToWhiteGreyscalePixel, padVoxelArray
+if not __package__:
+    # Run as a script: this file would shadow the stltovoxel package, so put the
+    # package's parent directory on the path instead of the package directory
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or '.') != packageDir]
+    sys.path.insert(0, os.path.dirname(packageDir))
 
+import stltovoxel.slice as slice
+import stltovoxel.stl_reader as stl_reader
+import stltovoxel.perimeter as perimeter
+import stltovoxel.fastslice as fastslice
+import stltovoxel.decimate as decimate
+from stltovoxel.util import padVoxelLayers
 
-def doExport(inputFilePath, outputFilePath, resolution):
-    mesh = list(stl_reader.read_stl_verticies(inputFilePath))
-    (scale, shift, bounding_box) = slice.calculateScaleAndShift(mesh, resolution)
-    mesh = list(slice.scaleAndShiftMesh(mesh, scale, shift))
-    #Note: vol should be addressed with vol[z][x][y]
-    vol = np.zeros((bounding_box[2],bounding_box[0],bounding_box[1]), dtype=bool)
-    for height in range(bounding_box[2]):
-        print('Processing layer %d/%d'%(height+1,bounding_box[2]))
-        lines = slice.toIntersectingLines(mesh, height)
-        prepixel = np.zeros((bounding_box[0], bounding_box[1]), dtype=bool)
-        perimeter.linesToVoxels(lines, prepixel)
-        vol[height] = prepixel
-    vol, bounding_box = padVoxelArray(vol)
+# 'python' is the original per-triangle slicer, 'numpy' the vectorised one in fastslice.
+# Both fill the same voxels (testfastslice compares them); the python one stays the
+# default since it is the slicer the workbench has always used
+ENGINES = ('python', 'numpy')
+DEFAULT_ENGINE = 'python'
+
+# Binary point cloud header: magic, version, bytes per coordinate, grid size x/y/z, point count.
+# Coordinates follow as little-endian (x, y, z) triples of int16, or int32 for grids over 32768 voxels
+XYZB_MAGIC = b'XYZB'
+XYZB_HEADER = struct.Struct('<4sBB2xIIIQ')
+
+def doExport(inputFilePath, outputFilePath, resolution, engine=DEFAULT_ENGINE, verbose=True, decimation=None):
+    '''
+    :param decimation: Optional clustering cells per voxel for decimate.decimateMesh, applied before slicing
+    '''
+    if engine == 'numpy':
+        mesh = stl_reader.read_stl_array(inputFilePath)
+        (scale, shift, bounding_box) = fastslice.calculateScaleAndShift(mesh, resolution)
+        if decimation:
+            mesh = decimate.decimateMesh(mesh, 1.0 / scale[0], decimation)
+        mesh = fastslice.scaleAndShiftMesh(mesh, scale, shift)
+        layers = fastslice.voxeliseLayers(mesh, bounding_box, verbose)
+    elif engine == 'python':
+        mesh = list(stl_reader.read_stl_verticies(inputFilePath))
+        (scale, shift, bounding_box) = slice.calculateScaleAndShift(mesh, resolution)
+        if decimation:
+            mesh = decimate.decimateMesh(mesh, 1.0 / scale[0], decimation)
+        mesh = list(slice.scaleAndShiftMesh(mesh, scale, shift))
+        layers = voxeliseLayers(mesh, bounding_box, verbose)
+    else:
+        raise ValueError('Unknown engine %s, expected one of %s' % (engine, ENGINES))
+    # Layers are padded and written as they come out of the slicer, so only a
+    # few layers are ever held in memory regardless of the part height
+    layers = padVoxelLayers(layers, bounding_box)
+    bounding_box = [bounding_box[0] + 2, bounding_box[1] + 2, bounding_box[2] + 2]
     outputFilePattern, outputFileExtension = os.path.splitext(outputFilePath)
     if outputFileExtension == '.png':
-        exportPngs(vol, bounding_box, outputFilePath)
+        exportPngs(layers, bounding_box, outputFilePath)
     elif outputFileExtension == '.xyz':
-        exportXyz(vol, bounding_box, outputFilePath)
+        exportXyz(layers, bounding_box, outputFilePath)
+    elif outputFileExtension == '.xyzb':
+        exportXyzBinary(layers, bounding_box, outputFilePath)
     elif outputFileExtension == '.svx':
-        exportSvx(vol, bounding_box, outputFilePath, scale, shift)
+        exportSvx(layers, bounding_box, outputFilePath, scale, shift)
 
+def voxeliseLayers(mesh, bounding_box, verbose=True):
+    '''
+    :param mesh: Scaled and shifted mesh, as returned by slice.scaleAndShiftMesh
+    :param bounding_box: Voxel bounding box, as returned by slice.calculateScaleAndShift
+    :return: Generator of boolean layers addressed with layer[x][y], from the bottom up
+    '''
+    for height in range(bounding_box[2]):
+        if verbose:
+            print('Processing layer %d/%d'%(height+1,bounding_box[2]))
+        lines = slice.toIntersectingLines(mesh, height)
+        prepixel = np.zeros((bounding_box[0], bounding_box[1]), dtype=bool)
+        perimeter.linesToVoxels(lines, prepixel)
+        yield prepixel
+
+def layerToImage(layer):
+    # PIL images are addressed with [column, row], so layer[x][y] maps onto the transpose
+    return Image.fromarray(layer.T.astype(np.uint8) * 255)
+
+# The exporters accept either a full vol[z][x][y] array or any iterable of layers
 def exportPngs(voxels, bounding_box, outputFilePath):
     size = str(len(str(bounding_box[2]))+1)
     outputFilePattern, outputFileExtension = os.path.splitext(outputFilePath)
-    for height in range(bounding_box[2]):
-        img = Image.new('L', (bounding_box[0], bounding_box[1]), 'black')  # create a new black image
-        pixels = img.load()
-        arrayToWhiteGreyscalePixel(voxels[height], pixels)
+    for height, layer in enumerate(voxels):
+        img = layerToImage(layer)
         path = (outputFilePattern + "%0" + size + "d.png")%height
         img.save(path)
 
 def exportXyz(voxels, bounding_box, outputFilePath):
-    output = open(outputFilePath, 'w')
-    for z in range(bounding_box[2]):
-        for x in range(bounding_box[0]):
-            for y in range(bounding_box[1]):
-                if voxels[z][x][y]:
-                    output.write('%s %s %s\n'%(x,y,z))
-    output.close()
+    with open(outputFilePath, 'w') as output:
+        for z, layer in enumerate(voxels):
+            # argwhere walks x then y, the same order as the original nested loops
+            points = np.argwhere(layer)
+            if len(points):
+                lineFormat = '%d %d ' + str(z) + '\n'
+                output.write(lineFormat * len(points) % tuple(points.ravel().tolist()))
+
+def exportXyzBinary(voxels, bounding_box, outputFilePath):
+    itemSize = 2 if max(bounding_box) <= np.iinfo(np.int16).max + 1 else 4
+    dtype = '<i%d' % itemSize
+    count = 0
+    with open(outputFilePath, 'wb') as output:
+        output.write(XYZB_HEADER.pack(XYZB_MAGIC, 1, itemSize, *bounding_box, 0))
+        for z, layer in enumerate(voxels):
+            points = np.argwhere(layer)
+            block = np.empty((len(points), 3), dtype=dtype)
+            block[:, 0:2] = points
+            block[:, 2] = z
+            output.write(block.tobytes())
+            count += len(points)
+        # The point count is only known once the last layer has been written
+        output.seek(XYZB_HEADER.size - 8)
+        output.write(struct.pack('<Q', count))
+
+def readXyzBinary(inputFilePath):
+    '''
+    :param inputFilePath: File written by exportXyzBinary
+    :return: (points, grid_size), points being an (N, 3) integer array of x, y, z voxel coordinates
+    '''
+    with open(inputFilePath, 'rb') as inputFile:
+        magic, version, itemSize, sizeX, sizeY, sizeZ, count = XYZB_HEADER.unpack(inputFile.read(XYZB_HEADER.size))
+        if magic != XYZB_MAGIC:
+            raise ValueError('%s is not a binary xyz file' % inputFilePath)
+        points = np.fromfile(inputFile, dtype='<i%d' % itemSize, count=count * 3).reshape(count, 3)
+    return points, (sizeX, sizeY, sizeZ)
 
 def exportSvx(voxels, bounding_box, outputFilePath, scale, shift):
     size = str(len(str(bounding_box[2]))+1)
@@ -72,10 +152,8 @@ def exportSvx(voxels, bounding_box, outputFilePath, scale, shift):
     })
     manifest = ET.tostring(root)
     with ZipFile(outputFilePath, 'w', zipfile.ZIP_DEFLATED) as zipFile:
-        for height in range(bounding_box[2]):
-            img = Image.new('L', (bounding_box[0], bounding_box[1]), 'black')  # create a new black image
-            pixels = img.load()
-            arrayToWhiteGreyscalePixel(voxels[height], pixels)
+        for height, layer in enumerate(voxels):
+            img = layerToImage(layer)
             output = io.BytesIO()
             img.save(output, format="PNG")
             zipFile.writestr(("density/slice%0" + size + "d.png")%height, output.getvalue())
@@ -94,6 +172,11 @@ def file_choices(choices,fname):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Convert STL files to voxels')
     parser.add_argument('input', nargs='?', type=lambda s:file_choices(('.stl'),s))
-    parser.add_argument('output', nargs='?', type=lambda s:file_choices(('.png', '.xyz', '.svx'),s))
+    parser.add_argument('output', nargs='?', type=lambda s:file_choices(('.png', '.xyz', '.xyzb', '.svx'),s))
+    parser.add_argument('-r', '--resolution', type=float, default=100, help='Voxels per unit length (default 100)')
+    parser.add_argument('-e', '--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                        help='Slicing engine (default %s)' % DEFAULT_ENGINE)
+    parser.add_argument('-d', '--decimate', type=float, default=None, metavar='RATIO',
+                        help='Decimate the mesh on a grid RATIO times finer than the voxels before slicing')
     args = parser.parse_args()
-    doExport(args.input, args.output, 100)
+    doExport(args.input, args.output, args.resolution, args.engine, decimation=args.decimate)
@@ -0,0 +1,106 @@
+import contextlib
+import io
+import json
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+if not __package__:
+    # Run as a script: import the slicers through the stltovoxel package like stltovoxel.py does
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or '.') != packageDir]
+    sys.path.insert(0, os.path.dirname(packageDir))
+
+import stltovoxel.batch as batch
+import stltovoxel.stltovoxel as stltovoxel
+from stltovoxel.testfastslice import makeBox, makeSphere, writeBinaryStl
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.inputDir = os.path.join(self.directory, 'parts')
+        os.mkdir(self.inputDir)
+        self.inputPaths = []
+        for i, triangles in enumerate((makeBox((0, 0, 0), (4, 3, 2)), makeSphere(2, 20))):
+            path = os.path.join(self.inputDir, 'Gen%d.stl' % i)
+            writeBinaryStl(path, triangles)
+            self.inputPaths.append(path)
+        self.outputDir = os.path.join(self.directory, 'voxels')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def runBatch(self, *args):
+        # Exit code and printed lines of a batch run
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            exitCode = batch.main(list(args))
+        return exitCode, output.getvalue().splitlines()
+
+    def readSummary(self, outputPath):
+        with open(batch.summaryPathFor(outputPath)) as f:
+            return json.load(f)
+
+    def test_find_input_files(self):
+        pattern = os.path.join(self.inputDir, 'Gen*.stl')
+        self.assertEqual(batch.findInputFiles([self.inputDir]), self.inputPaths)
+        self.assertEqual(batch.findInputFiles([pattern, self.inputPaths[1]]), self.inputPaths)
+        self.assertEqual(batch.findInputFiles([os.path.join(self.inputDir, '*')]), self.inputPaths)
+        self.assertEqual(batch.outputPathFor(self.inputPaths[0], None, '.svx'), os.path.join(self.inputDir, 'Gen0.svx'))
+
+    def test_batch(self):
+        exitCode, lines = self.runBatch(self.inputDir, '-o', self.outputDir, '-f', '.xyzb', '-r', '2',
+                                        '-e', 'numpy', '-j', '2')
+        self.assertEqual(exitCode, 0)
+        self.assertEqual(len(lines), 2)
+        for inputPath in self.inputPaths:
+            outputPath = batch.outputPathFor(inputPath, self.outputDir, '.xyzb')
+            summary = self.readSummary(outputPath)
+            self.assertEqual((summary['status'], summary['engine'], summary['resolution']), ('ok', 'numpy', 2))
+
+            # The same voxels as a single export
+            singlePath = os.path.join(self.directory, 'single.xyzb')
+            stltovoxel.doExport(inputPath, singlePath, 2, 'numpy', verbose=False)
+            with open(outputPath, 'rb') as output, open(singlePath, 'rb') as single:
+                self.assertEqual(output.read(), single.read())
+
+        # Up to date outputs are skipped, unless the settings change or the run is forced
+        exitCode, lines = self.runBatch(self.inputDir, '-o', self.outputDir, '-f', '.xyzb', '-r', '2', '-e', 'numpy')
+        self.assertEqual(lines, ['Skipping %s, output is up to date' % path for path in self.inputPaths])
+        outputPath = batch.outputPathFor(self.inputPaths[0], self.outputDir, '.xyzb')
+        self.assertFalse(batch.isUpToDate(self.inputPaths[0], outputPath, 3, 'numpy'))
+        self.assertFalse(batch.isUpToDate(self.inputPaths[0], outputPath, 2, 'python'))
+        self.assertFalse(batch.isUpToDate(self.inputPaths[0], outputPath, 2, 'numpy', decimation=4))
+        exitCode, lines = self.runBatch(self.inputPaths[0], '-o', self.outputDir, '-f', '.xyzb', '-r', '2',
+                                        '-e', 'numpy', '--force')
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('[1/1] ok'))
+
+        # A changed input is voxelised again
+        writeBinaryStl(self.inputPaths[1], makeSphere(2.5, 20))
+        os.utime(self.inputPaths[1], (0, 0))
+        exitCode, lines = self.runBatch(self.inputDir, '-o', self.outputDir, '-f', '.xyzb', '-r', '2', '-e', 'numpy')
+        self.assertEqual(lines[0], 'Skipping %s, output is up to date' % self.inputPaths[0])
+        self.assertTrue(lines[1].startswith('[1/1] ok %s ' % self.inputPaths[1]))
+
+    def test_failure(self):
+        # A broken file is reported in its summary without stopping the others
+        brokenPath = os.path.join(self.inputDir, 'Gen2.stl')
+        with open(brokenPath, 'wb') as broken:
+            broken.write(b'\0' * 80 + b'\xff\xff\xff\x7f')
+        exitCode, lines = self.runBatch(self.inputDir, '-o', self.outputDir, '-f', '.xyz', '-r', '2', '-j', '1')
+        self.assertEqual(exitCode, 1)
+        summary = self.readSummary(batch.outputPathFor(brokenPath, self.outputDir, '.xyz'))
+        self.assertEqual(summary['status'], 'failed')
+        self.assertIn('Traceback', summary['error'])
+        for inputPath in self.inputPaths:
+            self.assertEqual(self.readSummary(batch.outputPathFor(inputPath, self.outputDir, '.xyz'))['status'], 'ok')
+        self.assertFalse(batch.isUpToDate(brokenPath, batch.outputPathFor(brokenPath, self.outputDir, '.xyz'),
+                                          2, stltovoxel.DEFAULT_ENGINE))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os.path
+import sys
+import unittest
+
+import numpy as np
+
+if not __package__:
+    # Run as a script: import the slicers through the stltovoxel package like stltovoxel.py does
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or '.') != packageDir]
+    sys.path.insert(0, os.path.dirname(packageDir))
+
+import stltovoxel.decimate as decimate
+import stltovoxel.fastslice as fastslice
+import stltovoxel.validate as validate
+from stltovoxel.testfastslice import makeBox, makeSphere
+
+
+def voxelise(triangles, scale, shift, boundingBox):
+    mesh = fastslice.scaleAndShiftMesh(triangles, scale, shift)
+    return np.array(list(fastslice.voxeliseLayers(mesh, boundingBox, verbose=False)))
+
+
+class TestDecimate(unittest.TestCase):
+    def test_cluster_vertices(self):
+        # The corners of the small triangle share a cell with a corner of the big ones, which
+        # collapses it, and the big ones become the same triangle. A cell's vertex is the mean
+        # of every corner in it
+        triangles = np.array([[[0.0, 0.0, 0.0], [4.0, 0.0, 0.0], [0.0, 4.0, 0.0]],
+                              [[0.1, 0.1, 0.0], [0.2, 0.1, 0.0], [0.1, 0.2, 0.0]],
+                              [[0.05, 0.0, 0.0], [4.0, 0.05, 0.0], [0.0, 4.0, 0.0]]])
+        vertices, faces = decimate.clusterVertices(triangles, 1.0)
+        self.assertEqual(faces.shape, (1, 3))
+        self.assertEqual(len(vertices), 3)
+        np.testing.assert_allclose(vertices[faces[0]], [[0.09, 0.08, 0.0], [4.0, 0.025, 0.0], [0.0, 4.0, 0.0]])
+
+        # Cells bigger than the mesh leave nothing
+        self.assertEqual(len(decimate.decimateMesh(makeBox((0, 0, 0), (1, 1, 1)), 8.0)), 0)
+        self.assertRaises(ValueError, decimate.decimateMesh, triangles, 1.0, 1)
+
+    def test_decimate_sphere(self):
+        sphere = makeSphere(5, 120).astype(np.float32)
+        scale, shift, boundingBox = fastslice.calculateScaleAndShift(sphere, 2)
+        voxels = voxelise(sphere, scale, shift, boundingBox)
+        for ratio in (2, 3, 4, 8):
+            decimated = decimate.decimateMesh(sphere, 1.0 / scale[0], ratio)
+            self.assertLess(len(decimated), len(sphere))
+
+            # The mesh stays closed and manifold, and fills almost exactly the same voxels
+            report = validate.checkMesh(decimated)
+            self.assertTrue(report['IsValid'], report)
+            self.assertAlmostEqual(report['Volume'], validate.checkMesh(sphere)['Volume'], delta=2.0)
+            changed = np.count_nonzero(voxelise(decimated, scale, shift, boundingBox) != voxels)
+            self.assertLess(changed, 0.005 * np.count_nonzero(voxels))
+
+
+if __name__ == '__main__':
+    unittest.main()
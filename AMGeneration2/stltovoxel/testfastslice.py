@@ -0,0 +1,118 @@
+import os.path
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+if not __package__:
+    # Run as a script: import the slicers through the stltovoxel package like stltovoxel.py does
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or '.') != packageDir]
+    sys.path.insert(0, os.path.dirname(packageDir))
+
+import stltovoxel.fastslice as fastslice
+import stltovoxel.stltovoxel as stltovoxel
+
+
+def makeBox(lo, hi):
+    # Closed box as an (12, 3, 3) triangle array
+    (x0, y0, z0), (x1, y1, z1) = lo, hi
+    corners = np.array([[x0, y0, z0], [x1, y0, z0], [x1, y1, z0], [x0, y1, z0],
+                        [x0, y0, z1], [x1, y0, z1], [x1, y1, z1], [x0, y1, z1]])
+    faces = [(0, 2, 1), (0, 3, 2), (4, 5, 6), (4, 6, 7), (0, 1, 5), (0, 5, 4),
+             (1, 2, 6), (1, 6, 5), (2, 3, 7), (2, 7, 6), (3, 0, 4), (3, 4, 7)]
+    return corners[np.array(faces)]
+
+
+def makeSphere(radius, count):
+    # Closed UV sphere, off centre so that its poles and rings don't all fall on voxel boundaries
+    def point(theta, phi):
+        return (radius * np.sin(theta) * np.cos(phi) + radius + 0.3,
+                radius * np.sin(theta) * np.sin(phi) + radius + 0.3,
+                radius * np.cos(theta) + radius + 0.3)
+    thetas = np.linspace(0, np.pi, count)
+    phis = np.linspace(0, 2 * np.pi, 2 * count)
+    triangles = []
+    for i in range(count - 1):
+        for j in range(2 * count - 1):
+            a = point(thetas[i], phis[j])
+            b = point(thetas[i + 1], phis[j])
+            c = point(thetas[i + 1], phis[j + 1])
+            d = point(thetas[i], phis[j + 1])
+            if i > 0:
+                triangles.append((a, b, d))
+            if i < count - 2:
+                triangles.append((b, c, d))
+    return np.array(triangles)
+
+
+def writeBinaryStl(path, triangles):
+    records = np.zeros(len(triangles), dtype=[('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attr', '<u2')])
+    records['vertices'] = triangles
+    with open(path, 'wb') as output:
+        output.write(b'\0' * 80)
+        output.write(struct.pack('<I', len(triangles)))
+        output.write(records.tobytes())
+
+
+def writeAsciiStl(path, triangles):
+    with open(path, 'w') as output:
+        output.write('solid test\n')
+        for triangle in triangles:
+            output.write('facet normal 0 0 0\nouter loop\n')
+            for vertex in triangle:
+                output.write('vertex %r %r %r\n' % tuple(float(v) for v in vertex))
+            output.write('endloop\nendfacet\n')
+        output.write('endsolid test\n')
+
+
+class TestFastSlice(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSameVoxels(self, triangles, resolution, ascii=False, decimation=None):
+        # Both engines export exactly the same voxels for the mesh
+        inputPath = os.path.join(self.directory, 'part.stl')
+        (writeAsciiStl if ascii else writeBinaryStl)(inputPath, triangles)
+        outputs = {}
+        for engine in stltovoxel.ENGINES:
+            outputPath = os.path.join(self.directory, engine + '.xyzb')
+            stltovoxel.doExport(inputPath, outputPath, resolution, engine, verbose=False, decimation=decimation)
+            outputs[engine] = stltovoxel.readXyzBinary(outputPath)
+        points, size = outputs['python']
+        self.assertGreater(len(points), 0)
+        self.assertEqual(outputs['numpy'][1], size)
+        np.testing.assert_array_equal(outputs['numpy'][0], points)
+
+    def test_box(self):
+        # Corners and faces lying exactly on the slicing planes
+        box = makeBox((0.2, 0.2, 0.2), (10.2, 6.2, 4.2))
+        self.assertSameVoxels(box, 1)
+        self.assertSameVoxels(box, 2)
+
+    def test_sphere(self):
+        sphere = makeSphere(5, 40)
+        self.assertSameVoxels(sphere, 2)
+        self.assertSameVoxels(sphere, 3.7)
+
+    def test_ascii_stl(self):
+        self.assertSameVoxels(makeSphere(5, 30), 2, ascii=True)
+
+    def test_decimated(self):
+        self.assertSameVoxels(makeSphere(5, 60), 2, decimation=4)
+
+    def test_segments(self):
+        # Triangle with one corner on the plane and one either side of it, as slice.py orders the ends
+        triangles = np.array([[[0.0, 0.0, 1.0], [2.0, 0.0, 0.0], [0.0, 2.0, 2.0]]])
+        np.testing.assert_array_equal(fastslice.toIntersectingSegments(triangles, 1.0), [[[1.0, 1.0], [0.0, 0.0]]])
+        self.assertEqual(len(fastslice.toIntersectingSegments(triangles, 3.0)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
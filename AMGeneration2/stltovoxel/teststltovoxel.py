@@ -0,0 +1,111 @@
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from zipfile import ZipFile
+
+import numpy as np
+from PIL import Image
+
+if not __package__:
+    # Run as a script: import the slicers through the stltovoxel package like stltovoxel.py does
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or '.') != packageDir]
+    sys.path.insert(0, os.path.dirname(packageDir))
+
+import stltovoxel.fastslice as fastslice
+import stltovoxel.stl_reader as stl_reader
+import stltovoxel.stltovoxel as stltovoxel
+from stltovoxel.testfastslice import makeSphere, writeBinaryStl
+from stltovoxel.util import padVoxelArray, padVoxelLayers
+
+
+def sliceVolume(inputPath, resolution):
+    # The padded vol[z][x][y] array of an STL file, built in memory the way the exporters used to get it
+    mesh = stl_reader.read_stl_array(inputPath)
+    scale, shift, boundingBox = fastslice.calculateScaleAndShift(mesh, resolution)
+    mesh = fastslice.scaleAndShiftMesh(mesh, scale, shift)
+    layers = np.array(list(fastslice.voxeliseLayers(mesh, boundingBox, verbose=False)))
+    return padVoxelArray(layers)[0], scale, shift
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.inputPath = os.path.join(self.directory, 'part.stl')
+        writeBinaryStl(self.inputPath, makeSphere(5, 30))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_pad_layers(self):
+        layers = np.random.RandomState(0).rand(4, 5, 6) > 0.5
+        padded = padVoxelLayers(iter(layers), (5, 6, 4))
+        np.testing.assert_array_equal(np.array(list(padded)), padVoxelArray(layers)[0])
+
+    def test_png(self):
+        volume = sliceVolume(self.inputPath, 2)[0]
+        stltovoxel.doExport(self.inputPath, os.path.join(self.directory, 'part.png'), 2, 'numpy', verbose=False)
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.png'))
+        self.assertEqual(len(names), len(volume))
+        self.assertEqual(names[0], 'part000.png')
+        for name, layer in zip(names, volume):
+            image = np.array(Image.open(os.path.join(self.directory, name)))
+            np.testing.assert_array_equal(image, layer.T.astype(np.uint8) * 255)
+
+    def test_svx(self):
+        volume, scale, shift = sliceVolume(self.inputPath, 2)
+        outputPath = os.path.join(self.directory, 'part.svx')
+        stltovoxel.doExport(self.inputPath, outputPath, 2, 'numpy', verbose=False)
+        with ZipFile(outputPath) as zipFile:
+            manifest = ET.fromstring(zipFile.read('manifest.xml'))
+            self.assertEqual([int(manifest.get('gridSize' + axis)) for axis in 'XYZ'],
+                             [volume.shape[1], volume.shape[0], volume.shape[2]])
+            self.assertAlmostEqual(float(manifest.get('voxelSize')), 0.0005)
+            np.testing.assert_allclose([float(manifest.get('origin' + axis)) for axis in 'XYZ'],
+                                       [-shift[0], -shift[2], -shift[1]], rtol=1e-6)
+            slices = sorted(name for name in zipFile.namelist() if name.startswith('density/'))
+            self.assertEqual(len(slices), len(volume))
+            for name, layer in zip(slices, volume):
+                with zipFile.open(name) as image:
+                    np.testing.assert_array_equal(np.array(Image.open(image)), layer.T.astype(np.uint8) * 255)
+
+    def test_xyz(self):
+        volume = sliceVolume(self.inputPath, 2)[0]
+        outputPath = os.path.join(self.directory, 'part.xyz')
+        stltovoxel.doExport(self.inputPath, outputPath, 2, 'numpy', verbose=False)
+        # The same lines as the nested loops over z, x and y that used to write the file
+        expected = ''
+        for z in range(volume.shape[0]):
+            for x in range(volume.shape[1]):
+                for y in range(volume.shape[2]):
+                    if volume[z][x][y]:
+                        expected += '%d %d %d\n' % (x, y, z)
+        with open(outputPath) as output:
+            self.assertEqual(output.read(), expected)
+
+    def test_xyz_binary(self):
+        volume = sliceVolume(self.inputPath, 2)[0]
+        outputPath = os.path.join(self.directory, 'part.xyzb')
+        stltovoxel.doExport(self.inputPath, outputPath, 2, 'numpy', verbose=False)
+        points, size = stltovoxel.readXyzBinary(outputPath)
+        self.assertEqual(size, (volume.shape[1], volume.shape[2], volume.shape[0]))
+        self.assertEqual(points.dtype, np.int16)
+        np.testing.assert_array_equal(points, np.argwhere(volume)[:, [1, 2, 0]])
+
+        # Grids too big for 16 bit coordinates are written with 32 bit ones
+        layer = np.zeros((40000, 2), dtype=bool)
+        layer[39999, 1] = True
+        stltovoxel.exportXyzBinary(iter([layer, layer]), (40000, 2, 2), outputPath)
+        points, size = stltovoxel.readXyzBinary(outputPath)
+        self.assertEqual(size, (40000, 2, 2))
+        self.assertEqual(points.dtype, np.int32)
+        np.testing.assert_array_equal(points, [[39999, 1, 0], [39999, 1, 1]])
+
+        self.assertRaises(ValueError, stltovoxel.readXyzBinary, self.inputPath)
+
+
+if __name__ == '__main__':
+    unittest.main()
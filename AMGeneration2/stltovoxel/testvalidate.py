@@ -0,0 +1,91 @@
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+if not __package__:
+    # Run as a script: import the slicers through the stltovoxel package like stltovoxel.py does
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or '.') != packageDir]
+    sys.path.insert(0, os.path.dirname(packageDir))
+
+import stltovoxel.validate as validate
+from stltovoxel.testfastslice import makeBox, makeSphere, writeAsciiStl, writeBinaryStl
+
+
+class TestValidate(unittest.TestCase):
+    def assertReport(self, triangles, **expected):
+        # Counts that differ from those of a valid mesh
+        report = validate.checkMesh(triangles)
+        counts = {'DegenerateCount': 0, 'BoundaryEdges': 0, 'NonManifoldEdges': 0, 'FlippedEdges': 0}
+        counts.update(expected)
+        self.assertEqual({key: report[key] for key in counts}, counts)
+        self.assertEqual(report['TriangleCount'], len(triangles))
+        return report
+
+    def test_weld_vertices(self):
+        triangles = np.array([[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+                              [[1.0, 0.0, 0.0], [0.0, 1.0, 1e-9], [1.0, 1.0, 0.0]]], dtype=np.float32)
+        ids = validate.weldVertices(triangles)
+        self.assertEqual(ids.shape, (2, 3))
+        self.assertEqual(len(np.unique(ids)), 4)
+        self.assertEqual((ids[0, 1], ids[0, 2]), (ids[1, 0], ids[1, 1]))
+        self.assertEqual(validate.weldVertices(np.empty((0, 3, 3))).shape, (0, 3))
+
+        # Distinct vertices stay apart even when they are close together
+        triangles[1, 1, 2] = 1e-3
+        self.assertEqual(len(np.unique(validate.weldVertices(triangles))), 5)
+
+    def test_valid(self):
+        box = makeBox((0, 0, 0), (3, 2, 1))
+        report = self.assertReport(box)
+        self.assertTrue(report['IsValid'])
+        self.assertAlmostEqual(report['Volume'], 6.0)
+        report = self.assertReport(makeSphere(5, 40).astype(np.float32))
+        self.assertTrue(report['IsValid'])
+        self.assertAlmostEqual(report['Volume'], 4.0 / 3.0 * np.pi * 125, delta=5.0)
+
+        # Two separate closed parts are still valid
+        self.assertTrue(self.assertReport(np.concatenate((box, makeBox((5, 0, 0), (6, 1, 1)))))['IsValid'])
+
+    def test_problems(self):
+        box = makeBox((0, 0, 0), (3, 2, 1))
+        self.assertFalse(self.assertReport(box[1:], BoundaryEdges=3)['IsValid'])
+        flipped = box.copy()
+        flipped[0] = flipped[0, ::-1]
+        self.assertFalse(self.assertReport(flipped, BoundaryEdges=0, FlippedEdges=3)['IsValid'])
+        self.assertFalse(self.assertReport(np.concatenate((box, box[:1])), NonManifoldEdges=3)['IsValid'])
+        report = self.assertReport(box[:, ::-1])
+        self.assertAlmostEqual(report['Volume'], -6.0)
+        self.assertFalse(report['IsValid'])
+
+        # Degenerate triangles are counted, but don't count as open edges
+        degenerate = np.array([[[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [1.0, 0.0, 0.0]]])
+        self.assertTrue(self.assertReport(np.concatenate((box, degenerate)), DegenerateCount=1)['IsValid'])
+
+        self.assertEqual(validate.describeProblems(validate.checkMesh(box)), '')
+        self.assertEqual(validate.describeProblems(validate.checkMesh(box[1:])), '3 open edges')
+        self.assertEqual(validate.describeProblems(validate.checkMesh(flipped)),
+                         '3 edges between triangles with flipped normals')
+        self.assertEqual(validate.describeProblems(validate.checkMesh(box[:, ::-1])), 'normals pointing inwards')
+
+    def test_check_stl(self):
+        directory = tempfile.mkdtemp()
+        try:
+            # Shared corners written with the same digits every time, as exporters do
+            sphere = makeSphere(3, 20).astype(np.float32)
+            binaryPath = os.path.join(directory, 'binary.stl')
+            asciiPath = os.path.join(directory, 'ascii.stl')
+            writeBinaryStl(binaryPath, sphere)
+            writeAsciiStl(asciiPath, sphere[1:])
+            self.assertTrue(validate.checkStl(binaryPath)['IsValid'])
+            self.assertEqual(validate.checkStl(asciiPath)['BoundaryEdges'], 3)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
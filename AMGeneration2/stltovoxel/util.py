@@ -39,3 +39,14 @@ def padVoxelArray(voxels):
             for c in range(shape[2]):
                 vol[a+1,b+1,c+1] = voxels[a,b,c]
     return vol, (new_shape[1],new_shape[2],new_shape[0])
+
+def padVoxelLayers(layers, bounding_box):
+    # Streaming counterpart of padVoxelArray: yields each layer with a one voxel
+    # border, plus an empty layer below and above, without building the volume
+    shape = (bounding_box[0]+2, bounding_box[1]+2)
+    yield np.zeros(shape, dtype=bool)
+    for layer in layers:
+        padded = np.zeros(shape, dtype=bool)
+        padded[1:-1, 1:-1] = layer
+        yield padded
+    yield np.zeros(shape, dtype=bool)
@@ -0,0 +1,125 @@
+import numpy as np
+
+import stltovoxel.stl_reader as stl_reader
+
+# Watertight and manifold checks for triangle soups. The parity fill in
+# perimeter.linesToVoxels only works on closed, consistently wound meshes, and
+# an open edge silently turns whole layers into garbage. These checks count
+# how often every edge is used with a single sort of packed edge keys, so they
+# cost far less than the voxelisation they protect.
+
+
+# Vertices are welded on a cubic grid of 2**21 cells along each side of the mesh's
+# extent, so the three cell indices pack into a single int64 key
+WELD_BITS = 21
+
+
+def weldVertices(triangles):
+    '''
+    :param triangles: (N, 3, 3) triangle array
+    :return: (N, 3) array of vertex ids, equal ids for vertices in the same weld cell
+
+    Identical coordinates always land in the same cell. Distinct vertices only share
+    a cell when they are within about a two millionth of the mesh size of each other,
+    far below anything the voxeliser can resolve.
+    '''
+    points = triangles.reshape(-1, 3)
+    if len(points) == 0:
+        return np.empty((0, 3), dtype=np.int32)
+    # One extent for all three axes, since reducing over the flat array is much
+    # cheaper than per axis. The -2 leaves room for rounding in float32 meshes
+    low = points.min()
+    extent = float(points.max() - low)
+    scale = ((1 << WELD_BITS) - 2) / (extent if extent > 0 else 1.0)
+    cells = points - float(low)
+    cells *= scale
+    keys = cells.astype(np.int64) @ np.array([1 << (2 * WELD_BITS), 1 << WELD_BITS, 1])
+
+    # A single argsort of packed integers is far faster than np.unique(axis=0) on rows
+    # of floats, and ranking the sorted keys directly saves np.unique's extra passes
+    order = np.argsort(keys)
+    sortedKeys = keys[order]
+    ranks = np.empty(len(keys), dtype=np.int32)
+    ranks[0] = 0
+    np.not_equal(sortedKeys[1:], sortedKeys[:-1], out=ranks[1:])
+    ids = np.empty(len(keys), dtype=np.int32)
+    ids[order] = np.cumsum(ranks, out=ranks)
+    return ids.reshape(-1, 3)
+
+
+def checkMesh(triangles):
+    '''
+    :param triangles: (N, 3, 3) triangle array
+    :return: Dictionary with the triangle count, the number of degenerate triangles,
+             boundary edges (used once), non-manifold edges (used more than twice),
+             flipped edges (shared by two triangles with the same winding, so one of
+             their normals points the wrong way), the signed volume (negative when the
+             normals point inwards) and an overall IsValid flag
+    '''
+    triangles = np.asarray(triangles).reshape(-1, 3, 3)
+    faces = weldVertices(triangles)
+    a, b, c = faces[:, 0], faces[:, 1], faces[:, 2]
+    degenerate = (a == b) | (b == c) | (c == a)
+    if degenerate.any():
+        faces = faces[~degenerate]
+
+    # Every triangle walks its edges as a->b, b->c and c->a. Each edge gets one key
+    # for its pair of vertices with the direction it is walked in as the lowest bit
+    starts = faces.reshape(-1)
+    ends = faces[:, [1, 2, 0]].reshape(-1)
+    keys = np.minimum(starts, ends).astype(np.int64)
+    keys *= int(faces.max()) + 1 if len(faces) else 1
+    keys += np.maximum(starts, ends)
+    keys <<= 1
+    keys |= starts < ends
+    keys.sort()
+
+    # Sorting puts all uses of an edge next to each other, whichever way they are
+    # walked, so runs of keys that only differ in the lowest bit are single edges
+    runStarts = np.flatnonzero((keys[1:] ^ keys[:-1]) > 1) + 1
+    runStarts = np.concatenate(([0], runStarts)) if len(keys) else runStarts
+    uses = np.diff(np.append(runStarts, len(keys)))
+
+    # A properly shared edge is walked once in each direction. One walked twice the
+    # same way sits between two triangles with opposite normals
+    twice = runStarts[uses == 2]
+    boundaryEdges = int(np.count_nonzero(uses == 1))
+    flippedEdges = int(np.count_nonzero(keys[twice] == keys[twice + 1]))
+    nonManifoldEdges = int(np.count_nonzero(uses > 2))
+
+    # Divergence theorem, summed in double precision over the per triangle terms.
+    # Degenerate triangles add next to nothing, so they are not filtered out here
+    (x0, y0, z0), (x1, y1, z1), (x2, y2, z2) = triangles[:, 0].T, triangles[:, 1].T, triangles[:, 2].T
+    volume = (x0 * (y1 * z2 - z1 * y2) + y0 * (z1 * x2 - x1 * z2) + z0 * (x1 * y2 - y1 * x2)).sum(dtype=np.float64) / 6.0
+
+    return {
+        "TriangleCount": len(triangles),
+        "DegenerateCount": int(np.count_nonzero(degenerate)),
+        "BoundaryEdges": boundaryEdges,
+        "NonManifoldEdges": nonManifoldEdges,
+        "FlippedEdges": flippedEdges,
+        "Volume": float(volume),
+        "IsValid": bool(boundaryEdges == 0 and nonManifoldEdges == 0 and flippedEdges == 0 and volume > 0)
+    }
+
+
+def checkStl(fname):
+    '''
+    :param fname: Path to a binary or ASCII .stl file
+    :return: Dictionary of mesh checks, see checkMesh
+    '''
+    return checkMesh(stl_reader.read_stl_array(fname))
+
+
+def describeProblems(report):
+    # Short human readable summary of what checkMesh found wrong
+    problems = []
+    if report["BoundaryEdges"]:
+        problems.append("%d open edges" % report["BoundaryEdges"])
+    if report["NonManifoldEdges"]:
+        problems.append("%d non-manifold edges" % report["NonManifoldEdges"])
+    if report["FlippedEdges"]:
+        problems.append("%d edges between triangles with flipped normals" % report["FlippedEdges"])
+    if report["Volume"] <= 0:
+        problems.append("normals pointing inwards")
+    return ", ".join(problems)
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import FEAMetrics
+import FRDParser
+from testfrdparser import makeModel, writeFrd
+from testfrdstats import exactQuantile
+
+
+def writeMetricsFrd(path, fmt=3, scale=1.0):
+    # The generated model, with its EXTRA blocks saved as the ERROR blocks of an analysis
+    # and every result scaled so that generations can be told apart
+    writeFrd(path, fmt)
+    parser = FRDParser.FRDParser(path)
+    for block in parser.frd.result_blocks:
+        if block.name == 'EXTRA':
+            block.name = 'ERROR'
+        block.values = block.values * np.float32(scale)
+    parser.save()
+
+
+class FEAMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.paths = []
+        for generation in range(3):
+            path = os.path.join(self.tempDir, 'Gen%d.frd' % generation)
+            writeMetricsFrd(path, scale=generation + 1.0)
+            self.paths.append(path)
+        self.cachePaths = [os.path.join(self.tempDir, 'Gen%d.json' % generation) for generation in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def calculateCounted(self, paths, cachePaths=None, workers=1):
+        # Metrics of the paths, and how many of the files were parsed for them
+        with mock.patch.object(FEAMetrics, 'calculateFEAMetric', wraps=FEAMetrics.calculateFEAMetric) as calculate:
+            results = FEAMetrics.calculateFEAMetrics(paths, workers=workers, cachePaths=cachePaths)
+        return results, calculate.call_count
+
+    def test_metric(self):
+        numbers, coords, elems, results = makeModel()
+        result = FEAMetrics.calculateFEAMetric(self.paths[1])
+        stresses = 2.0 * results['STRESS', 1].astype(np.float32).astype(np.float64)
+        disp = 2.0 * results['DISP', 1].astype(np.float32).astype(np.float64)
+        resultantStress = np.linalg.norm(stresses[:, :3], axis=1)
+        self.assertEqual((result['NodeCount'], result['ElemCount']), (27, 8))
+        self.assertAlmostEqual(result['MaxStress'], resultantStress.max(), places=3)
+        self.assertAlmostEqual(result['MeanStress'], resultantStress.mean(), places=3)
+        self.assertAlmostEqual(result['MaxDisp'], np.linalg.norm(disp, axis=1).max(), places=3)
+
+        stressBlock = FRDParser.FRDParser(self.paths[1]).frd.result_blocks[1]
+        vonMises = stressBlock.derived('MISES')
+        self.assertAlmostEqual(result['MaxVonMises'], vonMises.max(), places=3)
+        self.assertAlmostEqual(result['MeanVonMises'], vonMises.mean(), places=3)
+        self.assertAlmostEqual(result['MaxTresca'], stressBlock.derived('TRESCA').max(), places=3)
+        self.assertAlmostEqual(result['MinPrincipal'], stressBlock.derived('PS3').min(), places=3)
+        self.assertAlmostEqual(result['P95VonMises'], exactQuantile(vonMises, 0.95), delta=0.001 * vonMises.max() + 0.001)
+        self.assertTrue(all(isinstance(value, (int, float)) for value in result.values()))
+
+        # Missing files and files without the needed results fail without raising
+        self.assertEqual(set(FEAMetrics.calculateFEAMetric(os.path.join(self.tempDir, 'none.frd')).values()), {None})
+        writeFrd(self.paths[2], 3)
+        self.assertEqual(set(FEAMetrics.calculateFEAMetric(self.paths[2]).values()), {None})
+
+    def test_save_and_load(self):
+        results = FEAMetrics.calculateFEAMetrics(self.paths + [os.path.join(self.tempDir, 'none.frd')], workers=1)
+        filePath = os.path.join(self.tempDir, 'FEAMetrics.npz')
+        FEAMetrics.saveFEAMetrics(filePath, results)
+        headings, metrics = FEAMetrics.loadFEAMetrics(filePath)
+        self.assertEqual(headings, [heading for heading, key in FEAMetrics.FEAMetricColumns])
+        self.assertEqual(metrics.shape, (4, len(FEAMetrics.FEAMetricColumns)))
+        self.assertEqual(metrics.dtype, np.float64)
+        np.testing.assert_array_equal(metrics[:3], [[result[key] for heading, key in FEAMetrics.FEAMetricColumns]
+                                                    for result in results[:3]])
+        self.assertTrue(np.isnan(metrics[3]).all())
+        with np.load(filePath, allow_pickle=False) as data:
+            self.assertEqual(int(data['metricVersion']), FEAMetrics.METRIC_VERSION)
+
+    def test_cache(self):
+        results, calculated = self.calculateCounted(self.paths, self.cachePaths)
+        self.assertEqual(calculated, 3)
+        self.assertTrue(all(os.path.isfile(cachePath) for cachePath in self.cachePaths))
+        self.assertEqual(self.calculateCounted(self.paths, self.cachePaths), (results, 0))
+
+        # A touched file is parsed again once, and its new record gets a hash
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(self.calculateCounted(self.paths, self.cachePaths), (results, 1))
+        with open(self.cachePaths[0]) as f:
+            self.assertIn('hash', json.load(f)['frd'])
+
+        # After that the hash shows it wasn't changed by touching it again
+        os.utime(self.paths[0], (stat.st_atime, stat.st_mtime + 20))
+        self.assertEqual(self.calculateCounted(self.paths, self.cachePaths), (results, 0))
+        with open(self.cachePaths[0]) as f:
+            self.assertEqual(json.load(f)['frd']['mtime'], stat.st_mtime + 20)
+
+        # Analysing a generation again, or new metric definitions, invalidate its cache
+        writeMetricsFrd(self.paths[1], scale=5.0)
+        os.utime(self.paths[1], (stat.st_atime, stat.st_mtime + 30))
+        newResults, calculated = self.calculateCounted(self.paths, self.cachePaths)
+        self.assertEqual(calculated, 1)
+        self.assertEqual(newResults[1], FEAMetrics.calculateFEAMetric(self.paths[1]))
+        self.assertNotEqual(newResults[1], results[1])
+        with mock.patch.object(FEAMetrics, 'METRIC_VERSION', FEAMetrics.METRIC_VERSION + 1):
+            self.assertEqual(self.calculateCounted(self.paths, self.cachePaths)[1], 3)
+
+        # Files that don't exist aren't cached
+        missingPath = os.path.join(self.tempDir, 'none.frd')
+        missingCache = os.path.join(self.tempDir, 'none.json')
+        self.calculateCounted([missingPath], [missingCache])
+        self.assertFalse(os.path.exists(missingCache))
+
+    def test_pool(self):
+        expected = [FEAMetrics.calculateFEAMetric(path) for path in self.paths]
+        progress = []
+        results = FEAMetrics.calculateFEAMetrics(self.paths, workers=2, cachePaths=self.cachePaths,
+                                                 progress=lambda *args: progress.append(args))
+        self.assertEqual(results, expected)
+        self.assertEqual(sorted(done for done, total, filePath, result in progress), [1, 2, 3])
+        self.assertEqual(sorted(filePath for done, total, filePath, result in progress), self.paths)
+        self.assertTrue(all(os.path.isfile(cachePath) for cachePath in self.cachePaths))
+
+        # Without an interpreter for the workers, or when the pool fails, the files are done in this process
+        with mock.patch.object(FEAMetrics, 'pythonExecutable', return_value=None), \
+                mock.patch.object(FEAMetrics, 'ProcessPoolExecutor') as executor:
+            self.assertEqual(self.calculateCounted(self.paths, workers=2), (expected, 3))
+            executor.assert_not_called()
+        with mock.patch.object(FEAMetrics, 'ProcessPoolExecutor', side_effect=OSError('no processes')):
+            self.assertEqual(self.calculateCounted(self.paths, workers=2), (expected, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
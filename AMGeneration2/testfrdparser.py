@@ -0,0 +1,452 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import FRDParser
+
+
+# Components of the generated result blocks: (name, entities), an entity being
+# (name, ictype, icind1, icind2). DISP has the extra ALL entity written by ccx,
+# and EXTRA has more than 6 components, so its nodes need -2 continuation lines
+RESULTS = [('DISP', [('D1', 2, 1, 0), ('D2', 2, 2, 0), ('D3', 2, 3, 0), ('ALL', 2, 0, 0)]),
+           ('STRESS', [('SXX', 4, 1, 1), ('SYY', 4, 2, 2), ('SZZ', 4, 3, 3),
+                       ('SXY', 4, 1, 2), ('SYZ', 4, 2, 3), ('SZX', 4, 3, 1)]),
+           ('EXTRA', [('E%d' % i, 1, 0, 0) for i in range(8)])]
+STEPS = [1, 2]
+
+
+def makeModel(mixed=False):
+    # 3x3x3 nodes with gaps in their numbering and 8 elements, either all he8 or
+    # alternating he8/tet4, with result values for every block and step
+    xs = np.linspace(0.0, 2.0, 3)
+    coords = np.stack(np.meshgrid(xs, xs, xs, indexing='ij'), -1).reshape(-1, 3)
+    numbers = 10 + 3 * np.arange(len(coords))
+    grid = numbers.reshape(3, 3, 3)
+    elems = []
+    for i in range(2):
+        for j in range(2):
+            for k in range(2):
+                hexNodes = [grid[i, j, k], grid[i + 1, j, k], grid[i + 1, j + 1, k], grid[i, j + 1, k],
+                            grid[i, j, k + 1], grid[i + 1, j, k + 1], grid[i + 1, j + 1, k + 1], grid[i, j + 1, k + 1]]
+                if mixed and len(elems) % 2:
+                    elems.append((3, [hexNodes[0], hexNodes[1], hexNodes[3], hexNodes[4]]))
+                else:
+                    elems.append((1, hexNodes))
+    results = {}
+    for step in STEPS:
+        x, y, z = coords.T
+        results['DISP', step] = np.stack([0.01 * x * step, -0.02 * y, 0.005 * x * z], 1)
+        results['STRESS', step] = np.stack([x * y + step, y - z, z * x - 3, 0.5 * x, -y, 2 * z], 1)
+        results['EXTRA', step] = np.stack([x + i * y - step * z for i in range(8)], 1)
+    return numbers, coords, elems, results
+
+
+def writeFrd(path, fmt, mixed=False):
+    # Writes the model the way ccx does, in format 0/1 (ASCII short/long) or 2/3 (binary)
+    numbers, coords, elems, results = makeModel(mixed)
+    numFormat = '%5d' if fmt == 0 else '%10d'
+    with open(path, 'wb') as out:
+        write = lambda text: out.write(text.encode())
+        write('    1C' + 'test'.ljust(66) + '\n')
+        write('    1UDATE              19.october.2026\n')
+        write('    2C' + ' ' * 18 + '%12d' % len(numbers) + ' ' * 37 + '%d\n' % fmt)
+        for number, pos in zip(numbers, coords):
+            if fmt < 2:
+                write(' -1' + numFormat % number + '%12.5E%12.5E%12.5E\n' % tuple(pos))
+            else:
+                out.write(struct.pack('<i' + ('fff' if fmt == 2 else 'ddd'), number, *pos))
+        if fmt < 2:
+            write(' -3\n')
+        write('    3C' + ' ' * 18 + '%12d' % len(elems) + ' ' * 37 + '%d\n' % min(fmt, 2))
+        for elemNumber, (elemType, nodes) in enumerate(elems, 1):
+            if fmt < 2:
+                write(' -1' + numFormat % elemNumber + '%5d%5d%5d\n' % (elemType, 0, 1))
+                perLine = 5 * (3 - fmt)
+                for start in range(0, len(nodes), perLine):
+                    write(' -2' + ''.join(numFormat % node for node in nodes[start:start + perLine]) + '\n')
+            else:
+                out.write(struct.pack('<iiii', elemNumber, elemType, 0, 1))
+                out.write(struct.pack('<' + 'i' * len(nodes), *nodes))
+        if fmt < 2:
+            write(' -3\n')
+        for step in STEPS:
+            for name, entities in RESULTS:
+                values = results[name, step]
+                write('    1PSTEP%25d\n' % step)
+                write('  100CL     %12.5E%12d%s%2d%5d%s%2d\n' % (step, len(numbers), ' ' * 20, 0, step, ' ' * 10,
+                                                             min(fmt, 2)))
+                write(' -4  %s%5d%5d\n' % (name.ljust(8), len(entities), 1))
+                for i, (entity, ictype, icind1, icind2) in enumerate(entities):
+                    line = ' -5  %s%5d%5d%5d' % (entity.ljust(8), 1, ictype, icind1)
+                    if ictype == 4:
+                        line += '%5d' % icind2
+                    elif ictype == 2 and i == 3:
+                        line += '%5d%5dALL' % (icind2, 1)
+                    else:
+                        line += '%5d' % 0
+                    write(line + '\n')
+                for number, row in zip(numbers, values):
+                    if fmt < 2:
+                        for start in range(0, values.shape[1], 6):
+                            head = ' -1' + numFormat % number if start == 0 else ' -2' + ' ' * len(numFormat % 0)
+                            write(head + ''.join('%12.5E' % value for value in row[start:start + 6]) + '\n')
+                    else:
+                        out.write(struct.pack('<i' + 'f' * values.shape[1], number, *row))
+                if fmt < 2:
+                    write(' -3\n')
+        write(' 9999\n')
+
+
+def asciiRounded(values):
+    # Values as they come back from an ASCII file, with 6 significant digits
+    return np.vectorize(lambda value: float('%12.5E' % value))(values)
+
+
+def blockArrays(frd):
+    # Everything parsed from an FRDFile, as a flat list of arrays and values to compare
+    arrays = [frd.node_block.numbers, frd.node_block.coords,
+              frd.elem_block.numbers, frd.elem_block.types, frd.elem_block.groups, frd.elem_block.materials]
+    arrays += [frd.elem_block.elem_nodes(row) for row in range(frd.elem_block.numelem)]
+    for block in frd.result_blocks:
+        arrays += [block.name, block.numstep, block.ncomps, [entity.name for entity in block.entities],
+                   block.numbers, block.values]
+    return arrays
+
+
+class FRDParserTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tempDir = tempfile.mkdtemp()
+        cls.paths = {}
+        for fmt in range(4):
+            for mixed in (False, True):
+                path = os.path.join(cls.tempDir, 'test%d%s.frd' % (fmt, 'mixed' if mixed else ''))
+                writeFrd(path, fmt, mixed)
+                cls.paths[fmt, mixed] = path
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempDir)
+
+    def assertSameArrays(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for expectedArray, actualArray in zip(expected, actual):
+            np.testing.assert_array_equal(expectedArray, actualArray)
+
+    def test_parse(self):
+        for (fmt, mixed), path in self.paths.items():
+            numbers, coords, elems, results = makeModel(mixed)
+            frd = FRDParser.FRDFile(path)
+            self.assertTrue(frd.complete)
+            np.testing.assert_array_equal(frd.node_block.numbers, numbers)
+            expectedCoords = asciiRounded(coords) if fmt < 2 else coords.astype(np.float32 if fmt == 2 else np.float64)
+            np.testing.assert_array_equal(frd.node_block.coords, expectedCoords)
+            np.testing.assert_array_equal(frd.elem_block.types, [elemType for elemType, nodes in elems])
+            for row, (elemType, nodes) in enumerate(elems):
+                np.testing.assert_array_equal(frd.elem_block.elem_nodes(row), nodes)
+            self.assertEqual([(block.name, block.numstep) for block in frd.result_blocks],
+                             [(name, step) for step in STEPS for name, entities in RESULTS])
+            for block in frd.result_blocks:
+                values = results[block.name, block.numstep]
+                self.assertEqual(block.ncomps, values.shape[1])
+                np.testing.assert_array_equal(block.numbers, numbers)
+                expectedValues = asciiRounded(values) if fmt < 2 else values
+                np.testing.assert_array_equal(block.values, expectedValues.astype(np.float32))
+
+    def test_parse_matches_field_by_field(self):
+        # Without fixed-width records the blocks are read field by field, the way
+        # the parser always used to, which has to give exactly the same arrays
+        for (fmt, mixed), path in self.paths.items():
+            bulk = blockArrays(FRDParser.FRDFile(path))
+            with mock.patch.object(FRDParser, '_read_records', return_value=None):
+                fieldByField = blockArrays(FRDParser.FRDFile(path))
+            self.assertSameArrays(bulk, fieldByField)
+
+    def test_lazy_and_mmap(self):
+        for (fmt, mixed), path in self.paths.items():
+            eager = blockArrays(FRDParser.FRDFile(path))
+            for options in ({'lazy': True}, {'use_mmap': True}):
+                parser = FRDParser.FRDParser(path, **options)
+                self.assertTrue(parser.frd.complete)
+                self.assertSameArrays(eager, blockArrays(parser.frd))
+                np.testing.assert_array_equal(parser.get_results_node(22, names=['STRESS'], steps=[2])[0],
+                                              FRDParser.FRDParser(path).get_results_node(22, names=['STRESS'],
+                                                                                         steps=[2])[0])
+
+    def test_save_mmapped_over_itself(self):
+        for (fmt, mixed), path in self.paths.items():
+            copyPath = os.path.join(self.tempDir, 'copy.frd')
+            expectedPath = os.path.join(self.tempDir, 'expected.frd')
+            shutil.copyfile(path, copyPath)
+            eager = FRDParser.FRDParser(copyPath)
+            eager.save(expectedPath, as_copy=True)
+
+            # The mapped arrays have to be read before the file is truncated
+            parser = FRDParser.FRDParser(copyPath, use_mmap=True)
+            parser.save()
+            with open(expectedPath, 'rb') as expected, open(copyPath, 'rb') as actual:
+                self.assertEqual(expected.read(), actual.read())
+            self.assertSameArrays(blockArrays(eager.frd), blockArrays(parser.frd))
+            np.testing.assert_array_equal(parser.get_results_pos((0.5, 1.0, 1.5), names=['DISP'])[0],
+                                          eager.get_results_pos((0.5, 1.0, 1.5), names=['DISP'])[0])
+
+    def test_node_grid(self):
+        # Nearest nodes agree with an argmin over all nodes, for clustered, flat and straight meshes
+        rng = np.random.RandomState(0)
+        clustered = np.concatenate([rng.normal(0.0, 0.01, (300, 3)), rng.uniform(-5.0, 5.0, (200, 3))])
+        flat = np.column_stack([rng.uniform(0.0, 1.0, (400, 2)), np.zeros(400)])
+        straight = np.column_stack([np.zeros(100), np.linspace(0.0, 10.0, 100), np.zeros(100)])
+        for coords in (clustered, flat, straight, np.repeat(clustered[:50], 2, axis=0)):
+            grid = FRDParser.FRDNodeGrid(coords)
+            points = np.concatenate([rng.uniform(-7.0, 12.0, (500, 3)), coords[::7]])
+            distances = np.square(points[:, None, :] - coords[None, :, :]).sum(axis=2)
+            np.testing.assert_array_equal(grid.nearest(points), np.argmin(distances, axis=1))
+        np.testing.assert_array_equal(FRDParser.FRDNodeGrid(np.empty((0, 3))).nearest([(0.0, 0.0, 0.0)]), [-1])
+
+    def test_interpolation(self):
+        # The trilinear shape functions of the he8 elements reproduce the DISP field exactly
+        parser = FRDParser.FRDParser(self.paths[3, False])
+        points = np.array([(0.5, 1.3, 0.2), (1.9, 0.1, 1.0), (1.0, 1.0, 1.0), (0.25, 1.75, 1.5)])
+        x, y, z = points.T
+        expected = np.stack([0.01 * x * 2, -0.02 * y, 0.005 * x * z], 1)
+        (disp,) = parser.get_results_points(points, names=['DISP'], steps=[2])
+        np.testing.assert_allclose(disp[:, :3], expected, rtol=1e-6, atol=1e-9)
+        for point, row in zip(points, disp):
+            np.testing.assert_array_equal(parser.get_results_pos(tuple(point), names=['DISP'], steps=[2])[0], row)
+
+        # Outside the mesh the results of the closest node are used
+        (stress,) = parser.get_results_points([(2.5, -1.0, 0.9)], names=['STRESS'], steps=[1])
+        np.testing.assert_array_equal(stress[0], parser.get_results_node(10 + 3 * 19, names=['STRESS'],
+                                                                         steps=[1])[0])
+
+    def test_interpolation_without_elements(self):
+        # Reducing the file removes the elements, so every point takes the results of its closest node
+        parser = FRDParser.FRDParser(self.paths[1, True])
+        keep = [10, 13, 40, 88]
+        parser.reduce_file_nodes(keep)
+        self.assertIsNone(parser.frd.elem_block)
+        nodeBlock = parser.frd.node_block
+        for number in keep:
+            pos = tuple(nodeBlock.coords[nodeBlock.index.rows([number])[0]])
+            self.assertEqual(parser.get_results_pos(pos, names=['STRESS'], steps=[1]),
+                             parser.get_results_node(number, names=['STRESS'], steps=[1]))
+        (disp,) = parser.get_results_points([(0.1, 0.0, 0.6), (2.0, 2.0, 1.9)], names=['DISP'], steps=[1])
+        np.testing.assert_array_equal(disp, [parser.get_results_node(13, names=['DISP'], steps=[1])[0],
+                                             parser.get_results_node(88, names=['DISP'], steps=[1])[0]])
+
+        parser = FRDParser.FRDParser(self.paths[1, True])
+        positions = [(0.0, 0.0, 0.0), (0.5, 0.5, 0.5)]
+        expected = parser.get_results_points(positions, names=['DISP'])
+        parser.reduce_file_xyz(positions, names=['DISP'])
+        self.assertIsNone(parser.frd.elem_block)
+        self.assertSameArrays(expected, parser.get_results_points(positions, names=['DISP']))
+        self.assertEqual(parser.get_results_pos((0.5, 0.5, 0.4), names=['DISP']), parser.get_results_node(2))
+
+    def test_derived_fields(self):
+        parser = FRDParser.FRDParser(self.paths[3, False])
+        stressBlock, dispBlock = parser.frd.result_blocks[4], parser.frd.result_blocks[3]
+        sxx, syy, szz, sxy, syz, szx = stressBlock.values.astype(np.float64).T
+        tensors = np.stack([np.stack([sxx, sxy, szx], -1), np.stack([sxy, syy, syz], -1),
+                            np.stack([szx, syz, szz], -1)], -1)
+        principal = np.linalg.eigvalsh(tensors)
+        vonMises = np.sqrt(0.5 * ((sxx - syy) ** 2 + (syy - szz) ** 2 + (szz - sxx) ** 2)
+                           + 3.0 * (sxy ** 2 + syz ** 2 + szx ** 2))
+        np.testing.assert_allclose(stressBlock.derived('MISES'), vonMises, rtol=1e-12)
+        np.testing.assert_allclose(stressBlock.derived('PS1'), principal[:, 2], rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(stressBlock.derived('PS2'), principal[:, 1], rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(stressBlock.derived('PS3'), principal[:, 0], rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(stressBlock.derived('TRESCA'), principal[:, 2] - principal[:, 0],
+                                   rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(dispBlock.derived('MAG'),
+                                   np.linalg.norm(dispBlock.values[:, :3].astype(np.float64), axis=1), rtol=1e-12)
+        self.assertRaises(ValueError, stressBlock.derived, 'MAG')
+        self.assertRaises(ValueError, parser.frd.result_blocks[5].derived, 'MISES')
+
+        # Rows and lists of quantities give the same values, without computing whole fields
+        freshBlock = FRDParser.FRDParser(self.paths[3, False]).frd.result_blocks[4]
+        rows = np.array([26, 0, 13])
+        np.testing.assert_array_equal(freshBlock.derived_rows('MISES', rows), stressBlock.derived('MISES')[rows])
+        (ps3, tresca) = freshBlock.derived_rows(['PS3', 'TRESCA'], slice(5, 9))
+        np.testing.assert_array_equal(ps3, stressBlock.derived('PS3')[5:9])
+        np.testing.assert_array_equal(tresca, stressBlock.derived('TRESCA')[5:9])
+
+        # Assigning new values drops the cached quantities, and NaN components give NaN
+        values = stressBlock.values.copy()
+        values[1, 2] = np.nan
+        stressBlock.values = values
+        self.assertTrue(np.isnan(stressBlock.derived('MISES')[1]))
+        self.assertTrue(np.isnan(stressBlock.derived('PS1')[1]))
+        self.assertFalse(np.isnan(stressBlock.derived('PS1')[[0, 2]]).any())
+
+    def test_results_history(self):
+        parser = FRDParser.FRDParser(self.paths[2, False])
+        numbers, coords, elems, results = makeModel()
+        stepValues, history = parser.get_results_history('STRESS')
+        np.testing.assert_array_equal(stepValues, STEPS)
+        self.assertEqual(history.dtype, np.float32)
+        np.testing.assert_array_equal(history, np.stack([results['STRESS', step] for step in STEPS]).astype(np.float32))
+
+        # Selected nodes and steps, NaN for nodes without results
+        stepValues, history = parser.get_results_history('DISP', numbers=[88, 11, 13], steps=[2])
+        np.testing.assert_array_equal(stepValues, [2.0])
+        self.assertEqual(history.shape, (1, 3, 3))
+        np.testing.assert_array_equal(history[0, [0, 2]], parser.frd.result_blocks[3].values[[26, 1]])
+        self.assertTrue(np.isnan(history[0, 1]).all())
+
+        # Steps can hold results for different nodes
+        stepBlock = parser.frd.result_blocks[4]
+        stepBlock.set_results(stepBlock.numbers[::2], stepBlock.values[::2])
+        stepValues, history = parser.get_results_history('STRESS')
+        self.assertEqual(history.shape, (2, 27, 6))
+        np.testing.assert_array_equal(history[1, ::2], stepBlock.values)
+        self.assertTrue(np.isnan(history[1, 1::2]).all())
+        np.testing.assert_array_equal(history[0], parser.frd.result_blocks[1].values)
+        self.assertRaises(RuntimeError, parser.get_results_history, 'ERROR')
+
+    def test_elem_results(self):
+        parser = FRDParser.FRDParser(self.paths[3, True])
+        numbers, coords, elems, results = makeModel(True)
+        stressBlock = parser.frd.result_blocks[4]
+        nodeRows = [(np.array(nodes) - 10) // 3 for elemType, nodes in elems]
+        mises = stressBlock.derived('MISES')
+        np.testing.assert_allclose(parser.get_elem_centroids(), [coords[rows].mean(0) for rows in nodeRows],
+                                   rtol=1e-12)
+        np.testing.assert_allclose(parser.get_elem_results('STRESS', step=2),
+                                   [stressBlock.values[rows].astype(np.float64).mean(0) for rows in nodeRows],
+                                   rtol=1e-12)
+        expected = np.array([mises[rows].mean() for rows in nodeRows])
+        np.testing.assert_allclose(parser.get_elem_results('STRESS', 2, 'MISES'), expected, rtol=1e-12)
+        np.testing.assert_array_equal(parser.get_elem_results('STRESS', 2, 'SYY', rows=[5, 2]),
+                                      parser.get_elem_results('STRESS', 2, 1)[[5, 2]])
+
+        # The k highest averages, with the peak node value and centroid of each element
+        hotSpots = parser.get_hot_spots(3, step=2)
+        order = np.argsort(-expected, kind='stable')[:3]
+        np.testing.assert_array_equal(hotSpots['elem'], order + 1)
+        np.testing.assert_allclose(hotSpots['average'], expected[order], rtol=1e-12)
+        np.testing.assert_array_equal(hotSpots['peak'], [mises[nodeRows[row]].max() for row in order])
+        np.testing.assert_allclose(np.stack([hotSpots['x'], hotSpots['y'], hotSpots['z']], 1),
+                                   parser.get_elem_centroids(order), rtol=1e-12)
+        self.assertEqual(len(parser.get_hot_spots(20, step=2)), 8)
+        self.assertEqual(len(parser.get_hot_spots(0, step=2)), 0)
+        self.assertRaises(ValueError, parser.get_hot_spots, 3, component=None)
+
+        # Elements with a node without results get NaN averages and are no hot spots
+        stressBlock.set_results(stressBlock.numbers[1:], stressBlock.values[1:])
+        average = parser.get_elem_results('STRESS', 2, 'MISES')
+        self.assertTrue(np.isnan(average[0]))
+        self.assertFalse(np.isnan(average[1:]).any())
+        self.assertNotIn(1, parser.get_hot_spots(8, step=2)['elem'])
+
+        # Tables are saved as .csv and .npz with the same fields
+        hotSpots = parser.get_hot_spots(4, step=2)
+        for extension in ('.csv', '.npz'):
+            path = os.path.join(self.tempDir, 'hotspots' + extension)
+            parser.export_hot_spots(path, 4, step=2)
+            if extension == '.npz':
+                with np.load(path) as table:
+                    self.assertEqual(sorted(table.files), sorted(hotSpots.dtype.names))
+                    for name in hotSpots.dtype.names:
+                        np.testing.assert_array_equal(table[name], hotSpots[name])
+            else:
+                table = np.genfromtxt(path, delimiter=',', names=True)
+                self.assertEqual(table.dtype.names, hotSpots.dtype.names)
+                for name in hotSpots.dtype.names:
+                    np.testing.assert_allclose(table[name], hotSpots[name], rtol=1e-8)
+        path = os.path.join(self.tempDir, 'elements.npz')
+        parser.export_elem_results(path, 'DISP', step=1)
+        with np.load(path) as table:
+            self.assertEqual(table.files, ['elem', 'x', 'y', 'z', 'D1', 'D2', 'D3'])
+            np.testing.assert_array_equal(table['D2'], parser.get_elem_results('DISP', 1, 'D2'))
+        self.assertRaises(ValueError, FRDParser.save_table, os.path.join(self.tempDir, 'hotspots.txt'), hotSpots)
+
+    def test_save(self):
+        writeRecords, writeLines = FRDParser._write_records, FRDParser._write_lines
+        for (fmt, mixed), path in self.paths.items():
+            savedPath = os.path.join(self.tempDir, 'saved.frd')
+            FRDParser.FRDParser(path).save(savedPath, as_copy=True)
+            with open(savedPath, 'rb') as saved:
+                data = saved.read()
+            if fmt < 2:
+                # Only the header lines are padded to their full width
+                with open(path, 'rb') as original:
+                    self.assertEqual([line.rstrip() for line in original], [line.rstrip() for line in data.splitlines()])
+            self.assertSameArrays(blockArrays(FRDParser.FRDFile(path)), blockArrays(FRDParser.FRDFile(savedPath)))
+
+            # Writing a few rows at a time gives the same file, and so does saving the saved file
+            with mock.patch.object(FRDParser, '_write_records', lambda *args: writeRecords(*args, chunk_size=5)), \
+                    mock.patch.object(FRDParser, '_write_lines', lambda *args: writeLines(*args, chunk_size=5)):
+                FRDParser.FRDParser(path, lazy=True).save(savedPath, as_copy=True)
+            with open(savedPath, 'rb') as saved:
+                self.assertEqual(saved.read(), data)
+            resavedPath = os.path.join(self.tempDir, 'resaved.frd')
+            FRDParser.FRDParser(savedPath).save(resavedPath, as_copy=True)
+            with open(resavedPath, 'rb') as resaved:
+                self.assertEqual(resaved.read(), data)
+            self.assertTrue(FRDParser.probe(resavedPath).complete)
+
+    def test_convert_format_round_trip(self):
+        for mixed in (False, True):
+            path = self.paths[1, mixed]
+            asciiPath = os.path.join(self.tempDir, 'ascii.frd')
+            FRDParser.FRDParser(path).save(asciiPath, as_copy=True)
+            for binaryFormat in (2, 3):
+                # ASCII -> binary -> ASCII gives back the same file
+                binaryPath = os.path.join(self.tempDir, 'binary.frd')
+                parser = FRDParser.FRDParser(path, lazy=True)
+                parser.convert_format(binaryFormat)
+                parser.save(binaryPath, as_copy=True)
+                self.assertEqual(FRDParser.probe(binaryPath).numnod, 27)
+                roundTripPath = os.path.join(self.tempDir, 'roundtrip.frd')
+                parser = FRDParser.FRDParser(binaryPath)
+                self.assertEqual(parser.frd.node_block.format, binaryFormat)
+                parser.convert_format(1)
+                parser.save(roundTripPath, as_copy=True)
+                with open(asciiPath, 'rb') as expected, open(roundTripPath, 'rb') as actual:
+                    self.assertEqual(expected.read(), actual.read())
+                self.assertSameArrays(blockArrays(FRDParser.FRDFile(path)),
+                                      blockArrays(FRDParser.FRDFile(roundTripPath)))
+
+    def test_probe(self):
+        for (fmt, mixed), path in self.paths.items():
+            summary = FRDParser.probe(path)
+            self.assertTrue(summary.complete)
+            self.assertIsNone(summary.error)
+            self.assertEqual((summary.numnod, summary.numelem), (27, 8))
+            self.assertEqual(summary.results, [(name, step) for step in STEPS for name, entities in RESULTS])
+            self.assertEqual(summary.steps, STEPS)
+
+        # A file cut off in the middle of a block, as left behind by an aborted analysis
+        truncatedPath = os.path.join(self.tempDir, 'truncated.frd')
+        with open(self.paths[0, False], 'rb') as complete, open(truncatedPath, 'wb') as truncated:
+            data = complete.read()
+            truncated.write(data[:data.index(b'STRESS') + 300])
+        summary = FRDParser.probe(truncatedPath)
+        self.assertFalse(summary.complete)
+        self.assertEqual(summary.numnod, 27)
+
+    def test_iter_blocks(self):
+        for (fmt, mixed), path in self.paths.items():
+            frd = FRDParser.FRDFile(path)
+            blocks = list(FRDParser.iter_blocks(path))
+            self.assertEqual([type(block) for block in blocks], [type(block) for block in frd.blocks])
+            nodeBlock, elemBlock = blocks[2], blocks[3]
+            self.assertSameArrays([frd.node_block.numbers, frd.node_block.coords, frd.elem_block.numbers],
+                                  [nodeBlock.numbers, nodeBlock.coords, elemBlock.numbers])
+            self.assertSameArrays([block.values for block in frd.result_blocks],
+                                  [block.values for block in blocks if isinstance(block, FRDParser.FRDResultBlock)])
+
+            # Only the named result blocks are read, the others are skipped
+            stressBlocks = [block for block in FRDParser.iter_blocks(path, names=['STRESS'])
+                            if isinstance(block, FRDParser.FRDResultBlock)]
+            self.assertEqual([(block.name, block.numstep) for block in stressBlocks], [('STRESS', 1), ('STRESS', 2)])
+            np.testing.assert_array_equal(stressBlocks[1].values, frd.result_blocks[4].values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+
+import numpy as np
+
+import FRDParser
+import FRDStats
+
+
+def makeValues(count, seed=0):
+    # Positive and negative values spread over several orders of magnitude, with some zeros
+    rng = np.random.RandomState(seed)
+    values = rng.lognormal(0.0, 3.0, count) * rng.choice([-1.0, 1.0], count, p=[0.3, 0.7])
+    values[rng.randint(0, count, count // 50)] = 0.0
+    return values
+
+
+def makeStressBlock(count, seed=0):
+    # STRESS result block with random tensors, as set up by the parser
+    block = FRDParser.FRDResultBlock()
+    block.name = 'STRESS'
+    block.ncomps = 6
+    for name in ('SXX', 'SYY', 'SZZ', 'SXY', 'SYZ', 'SZX'):
+        entity = FRDParser.FRDEntity()
+        entity.name = name
+        block.entities.append(entity)
+    rng = np.random.RandomState(seed)
+    block.set_results(np.arange(1, count + 1), rng.normal(0.0, 100.0, (count, 6)))
+    return block
+
+
+def exactQuantile(values, q):
+    # Value of rank q*(count-1) counting from 0, rounded down, as the sketch approximates it
+    ordered = np.sort(values)
+    return ordered[np.floor(np.asarray(q) * (len(ordered) - 1)).astype(np.int64)]
+
+
+class FRDStatsTest(unittest.TestCase):
+    def assertSameStats(self, expected, actual):
+        self.assertEqual((expected.count, expected.nan_count), (actual.count, actual.nan_count))
+        np.testing.assert_array_equal([expected.minimum, expected.maximum], [actual.minimum, actual.maximum])
+        np.testing.assert_allclose(actual.total, expected.total, rtol=1e-12)
+        quantiles = np.linspace(0.0, 1.0, 41)
+        np.testing.assert_array_equal(expected.quantile(quantiles), actual.quantile(quantiles))
+
+    def test_sketch_accuracy(self):
+        values = makeValues(20000)
+        quantiles = np.linspace(0.0, 1.0, 101)
+        for relativeAccuracy in (0.01, 0.005, 0.001):
+            sketch = FRDStats.QuantileSketch(relativeAccuracy)
+            sketch.update(values)
+            self.assertEqual(sketch.count, len(values))
+            expected = exactQuantile(values, quantiles)
+            actual = sketch.quantile(quantiles)
+            self.assertTrue(np.all(np.abs(actual - expected) <= relativeAccuracy * np.abs(expected) + 1e-12))
+
+        # The usual percentiles agree with numpy's to the same accuracy, and scalars give scalars
+        sketch = FRDStats.QuantileSketch(0.001)
+        sketch.update(np.abs(values))
+        for q in (0.5, 0.95, 0.99):
+            self.assertLessEqual(abs(sketch.quantile(q) - np.quantile(np.abs(values), q)),
+                                 0.002 * np.quantile(np.abs(values), q))
+        self.assertEqual(np.ndim(sketch.quantile(0.5)), 0)
+        self.assertTrue(np.isnan(FRDStats.QuantileSketch().quantile(0.5)))
+
+    def test_sketch_merge(self):
+        values = makeValues(5000, seed=1)
+        whole = FRDStats.QuantileSketch(0.002)
+        whole.update(values)
+        merged = FRDStats.QuantileSketch(0.002)
+        for part in np.array_split(values, 7):
+            partSketch = FRDStats.QuantileSketch(0.002)
+            partSketch.update(part)
+            merged.merge(partSketch)
+        self.assertEqual((merged.count, merged.zero_count), (whole.count, whole.zero_count))
+        quantiles = np.linspace(0.0, 1.0, 201)
+        np.testing.assert_array_equal(merged.quantile(quantiles), whole.quantile(quantiles))
+        self.assertRaises(ValueError, merged.merge, FRDStats.QuantileSketch(0.01))
+
+    def test_histogram_merge(self):
+        values = makeValues(3000, seed=2)
+        edges = [-10.0, -1.0, 0.0, 1.0, 10.0, 100.0]
+        whole = FRDStats.Histogram(edges)
+        whole.update(values)
+        np.testing.assert_array_equal(whole.counts, np.histogram(values, edges)[0])
+        self.assertEqual(whole.below, np.count_nonzero(values < -10.0))
+        self.assertEqual(whole.above, np.count_nonzero(values > 100.0))
+        self.assertEqual(whole.counts.sum() + whole.below + whole.above, len(values))
+
+        # Histograms with equal edges merge exactly, others can't be merged
+        merged = FRDStats.Histogram(edges)
+        for part in np.array_split(values, 4):
+            partHistogram = FRDStats.Histogram(np.array(edges))
+            partHistogram.update(part)
+            merged.merge(partHistogram)
+        np.testing.assert_array_equal(merged.counts, whole.counts)
+        self.assertEqual((merged.below, merged.above), (whole.below, whole.above))
+        self.assertRaises(ValueError, merged.merge, FRDStats.Histogram(edges[:-1]))
+        self.assertRaises(ValueError, merged.merge, FRDStats.Histogram([-10.0, -1.0, 0.0, 1.0, 10.0, 99.0]))
+
+    def test_nan_values(self):
+        values = makeValues(1000, seed=3)
+        withNan = values.copy()
+        withNan[::10] = np.nan
+        stats = FRDStats.FieldStats(edges=[-1.0, 0.0, 1.0], thresholds=[0.0, 5.0])
+        stats.update(withNan[:500])
+        stats.update(np.full(20, np.nan))
+        stats.update(withNan[500:])
+        finite = values[np.isfinite(withNan)]
+        self.assertEqual((stats.count, stats.nan_count), (len(finite), 120))
+        self.assertEqual((stats.minimum, stats.maximum), (finite.min(), finite.max()))
+        self.assertAlmostEqual(stats.mean, finite.mean(), places=9)
+        self.assertEqual(stats.sketch.count, len(finite))
+        np.testing.assert_array_equal(stats.histogram.counts, np.histogram(finite, [-1.0, 0.0, 1.0])[0])
+        np.testing.assert_array_equal(stats.exceedance.counts,
+                                      [np.count_nonzero(finite > 0.0), np.count_nonzero(finite > 5.0)])
+        np.testing.assert_allclose(stats.exceedance.fractions, stats.exceedance.counts / len(finite))
+
+        # Only NaN values leave the statistics empty
+        empty = FRDStats.FieldStats()
+        empty.update(np.full(5, np.nan))
+        self.assertEqual((empty.count, empty.nan_count), (0, 5))
+        self.assertTrue(np.isnan([empty.minimum, empty.maximum, empty.mean, empty.quantile(0.5)]).all())
+
+    def test_block_stats(self):
+        block = makeStressBlock(1000)
+        for component in ('SYZ', 2, 'MISES', 'PS3'):
+            whole = FRDStats.block_stats(block, component, chunk_size=1000)
+
+            # Chunks of any size, and merged statistics of separate chunks, give the same result
+            self.assertSameStats(whole, FRDStats.block_stats(block, component, chunk_size=64))
+            merged = FRDStats.FieldStats()
+            for start in range(0, 1000, 300):
+                rows = np.arange(start, min(start + 300, 1000))
+                merged.merge(FRDStats.block_stats(block, component, rows=rows, chunk_size=128))
+            self.assertSameStats(whole, merged)
+
+            if component in ('MISES', 'PS3'):
+                values = block.derived(component)
+            else:
+                values = block.values[:, 4 if component == 'SYZ' else component].astype(np.float64)
+            self.assertEqual((whole.minimum, whole.maximum), (values.min(), values.max()))
+            self.assertAlmostEqual(whole.mean, values.mean(), places=9)
+
+        # A list of components is summarised in one pass, with the same result as one at a time
+        components = ['MISES', 'SXX', 'TRESCA', 'PS1']
+        rows = np.arange(0, 1000, 3)
+        for component, stats in zip(components, FRDStats.block_stats(block, components, rows=rows, chunk_size=100)):
+            self.assertSameStats(FRDStats.block_stats(block, component, rows=rows), stats)
+
+
+if __name__ == '__main__':
+    unittest.main()